@@ -0,0 +1,113 @@
+import asyncio
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from main import settings
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent websocket-style (database_sync_to_async) and REST-style "
+        "(request per thread) queries and reports latency and peak server connections. "
+        "Run it with DATABASE_POOL=True and DATABASE_POOL=False to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ws', type=int, default=50, help='Concurrent websocket consumers')
+        parser.add_argument('--rest', type=int, default=20, help='Concurrent REST worker threads')
+        parser.add_argument('--iterations', type=int, default=20, help='Queries per consumer / thread')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        peak = {'connections': 0}
+        sampler = threading.Thread(target=self.sample_connections, args=(stop, peak), daemon=True)
+        sampler.start()
+
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['rest']) as executor:
+            rest = executor.map(lambda _: self.rest_worker(options['iterations']), range(options['rest']))
+            ws = asyncio.run(self.ws_load(options['ws'], options['iterations']))
+            rest = [latency for latencies in rest for latency in latencies]
+
+        elapsed = time.monotonic() - started
+        stop.set()
+        sampler.join()
+
+        pool = settings.DATABASES['default'].get('OPTIONS', {}).get('pool')
+
+        self.stdout.write(f"pool: {pool or 'disabled'}, CONN_MAX_AGE={settings.DATABASES['default'].get('CONN_MAX_AGE')}")
+        self.stdout.write(f"total {elapsed:.2f}s, peak server connections {peak['connections']}")
+        self.report('websocket', ws)
+        self.report('rest', rest)
+
+    async def ws_load(self, consumers, iterations):
+        results = await asyncio.gather(*(self.ws_consumer(iterations) for _ in range(consumers)))
+        return [latency for latencies in results for latency in latencies]
+
+    async def ws_consumer(self, iterations):
+        latencies = []
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            # Off the shared sync thread, each worker thread of the loop opens its own connection
+            await database_sync_to_async(self.query, thread_sensitive=False)()
+            latencies.append(time.perf_counter() - start)
+
+        return latencies
+
+    def rest_worker(self, iterations):
+        latencies = []
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            self.query()
+            # What request_finished does at the end of every request
+            close_old_connections()
+            latencies.append(time.perf_counter() - start)
+
+        return latencies
+
+    @staticmethod
+    def query():
+        return User.objects.filter(is_active=True).only('id').first()
+
+    @staticmethod
+    def sample_connections(stop, peak):
+        while not stop.is_set():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                )
+                peak['connections'] = max(peak['connections'], cursor.fetchone()[0])
+
+            time.sleep(0.02)
+
+        connection.close()
+
+    def report(self, name, latencies):
+        if not latencies:
+            return
+
+        latencies = sorted(latencies)
+        p95 = self.percentile(latencies, 95)
+        p99 = self.percentile(latencies, 99)
+
+        self.stdout.write(
+            f"{name}: {len(latencies)} queries, "
+            f"p50 {statistics.median(latencies) * 1000:.2f}ms, "
+            f"p95 {p95 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms"
+        )
+
+    @staticmethod
+    def percentile(latencies, rank):
+        """Nearest-rank percentile of sorted ``latencies``."""
+        return latencies[max(math.ceil(len(latencies) * rank / 100), 1) - 1]
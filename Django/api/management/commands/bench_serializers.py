@@ -0,0 +1,120 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from api.serializers.group_logs_serializers import GroupLogsSerializer
+from api.serializers.notification_serializers import NotificationSerializer
+from api.serializers.row_serializers import (
+    GroupLogsRowSerializer,
+    NotificationRowSerializer,
+    TaskChatMessageRowSerializer,
+    TaskRowSerializer,
+)
+from api.serializers.task_chat_serializers import TaskChatMessageSerializer
+from api.serializers.task_serializers import TaskSerializer
+from task.models import Project, Task, TaskComment, TaskImage
+from users.models import Group, GroupLogs, Notification, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares model serializers with the values() row serializers of the hot list "
+        "endpoints on generated rows (fetch + serialize, per row). The rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Rows per list')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per serializer')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+
+        with transaction.atomic():
+            user, group, task = self.create_rows(rows)
+
+            tasks = Task.objects.filter(project__group=group).order_by('-created_at', '-id')
+            notifications = Notification.objects.filter(user=user).order_by('-created_at', '-id')
+            messages = TaskComment.objects.filter(task=task).order_by('-id')
+            logs = GroupLogs.logmanager.group_select(group_id=group.id).order_by('-created_at', '-id')
+
+            cases = [
+                (
+                    'tasks',
+                    lambda: TaskSerializer(tasks.select_related('created_by', 'project'), many=True, context={'method': 'get'}).data,
+                    lambda: TaskRowSerializer(tasks.values(*TaskRowSerializer.values)).data,
+                ),
+                (
+                    'notifications',
+                    lambda: NotificationSerializer(notifications.select_related('user'), many=True).data,
+                    lambda: NotificationRowSerializer(
+                        notifications.values(*NotificationRowSerializer.values), context={'user': user}
+                    ).data,
+                ),
+                (
+                    'chat messages',
+                    lambda: TaskChatMessageSerializer(messages.select_related('user').prefetch_related(
+                        Prefetch('message_image', queryset=TaskImage.objects.only('message', 'image', 'width', 'height', 'size', 'variants'), to_attr='task_images')
+                    ), many=True).data,
+                    lambda: TaskChatMessageRowSerializer(messages.values(*TaskChatMessageRowSerializer.values)).data,
+                ),
+                (
+                    'group logs',
+                    lambda: GroupLogsSerializer(logs.all(), many=True).data,
+                    lambda: GroupLogsRowSerializer(logs.values(*GroupLogsRowSerializer.values)).data,
+                ),
+            ]
+
+            for name, model_path, row_path in cases:
+                model_time = self.measure(model_path, options['repeat']) / rows
+                row_time = self.measure(row_path, options['repeat']) / rows
+
+                self.stdout.write(
+                    f"{name}: model {model_time * 1e6:.1f}us/row, "
+                    f"values {row_time * 1e6:.1f}us/row, x{model_time / row_time:.1f}"
+                )
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_rows(count):
+        now = timezone.now()
+        user = User.objects.create_user(username='bench_serializers', password='bench_serializers', last_login=now)
+        group = Group.objects.create(name='Bench serializers', owner=user)
+        project = Project.objects.create(owner=user, group=group, title='Bench serializers')
+
+        tasks = Task.objects.bulk_create(
+            Task(status=Task.NO_STATUS, created_by=user, project=project, name=f'Task {i}', description='', deadline=now)
+            for i in range(count)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=user, notify_type=Notification.TASK_UPDATE_MESSAGE, message=f'Message {i}')
+            for i in range(count)
+        )
+        comments = TaskComment.objects.bulk_create(
+            TaskComment(task=tasks[0], user=user, text=f'Message {i}') for i in range(count)
+        )
+        TaskImage.objects.bulk_create(
+            TaskImage(message=comment, title='image', image=f'task_images/{comment.id}.png') for comment in comments[::4]
+        )
+        GroupLogs.objects.bulk_create(
+            GroupLogs(group=group, event=f'Event {i}', event_type=GroupLogs.ADD_MEMBER, anchor=user)
+            for i in range(count)
+        )
+
+        return user, group, tasks[0]
+
+    @staticmethod
+    def measure(func, repeat):
+        func()
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        return statistics.median(timings)
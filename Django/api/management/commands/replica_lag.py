@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from main import settings
+
+
+class Command(BaseCommand):
+    help = "Shows how far each read replica is behind the primary"
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write("No replicas configured (DATABASE_REPLICA_URLS)")
+            return
+
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT pg_is_in_recovery(), pg_current_wal_lsn()")
+            _, primary_lsn = cursor.fetchone()
+
+        for alias in settings.DATABASE_REPLICAS:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT
+                        pg_is_in_recovery(),
+                        pg_last_wal_replay_lsn(),
+                        EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                    """
+                )
+                in_recovery, replay_lsn, seconds = cursor.fetchone()
+
+            if not in_recovery:
+                self.stdout.write(f"{alias}: not a standby (same server as the primary?), lag 0")
+                continue
+
+            with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                cursor.execute("SELECT pg_wal_lsn_diff(%s, %s)", [primary_lsn, replay_lsn])
+                behind_bytes = cursor.fetchone()[0]
+
+            # The replay timestamp only moves with new transactions, on an idle primary seconds overstates the lag
+            self.stdout.write(f"{alias}: {int(behind_bytes)} bytes behind, last replayed transaction {seconds:.1f}s ago")
@@ -1,21 +1,13 @@
 
-from rest_framework.pagination import PageNumberPagination, CursorPagination
+import json
+from base64 import b64decode, b64encode
 
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
 from rest_framework.response import Response
-
-class NotificationPaginator(PageNumberPagination):
-    page_size = 5  # дефолтное значение элементов на странице
-    page_size_query_param = 'page_size'  # параметр для изменения количества элементов  
-
-    def get_paginated_response(self, data):
-        return Response({
-            'count': self.page.paginator.count,
-            'next': self.get_next_link(),
-            'previous': self.get_previous_link(),
-            'items_per_page': self.page_size,
-            'results': data,
-        })
-    
+from rest_framework.utils.urls import replace_query_param
 
 class ChatMessagePaginator(CursorPagination):
     page_size = 15
@@ -23,16 +15,164 @@ class ChatMessagePaginator(CursorPagination):
     max_page_size= 40
 
 
-class GroupLogsPaginator(PageNumberPagination):
-    page_size = 10
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over ``(created_at, id)`` in descending order.
+
+    The cursor holds the last seen ``(created_at, id)`` pair, so every page is an
+    index range scan of ``page_size + 1`` rows no matter how deep it is. Rows can
+    be model instances or ``.values()`` dicts.
+    """
+
+    page_size = 50
+    max_page_size = 200
     page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    order_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        field = self.order_field
+
+        if self.cursor is None:
+            reverse = False
+        else:
+            value, pk, reverse = self.cursor
+            lookup = 'gt' if reverse else 'lt'
+
+            # The inclusive bound is what the index range scan uses, the OR only trims ties
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk}),
+                **{f'{field}__{lookup}e': value},
+            )
+
+        if reverse:
+            queryset = queryset.order_by(field, 'pk')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-pk')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if not encoded:
+            return None
+
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            value = parse_datetime(data['v'])
+            pk = int(data['i'])
+            reverse = bool(data.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+
+        if value is None:
+            raise NotFound('Invalid cursor')
+
+        return value, pk, reverse
+
+    def encode_cursor(self, row, reverse):
+        value = self._get_value(row, self.order_field)
+        pk = self._get_value(row, 'id')
+
+        data = json.dumps({'v': value.isoformat(), 'i': pk, 'r': reverse})
+        encoded = b64encode(data.encode('utf-8')).decode('ascii')
+
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+
+        return self.encode_cursor(self.page[0], reverse=True)
 
     def get_paginated_response(self, data):
         return Response({
-            'count': self.page.paginator.count,
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'items_per_page': self.page_size,
             'results': data,
         })
 
+    @staticmethod
+    def _get_value(row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+
+class NotificationPaginator(KeysetPagination):
+    page_size = 5
+    max_page_size = 50
+
+
+class GroupLogsPaginator(KeysetPagination):
+    """
+    Keyset pages of a group log. ``?count=true`` adds the planner's row estimate
+    for the filtered log instead of an exact ``COUNT(*)``.
+    """
+
+    page_size = 10
+    max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = self.get_approximate_count(queryset)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    @staticmethod
+    def get_approximate_count(queryset):
+        # An empty queryset (e.g. unknown username) never reaches the database, nothing to explain
+        if queryset.query.is_empty():
+            return 0
+
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return plan[0]['Plan']['Plan Rows']
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+
+        if self.count is not None:
+            response.data['count'] = self.count
+
+        return response
+
+
+class TaskKeysetPaginator(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
@@ -9,6 +9,7 @@ class GroupCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Group
         fields = '__all__'
+        read_only_fields = ['members_count', 'projects_count']
 
 
 class GroupSerializer(serializers.ModelSerializer):
@@ -73,14 +74,8 @@ class GroupSerializer(serializers.ModelSerializer):
         
 
 class GroupCountProjectsSerializer(serializers.ModelSerializer):
-    count_projects = serializers.SerializerMethodField()
-    count_members = serializers.SerializerMethodField()
-
-    def get_count_projects(self, obj):
-        return len(obj.count_projects)
-    
-    def get_count_members(self, obj):
-        return len(obj.count_members)
+    count_projects = serializers.IntegerField(source='projects_count', read_only=True)
+    count_members = serializers.IntegerField(source='members_count', read_only=True)
 
     class Meta:
         model = Group
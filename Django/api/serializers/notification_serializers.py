@@ -11,7 +11,7 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'message', 'created_at', 'user', 'notify_type', 'group_id']
+        fields = ['id', 'message', 'created_at', 'user', 'notify_type', 'group_id', 'is_read']
 
 
     def get_user(self, obj):
@@ -23,8 +23,5 @@ class NotificationSerializer(serializers.ModelSerializer):
         return localtime.strftime("%m/%d/%Y, %H:%M")
     
     def get_group_id(self, obj):
-
-        if isinstance(obj.data, dict):
-            return obj.data.get('group_id', None)
-        return None
+        return obj.group_id
     
\ No newline at end of file
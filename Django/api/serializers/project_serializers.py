@@ -5,7 +5,7 @@ from task.models import Project
 class ProjectCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Project
-        fields = "__all__"
+        exclude = ("search_vector",)
 
 
 class ProjectSerializer(serializers.ModelSerializer):
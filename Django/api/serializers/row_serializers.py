@@ -0,0 +1,200 @@
+from operator import itemgetter
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from api.serializers.task_chat_serializers import image_data
+from api.serializers.user_serializers import UserSerializer
+from task.models import TaskImage
+from users.models import User
+
+
+def strftime(lookup, fmt):
+    get = itemgetter(lookup)
+    return lambda row: get(row).strftime(fmt)
+
+
+def local_strftime(lookup, fmt):
+    get = itemgetter(lookup)
+    return lambda row: timezone.localtime(get(row)).strftime(fmt)
+
+
+def drf_field(lookup, field):
+    get = itemgetter(lookup)
+    to_representation = field.to_representation
+    return lambda row: to_representation(get(row))
+
+
+def constant(value):
+    return lambda row: value
+
+
+def file_url(lookup, field):
+    get = itemgetter(lookup)
+    storage = field.storage
+
+    def extract(row):
+        name = get(row)
+        return storage.url(name) if name else None
+
+    return extract
+
+
+class RowSerializer:
+    """
+    Read-only list serializer over ``.values(*cls.values)`` rows.
+
+    ``fields`` maps output keys to a lookup, a callable of the row or ``None`` for
+    a ``get_<key>`` method. Extractors are compiled once per class, so a row is one
+    dict comprehension instead of a model instance plus a walk over DRF fields.
+    The output is the same as the model serializer named in the subclass.
+    """
+
+    values = ()
+    fields = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls.extractors = tuple(
+            (name, itemgetter(source) if isinstance(source, str) else source)
+            for name, source in cls.fields.items()
+        )
+
+    def __init__(self, rows, many=True, context=None):
+        self.rows = rows
+        self.context = context or {}
+        self.extractors = tuple(
+            (name, getattr(self, f'get_{name}') if get is None else get)
+            for name, get in self.extractors
+        )
+
+    @property
+    def data(self):
+        self.prefetch(self.rows)
+        extractors = self.extractors
+
+        return [{name: get(row) for name, get in extractors} for row in self.rows]
+
+    def prefetch(self, rows):
+        pass
+
+    @classmethod
+    def related(cls, row, prefix):
+        """Serializes the ``prefix__*`` values of a joined row, method fields aren't supported."""
+        row = {field: row[f'{prefix}__{field}'] for field in cls.values}
+        return {name: get(row) for name, get in cls.extractors}
+
+
+class UserRowSerializer(RowSerializer):
+    """``UserSerializer`` without a context."""
+
+    values = ('id', 'first_name', 'last_name', 'username', 'email', 'image_profile', 'last_login')
+    fields = {
+        'id': 'id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'username': 'username',
+        'email': 'email',
+        'image_profile': file_url('image_profile', User._meta.get_field('image_profile')),
+        'image_profile_url': file_url('image_profile', User._meta.get_field('image_profile')),
+        'last_login': local_strftime('last_login', "%m/%d/%Y, %H:%M"),
+        'in_group': constant(False),
+        'is_invite_send': constant(False),
+    }
+
+
+class TaskRowSerializer(RowSerializer):
+    """``TaskSerializer`` in the ``method='get'`` context."""
+
+    values = ('id', 'project__title', 'name', 'description', 'deadline', 'created_at', 'status')
+    fields = {
+        'id': 'id',
+        'project_name': 'project__title',
+        'name': 'name',
+        'description': 'description',
+        'deadline': strftime('deadline', "%d/%m/%Y | %H:%M"),
+        'created_at': strftime('created_at', "%d/%m/%Y"),
+        'status': 'status',
+        'is_performer': constant(False),
+    }
+
+
+class NotificationRowSerializer(RowSerializer):
+    """
+    ``NotificationSerializer`` for the notifications of ``context['user']``,
+    who is serialized once per page.
+    """
+
+    values = ('id', 'message', 'created_at', 'notify_type', 'group_id', 'is_read')
+    fields = {
+        'id': 'id',
+        'message': 'message',
+        'created_at': local_strftime('created_at', "%m/%d/%Y, %H:%M"),
+        'user': None,
+        'notify_type': 'notify_type',
+        'group_id': 'group_id',
+        'is_read': 'is_read',
+    }
+
+    def prefetch(self, rows):
+        self.user = UserSerializer(self.context['user']).data
+
+    def get_user(self, row):
+        return self.user
+
+
+class TaskChatMessageRowSerializer(RowSerializer):
+    """``TaskChatMessageSerializer``, images of the page are loaded in one query."""
+
+    values = (
+        'id', 'text', 'created_at', 'answer_to', 'user_id',
+        *(f'user__{field}' for field in UserRowSerializer.values),
+    )
+    fields = {
+        'id': 'id',
+        'text': 'text',
+        'user': None,
+        'created_at': drf_field('created_at', serializers.DateTimeField()),
+        'message': 'text',
+        'images_urls': None,
+        'answer_to': 'answer_to',
+    }
+
+    def prefetch(self, rows):
+        self.users = {}
+        self.images = {}
+
+        images = TaskImage.objects.filter(message_id__in=[row['id'] for row in rows]).values_list(
+            'message_id', 'id', 'image', 'width', 'height', 'size', 'variants'
+        )
+
+        request = self.context.get('request', None)
+
+        for message_id, *image in images:
+            self.images.setdefault(message_id, []).append(image_data(*image, request))
+
+    def get_user(self, row):
+        user_id = row['user_id']
+
+        if user_id not in self.users:
+            self.users[user_id] = UserRowSerializer.related(row, 'user')
+
+        return self.users[user_id]
+
+    def get_images_urls(self, row):
+        return self.images.get(row['id'], [])
+
+
+class GroupLogsRowSerializer(RowSerializer):
+    """``GroupLogsSerializer``."""
+
+    values = ('id', 'created_at', 'event', 'event_type', 'group__name', 'anchor__username', 'data')
+    fields = {
+        'event': 'event',
+        'event_type': 'event_type',
+        'group_name': 'group__name',
+        'anchor_username': 'anchor__username',
+        'created_at': local_strftime('created_at', "%H:%M:%S %d.%m.%Y"),
+        'data': 'data',
+    }
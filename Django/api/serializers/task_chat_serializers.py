@@ -1,6 +1,41 @@
 from rest_framework import serializers
-from task.models import TaskComment
+from task.models import TaskComment, TaskImage
 from api.serializers.user_serializers import UserSerializer
+from main import settings
+
+
+def image_data(image_id, name, width, height, size, variants, request=None):
+    """
+    An ``images_urls`` entry: the original and its ``TASK_IMAGE_VARIANTS`` with their
+    intrinsic sizes. A variant is None until api.tasks.create_image_variants made it.
+    """
+    storage = TaskImage._meta.get_field('image').storage
+
+    def url(file_name):
+        file_url = storage.url(file_name)
+        return request.build_absolute_uri(file_url) if request else file_url
+
+    data = {
+        'id': image_id,
+        'url': url(name),
+        'filename': name.split('/')[1],
+        'width': width,
+        'height': height,
+        'size': size,
+    }
+
+    for variant_name in settings.TASK_IMAGE_VARIANTS:
+        variant = variants.get(variant_name)
+
+        data[variant_name] = variant and {
+            'url': url(variant['name']),
+            'width': variant['width'],
+            'height': variant['height'],
+            'size': variant['size'],
+        }
+
+    return data
+
 
 class TaskChatMessageSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
@@ -29,21 +64,9 @@ class TaskChatMessageSerializer(serializers.ModelSerializer):
         request = self.context.get('request', None)
         
         if hasattr(obj, 'task_images') and obj.task_images:
-            urls = []
-
-            for item in obj.task_images:
-                if request:
-                    urls.append({
-                        "id": item.id,
-                        'url': request.build_absolute_uri(item.image.url),
-                        'filename': item.image.name.split('/')[1]
-                    })
-                else:
-                    urls.append({
-                        "id": item.id,
-                        'url': item.image.url,
-                        'filename': item.image.name.split('/')[1]
-                    })
-            return urls
-
-        return []
\ No newline at end of file
+            return [
+                image_data(item.id, item.image.name, item.width, item.height, item.size, item.variants, request)
+                for item in obj.task_images
+            ]
+
+        return []
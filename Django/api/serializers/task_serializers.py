@@ -1,11 +1,12 @@
 from rest_framework import serializers
 from api.serializers.user_serializers import UserSerializer
 from task.models import ActiveTask, Task
+from main import settings
 
 class TaskCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model=Task
-        fields = '__all__'
+        exclude = ('search_vector',)
         
         
 class TaskSerializer(serializers.ModelSerializer):
@@ -79,4 +80,20 @@ class ActiveTaskSerializer(serializers.ModelSerializer):
         ]
 
     def get_date_add(self, obj):
-        return obj.date_add.strftime("%d %m %Y, %I:%M%p")
\ No newline at end of file
+        return obj.date_add.strftime("%d %m %Y, %I:%M%p")
+
+class TaskBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=settings.TASK_BULK_MAX)
+    status = serializers.ChoiceField(choices=Task.STATUS_TASK, required=False)
+    deadline = serializers.DateTimeField(required=False)
+    add_performers = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    remove_performers = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, attrs):
+        if not any(attrs.get(field) for field in ('status', 'deadline', 'add_performers', 'remove_performers')):
+            raise serializers.ValidationError('Nothing to update')
+
+        if set(attrs['add_performers']) & set(attrs['remove_performers']):
+            raise serializers.ValidationError('A performer can not be added and removed at once')
+
+        return attrs
@@ -0,0 +1,104 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api.tasks import schedule_image_variants
+from common.cache_managers.group_cache import GroupCacheManager
+from task.models import Project, Task, TaskImage
+from users.models import Group
+
+
+def _members_ids(group_id):
+    return list(
+        Group.members.through.objects.filter(group_id=group_id).values_list('user_id', flat=True)
+    )
+
+
+def _invalidate_group_with_members(group_id):
+    if group_id is None:
+        return
+
+    GroupCacheManager.invalidate_group(group_id, _members_ids(group_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_cache(sender, instance, **kwargs):
+    _invalidate_group_with_members(instance.id)
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def invalidate_group_members_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # pk_set is empty on clear, remember who is about to be removed
+        if reverse:
+            instance._cleared_ids = list(instance.user_groups.values_list('id', flat=True))
+        else:
+            instance._cleared_ids = _members_ids(instance.id)
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    ids = pk_set if action != 'post_clear' else getattr(instance, '_cleared_ids', [])
+
+    if reverse:
+        GroupCacheManager.invalidate_users(instance.id)
+
+        for group_id in ids:
+            GroupCacheManager.invalidate_group(group_id)
+    else:
+        GroupCacheManager.invalidate_group(instance.id, ids)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_cache(sender, instance, **kwargs):
+    if isinstance(kwargs.get('origin'), Group):
+        # Group deletion already invalidated everything under it
+        return
+
+    previous_group_id = getattr(instance, '_loaded_group_id', None)
+
+    if previous_group_id != instance.group_id:
+        _invalidate_group_with_members(previous_group_id)
+
+    _invalidate_group_with_members(instance.group_id)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_cache(sender, instance, **kwargs):
+    if kwargs.get('origin') is not None and not isinstance(kwargs['origin'], Task):
+        # Cascade from a project or group, their own receivers handle it
+        return
+
+    group_id = Project.objects.filter(
+        id=instance.project_id
+    ).values_list('group_id', flat=True).first()
+
+    if group_id is not None:
+        GroupCacheManager.invalidate_group(group_id)
+
+
+@receiver(m2m_changed, sender=Task.performers.through)
+def invalidate_task_performers_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # user.assigned_tasks.clear() has no pk_set, the dashboard TTL covers it
+        projects = Project.objects.filter(tasks__in=pk_set or ())
+    else:
+        projects = Project.objects.filter(id=instance.project_id)
+
+    groups_ids = projects.filter(group__isnull=False).values_list('group_id', flat=True).distinct()
+
+    for group_id in groups_ids:
+        GroupCacheManager.invalidate_group(group_id)
+
+
+@receiver(post_save, sender=TaskImage)
+def create_image_variants_on_save(sender, instance, created, **kwargs):
+    # bulk_create (chat uploads) schedules them itself
+    if created:
+        schedule_image_variants([instance.id])
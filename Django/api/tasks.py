@@ -1,14 +1,19 @@
 from celery import Celery, shared_task
 from celery.schedules import crontab
-from django.db.models import F, DurationField, ExpressionWrapper
+from django.db import transaction
 from django.utils import timezone
 from django.utils.timezone import timedelta 
 
-from users.models import Group, Notification
+from common.cache_managers.notification_cache import NotificationCacheManager
+from common.partitions import MonthlyPartitions
+from users.models import Group, GroupLogs, Notification
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from main import settings
 from main.celery import app
-from task.models import TaskPerformSession
+from task.heartbeats import SessionHeartbeats
+from task.images import create_variants
+from task.models import TaskImage, TaskPerformSession
 
 
 @shared_task
@@ -20,18 +25,22 @@ def sum_strings(data_string: str):
 @shared_task()
 def create_notify_user(user_id: int, type_message: str, notify_message: str, push_message: str, group_id=None):
 
-    if type_message == Notification.INVITE_MESSAGE and group_id == None:
-        return
-    
-    if Notification.objects.filter(notify_type=type_message, user_id=user_id, data__group_id=group_id).exists():
-        return
-
-    Notification.objects.create(
-        notify_type=type_message,
-        user_id=user_id, 
-        message=notify_message,
-        data={'group_id': group_id},
-    )
+    if type_message == Notification.INVITE_MESSAGE:
+        if group_id is None:
+            return
+
+        if Notification.objects.create_invite(user_id=user_id, group_id=group_id, message=notify_message) is None:
+            return
+
+        # Raw insert, post_save is not sent
+        transaction.on_commit(lambda: NotificationCacheManager.change_unread(user_id, 1))
+    else:
+        Notification.objects.create(
+            notify_type=type_message,
+            user_id=user_id, 
+            message=notify_message,
+            group_id=group_id,
+        )
 
     channel = get_channel_layer()
 
@@ -53,21 +62,126 @@ def create_notify_users(notify_type, group_id, task_name: str, task_status: str)
     channel = get_channel_layer()
 
     for item in members:
+        # bulk_create skips post_save, keep the unread badge in step by hand
+        NotificationCacheManager.change_unread(item.id, 1)
         async_to_sync(channel.group_send)(f'chat_{item.id}', {'type': 'chat_message', 'message': f'task: {task_name} status Updated', 'datas': 'data1'})
 
 
+@shared_task()
+def create_notify_groups(notify_type, group_ids, notify_message: str, push_message: str):
+    """One notification per member of ``group_ids``, a member of several groups gets one."""
+    members_ids = set(
+        Group.members.through.objects.filter(group_id__in=group_ids).values_list('user_id', flat=True)
+    )
+
+    Notification.objects.bulk_create([
+        Notification(notify_type=notify_type, user_id=member_id, message=notify_message)
+        for member_id in members_ids
+    ])
+
+    channel = get_channel_layer()
+
+    for member_id in members_ids:
+        NotificationCacheManager.change_unread(member_id, 1)
+        async_to_sync(channel.group_send)(f'chat_{member_id}', {'type': 'chat_message', 'message': push_message})
+
+    return len(members_ids)
+
+
+@shared_task()
+def create_image_variants(image_ids):
+    """WebP thumbnails and the recorded sizes of freshly saved chat images, see task.images."""
+    created = 0
+
+    for image in TaskImage.objects.filter(id__in=image_ids).only('id', 'image'):
+        created += create_variants(image)
+
+    return created
+
+
+def schedule_image_variants(image_ids):
+    """
+    Queues ``create_image_variants`` once the images are committed. Without Celery it
+    runs inline in the ``on_commit`` callback, chat uploads call it after their broadcast
+    (``task.uploads.schedule_variants``).
+    """
+    image_ids = list(image_ids)
+
+    if not image_ids:
+        return
+
+    if settings.IS_ENABLE_CELERY:
+        transaction.on_commit(lambda: create_image_variants.delay(image_ids))
+    else:
+        transaction.on_commit(lambda: create_image_variants(image_ids))
+
+
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender: Celery, **kwargs):
-    sender.add_periodic_task(600.0, update_performers_sessions)
+    sender.add_periodic_task(float(settings.SESSION_HEARTBEAT_FLUSH_INTERVAL), flush_session_heartbeats)
+    sender.add_periodic_task(60.0, update_performers_sessions)
+    sender.add_periodic_task(crontab(hour=3, minute=30), maintain_history)
+
+
+@app.task
+def flush_session_heartbeats(*args, **kwargs):
+    flushed = 0
+
+    # Drain the dirty set a batch at a time, bounded so a flood can't pin the worker
+    for _ in range(settings.SESSION_HEARTBEAT_FLUSH_ROUNDS):
+        batch = SessionHeartbeats.flush()
+
+        if not batch:
+            break
+
+        flushed += batch
+
+    return flushed
 
 
 @app.task
 def update_performers_sessions(*args, **kwargs):
-    sessions = TaskPerformSession.objects.annotate(
-        end_ref=ExpressionWrapper(
-            timezone.now() - F('updated_at') ,
-            output_field=DurationField()
+    expired = SessionHeartbeats.expire()
+
+    # Sessions that never sent a tick, sargable on the partial (updated_at) WHERE is_active index
+    stale = TaskPerformSession.objects.filter(
+        is_active=True,
+        updated_at__lt=timezone.now() - timedelta(seconds=settings.SESSION_HEARTBEAT_TIMEOUT),
+    ).exclude(id__in=SessionHeartbeats.live_ids()).update(is_active=False)
+
+    return len(expired) + stale
+
+
+@app.task
+def maintain_history(ahead=None, logs_retention_months=None, notifications_retention_days=None):
+    """
+    Creates the group_logs partitions of the coming months, drops the ones past
+    retention and purges old notifications. A retention of 0 keeps everything.
+    """
+    ahead = settings.GROUP_LOGS_PARTITIONS_AHEAD if ahead is None else ahead
+    logs_retention_months = settings.GROUP_LOGS_RETENTION_MONTHS if logs_retention_months is None else logs_retention_months
+    notifications_retention_days = (
+        settings.NOTIFICATIONS_RETENTION_DAYS if notifications_retention_days is None else notifications_retention_days
+    )
+
+    partitions = MonthlyPartitions(GroupLogs._meta.db_table)
+    this_month = partitions.month_start(timezone.now())
+
+    created = partitions.create(this_month, partitions.add_months(this_month, ahead))
+    dropped = []
+
+    if logs_retention_months:
+        dropped = partitions.drop_before(partitions.add_months(this_month, -logs_retention_months))
+
+    purged = 0
+
+    if notifications_retention_days:
+        purged, unread = Notification.objects.purge_older_than(
+            timezone.now() - timedelta(days=notifications_retention_days),
+            settings.NOTIFICATIONS_PURGE_BATCH,
         )
-    ).filter(end_ref__gte=timedelta(minutes=10), is_active=True).update(is_active=False)
 
-    print('COMPLETE')
\ No newline at end of file
+        for user_id, count in unread.items():
+            NotificationCacheManager.change_unread(user_id, -count)
+
+    return {'created': created, 'dropped': dropped, 'notifications_purged': purged}
@@ -0,0 +1,219 @@
+import json
+import threading
+import time
+import uuid
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from common.cache_backends import _MISSING, LocalLRUCache, TieredRedisCache, _processes
+from common.mixins import CacheMixin
+
+
+@pytest.fixture
+def cache_key():
+    key = f"test_cache_{uuid.uuid4().hex}"
+
+    yield key
+
+    cache.delete_many([key, f"{key}:lock"])
+
+
+class TestCacheMixin:
+    def test_builder_called_once(self, cache_key):
+        mixin = CacheMixin()
+        calls = []
+
+        def builder():
+            calls.append(1)
+            return [{'id': 1}]
+
+        assert mixin.get_or_build_cache(cache_key, builder) == [{'id': 1}]
+        assert mixin.get_or_build_cache(cache_key, builder) == [{'id': 1}]
+        assert len(calls) == 1
+
+    def test_empty_payload_is_cached(self, cache_key):
+        mixin = CacheMixin()
+        calls = []
+
+        def builder():
+            calls.append(1)
+            return []
+
+        mixin.get_or_build_cache(cache_key, builder)
+        mixin.get_or_build_cache(cache_key, builder)
+
+        assert len(calls) == 1
+
+    def test_none_is_not_cached(self, cache_key):
+        mixin = CacheMixin()
+
+        assert mixin.get_or_build_cache(cache_key, lambda: None) is None
+        assert cache.get(cache_key) is None
+
+    def test_stale_value_served_while_locked(self, cache_key):
+        mixin = CacheMixin()
+        cache.set(cache_key, {'data': 'old', 'delta': 0, 'expiry': 0}, 60)
+        cache.add(f"{cache_key}:lock", 1, 10)
+
+        assert mixin.get_or_build_cache(cache_key, lambda: 'new') == 'old'
+
+    def test_expired_lock_of_another_worker_kept(self, cache_key):
+        mixin = CacheMixin()
+        lock_key = f"{cache_key}:lock"
+
+        def builder():
+            # The lock timed out during a slow build and another worker took it
+            cache.delete(lock_key)
+            cache.add(lock_key, 1, 10)
+            return 'new'
+
+        assert mixin.get_or_build_cache(cache_key, builder) == 'new'
+        assert cache.get(lock_key) == 1
+
+    def test_expired_value_rebuilt(self, cache_key):
+        mixin = CacheMixin()
+        cache.set(cache_key, {'data': 'old', 'delta': 0, 'expiry': 0}, 60)
+
+        assert mixin.get_or_build_cache(cache_key, lambda: 'new') == 'new'
+        assert cache.get(cache_key)['data'] == 'new'
+
+
+
+class TestLocalLRUCache:
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRUCache(max_entries=2, max_bytes=1024 * 1024, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        assert lru.get('a') == 1
+        assert lru.get('b') is _MISSING
+        assert lru.get('c') == 3
+
+    def test_evicts_by_size(self):
+        lru = LocalLRUCache(max_entries=100, max_bytes=300, timeout=60)
+        lru.set('a', 'x' * 200)
+        lru.set('b', 'y' * 200)
+
+        assert lru.get('a') is _MISSING
+        assert lru.stats()['bytes'] <= 300
+
+    def test_entries_expire(self):
+        lru = LocalLRUCache(max_entries=100, max_bytes=1024, timeout=0)
+        lru.set('a', 1)
+
+        assert lru.get('a') is _MISSING
+
+
+    def test_fill_skipped_after_invalidation(self):
+        lru = LocalLRUCache(max_entries=100, max_bytes=1024, timeout=60)
+        token = lru.token('a')
+        lru.delete('a')
+        lru.set('a', 'stale', token=token)
+
+        assert lru.get('a') is _MISSING
+
+        lru.set('a', 'fresh', token=lru.token('a'))
+
+        assert lru.get('a') == 'fresh'
+
+
+class TestTieredRedisCache:
+    def test_write_invalidates_other_process(self, cache_key):
+        location = settings.CACHES['default']['LOCATION'].rstrip('/')
+        # The L1 is per process and location, another spelling of the same server stands in for another process
+        first = TieredRedisCache(location, {'L1': {'CHANNEL': f'{cache_key}_channel'}})
+        second = TieredRedisCache(f'{location}/0', {'L1': {'CHANNEL': f'{cache_key}_channel'}})
+
+        first.set(cache_key, 'old')
+        assert second.get(cache_key) == 'old'
+        assert second.get(cache_key) == 'old'
+        assert second.stats()['l1_hits'] == 1
+
+        first.set(cache_key, 'new')
+
+        deadline = time.monotonic() + 5
+        while second.get(cache_key) != 'new' and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert second.get(cache_key) == 'new'
+
+        first._l1.stop()
+        second._l1.stop()
+
+    def test_invalidation_during_read_skips_fill(self, cache_key, monkeypatch):
+        location = settings.CACHES['default']['LOCATION'].rstrip('/')
+        backend = TieredRedisCache(location, {'L1': {'CHANNEL': f'{cache_key}_channel'}})
+        backend.set(cache_key, 'old')
+        backend._local.clear()
+        fetch = backend._fetch
+
+        def fetch_then_invalidate(made_keys):
+            found = fetch(made_keys)
+            # The invalidation message of a concurrent write lands before the fill
+            backend._l1.on_message({'data': json.dumps({'origin': 'other', 'keys': made_keys})})
+            return found
+
+        monkeypatch.setattr(backend, '_fetch', fetch_then_invalidate)
+
+        assert backend.get(cache_key) == 'old'
+        assert backend.get_many([cache_key]) == {cache_key: 'old'}
+        assert backend._local.get(backend.make_key(cache_key)) is _MISSING
+
+        backend._l1.stop()
+
+    def test_l1_expiry_capped_by_redis_ttl(self, cache_key):
+        location = settings.CACHES['default']['LOCATION'].rstrip('/')
+        backend = TieredRedisCache(location, {'L1': {'CHANNEL': f'{cache_key}_channel', 'TIMEOUT': 60}})
+        backend.get(cache_key)
+        cache.set(cache_key, 'value', 2)
+
+        assert backend.get(cache_key) == 'value'
+
+        _, expires = backend._local._data[backend.make_key(cache_key)]
+
+        assert expires - time.monotonic() <= 2
+
+        backend._l1.stop()
+
+    def test_threads_share_the_process_l1(self, cache_key, settings):
+        settings.CACHES = {
+            'default': {
+                **settings.CACHES['default'],
+                'BACKEND': 'common.cache_backends.TieredRedisCache',
+                'L1': {'CHANNEL': f'{cache_key}_channel'},
+            }
+        }
+        backends = []
+
+        def use_cache(action):
+            backend = caches['default']
+            backends.append(backend)
+            action(backend)
+
+        def write(backend):
+            backend.get(cache_key)
+            backend.set(cache_key, 'value')
+
+        for action in (write, lambda backend: backend.get(cache_key)):
+            thread = threading.Thread(target=use_cache, args=(action,))
+            thread.start()
+            thread.join()
+
+        use_cache(lambda backend: backend.get(cache_key))
+
+        # One backend instance per thread, one L1 for all of them
+        assert len({id(backend) for backend in backends}) == 3
+        assert len({id(backend._l1) for backend in backends}) == 1
+        assert len([key for key in _processes if key[1][1] == f'{cache_key}_channel']) == 1
+
+        l1 = backends[0]._l1
+        listeners = [thread for thread in threading.enumerate() if thread is l1.listener]
+
+        assert len(listeners) == 1
+        assert backends[0].stats()['l1_hits'] == backends[2].stats()['l1_hits'] == 2
+
+        l1.stop()
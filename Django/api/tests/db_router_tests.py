@@ -0,0 +1,134 @@
+import uuid
+
+import pytest
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from common.mixins import CacheMixin
+from common.redis_client import get_redis
+from main import db_router, settings
+from main.middleware import ReplicaRoutingMiddleware
+from task.models import Task
+from users.models import User
+
+
+@pytest.fixture
+def router():
+    return db_router.ReplicaRouter(replicas=['replica_0'])
+
+
+class TestReplicaRouter:
+    def test_reads_outside_requests_use_primary(self, router):
+        assert router.db_for_read(Task) == 'default'
+
+    def test_safe_request_reads_from_replica(self, router):
+        with db_router.routing(True):
+            assert router.db_for_read(Task) == 'replica_0'
+
+    def test_write_pins_request_to_primary(self, router):
+        with db_router.routing(True) as state:
+            router.db_for_write(Task)
+
+            assert router.db_for_read(Task) == 'default'
+            assert state.wrote
+
+    def test_excluded_apps_stay_on_primary(self, router):
+        from silk.models import Request
+
+        with db_router.routing(True) as state:
+            router.db_for_write(Request)
+
+            assert router.db_for_read(Request) == 'default'
+            assert router.db_for_read(Task) == 'replica_0'
+            assert not state.wrote
+
+    @pytest.mark.django_db
+    def test_atomic_block_reads_from_primary(self, router):
+        with db_router.routing(True), transaction.atomic():
+            assert router.db_for_read(Task) == 'default'
+
+
+class TestReplicaRoutingMiddleware:
+    @pytest.fixture(autouse=True)
+    def replicas(self, monkeypatch):
+        monkeypatch.setattr(settings, 'DATABASE_REPLICAS', ['replica_0'])
+
+    @pytest.fixture
+    def user(self, django_db_setup, django_db_blocker):
+        with django_db_blocker.unblock():
+            user = User.objects.get(username='base_user')
+
+        get_redis().delete(ReplicaRoutingMiddleware.pin_key(user.id))
+        yield user
+        get_redis().delete(ReplicaRoutingMiddleware.pin_key(user.id))
+
+    @staticmethod
+    def request(method, user):
+        token = RefreshToken.for_user(user).access_token
+        return getattr(RequestFactory(), method)('/', headers={'Authorization': f'Bearer {token}'})
+
+    @staticmethod
+    def recording_view(seen, write=False):
+        def view(request):
+            seen['replica'] = db_router._state.get().use_replica
+
+            if write:
+                db_router.ReplicaRouter(replicas=['replica_0']).db_for_write(User)
+
+            return HttpResponse()
+
+        return view
+
+    def test_write_pins_user(self, user):
+        seen = {}
+        ReplicaRoutingMiddleware(self.recording_view(seen, write=True))(self.request('get', user))
+
+        assert seen['replica'] is True
+        assert 0 < get_redis().ttl(ReplicaRoutingMiddleware.pin_key(user.id)) <= settings.REPLICA_PIN_SECONDS
+
+    def test_pinned_user_reads_from_primary(self, user):
+        seen = {}
+        ReplicaRoutingMiddleware(self.recording_view(seen, write=True))(self.request('post', user))
+        ReplicaRoutingMiddleware(self.recording_view(seen))(self.request('get', user))
+
+        assert seen['replica'] is False
+
+    def test_anonymous_requests_are_not_pinned(self):
+        seen = {}
+        response = ReplicaRoutingMiddleware(self.recording_view(seen, write=True))(RequestFactory().get('/'))
+
+        assert seen['replica'] is True
+        assert not response.cookies
+
+    def test_unsafe_methods_use_primary(self, user):
+        seen = {}
+        ReplicaRoutingMiddleware(self.recording_view(seen))(self.request('post', user))
+
+        assert seen['replica'] is False
+
+
+class TestCacheBuildersReadFromPrimary:
+    def test_builder_runs_on_primary(self, router):
+        seen = {}
+
+        def builder():
+            seen['read'] = router.db_for_read(Task)
+            return 'data'
+
+        with db_router.routing(True):
+            CacheMixin()._build_cache(f'test_primary_builder_{uuid.uuid4().hex}', builder, 1)
+
+            assert router.db_for_read(Task) == 'replica_0'
+
+        assert seen['read'] == 'default'
+
+    def test_write_inside_builder_keeps_the_pin(self, router):
+        with db_router.routing(True) as state:
+            with db_router.primary():
+                router.db_for_write(Task)
+
+            assert router.db_for_read(Task) == 'default'
+            assert state.wrote
@@ -1,4 +1,16 @@
-from users.models import Group, User
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.timezone import timedelta
+
+from common.cache_managers.group_cache import GroupCacheManager
+from common.partitions import MonthlyPartitions
+from rest_framework_simplejwt.tokens import RefreshToken
+from task.models import Project, Task, TaskPerformSession
+from users.models import Group, GroupLogs, User
 from pytest_config import api_url, create_groups_count
 import pytest
 
@@ -193,4 +205,394 @@ class TestGroups:
                 # First check Group exists
                 assert response.status_code == 404
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['base_user'], indirect=True)
+class TestGroupCacheInvalidation:
+    def test_detail_key_changes_on_project_create(self, auth_data):
+        user = auth_data['user']
+        group = Group.objects.create(name='Cache group', owner=user)
+        group.members.add(user)
+
+        key = GroupCacheManager.detail_key(group.id, user.id)
+        Project.objects.create(owner=user, group=group, title='New project')
+
+        assert GroupCacheManager.detail_key(group.id, user.id) != key
+
+    def test_group_list_refreshed_for_every_member(self, client, auth_data):
+        user = auth_data['user']
+        other = User.objects.get(username='owner_user')
+        group = Group.objects.create(name='Shared group', owner=other)
+        group.members.add(user, other)
+
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+        response = client.get(api_url + 'groups/', headers=headers)
+        assert group.id in [item['id'] for item in response.data['results']]
+
+        group.members.remove(user)
+
+        response = client.get(api_url + 'groups/', headers=headers)
+        assert group.id not in [item['id'] for item in response.data['results']]
+
+    def test_group_detail_refreshed_after_rename(self, client, auth_data):
+        user = auth_data['user']
+        group = Group.objects.create(name='Old name', owner=user)
+        group.members.add(user)
+
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+        response = client.get(api_url + f'groups/{group.id}/', headers=headers)
+        assert response.data['results']['name'] == 'Old name'
+
+        group.name = 'New name'
+        group.save()
+
+        response = client.get(api_url + f'groups/{group.id}/', headers=headers)
+        assert response.data['results']['name'] == 'New name'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestGroupCounters:
+    def test_members_count_follows_membership(self, auth_data):
+        owner = auth_data['user']
+        users = list(User.objects.exclude(id=owner.id))
+        group = Group.objects.create(name='Counted group', owner=owner)
+
+        group.members.add(owner, *users)
+        group.refresh_from_db()
+        assert group.members_count == len(users) + 1
+
+        # Adding an existing member must not change the counter
+        group.members.add(owner)
+        users[0].user_groups.remove(group)
+        group.members.remove(users[0])
+        group.refresh_from_db()
+        assert group.members_count == len(users)
+
+        group.members.clear()
+        group.refresh_from_db()
+        assert group.members_count == 0
+
+    def test_projects_count_follows_projects(self, auth_data):
+        owner = auth_data['user']
+        group = Group.objects.create(name='Project group', owner=owner)
+        other_group = Group.objects.create(name='Other group', owner=owner)
+
+        project = Project.objects.create(owner=owner, group=group, title='Project')
+        Project.objects.create(owner=owner, group=group, title='Second project')
+        group.refresh_from_db()
+        assert group.projects_count == 2
+
+        project.group = other_group
+        project.save()
+        group.refresh_from_db()
+        other_group.refresh_from_db()
+        assert group.projects_count == 1
+        assert other_group.projects_count == 1
+
+        project.delete()
+        other_group.refresh_from_db()
+        assert other_group.projects_count == 0
+
+    def test_repair_command(self, auth_data):
+        owner = auth_data['user']
+        group = Group.objects.create(name='Broken group', owner=owner)
+        group.members.add(owner)
+        Group.objects.filter(id=group.id).update(members_count=42, projects_count=7)
+
+        call_command('repair_group_counters', group=[group.id], stdout=io.StringIO())
+
+        group.refresh_from_db()
+        assert group.members_count == 1
+        assert group.projects_count == 0
+
+    def test_list_returns_counters(self, client, auth_data):
+        owner = auth_data['user']
+        group = Group.objects.create(name='Listed group', owner=owner)
+        group.members.add(owner)
+        Project.objects.create(owner=owner, group=group, title='Project')
+
+        response = client.get(api_url + 'groups/', headers={
+            'AUTHORIZATION': f"Bearer {auth_data['token']}"
+        })
+
+        item = next(item for item in response.data['results'] if item['id'] == group.id)
+        assert item['count_members'] == 1
+        assert item['count_projects'] == 1
+
+
+def app_queries(context):
+    return len([query for query in context.captured_queries if 'silk_' not in query['sql']])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestGroupTasksPreview:
+    def create_group(self, owner, projects_count, tasks_count):
+        group = Group.objects.create(name='Preview group', owner=owner)
+        group.members.add(owner)
+
+        for i in range(projects_count):
+            project = Project.objects.create(owner=owner, group=group, title=f'Project {i}')
+
+            for j in range(tasks_count):
+                Task.objects.create(
+                    status=Task.NO_STATUS,
+                    created_by=owner,
+                    project=project,
+                    name=f'Task {i}-{j}',
+                    description='',
+                    deadline=timezone.now(),
+                )
+
+        return group
+
+    def test_latest_tasks_per_project(self, client, auth_data):
+        group = self.create_group(auth_data['user'], projects_count=3, tasks_count=4)
+
+        response = client.get(api_url + f'groups/{group.id}/?tasks=3', headers={
+            'AUTHORIZATION': f"Bearer {auth_data['token']}"
+        })
+
+        assert response.status_code == 200
+
+        for project in response.data['results']['projects']:
+            names = [task['name'] for task in project['tasks']]
+            latest = list(
+                Task.objects.filter(project_id=project['id']).order_by('-created_at', '-id').values_list('name', flat=True)[:3]
+            )
+            assert names == latest
+
+    def test_queries_do_not_grow_with_tasks(self, client, auth_data):
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+        small = self.create_group(auth_data['user'], projects_count=2, tasks_count=1)
+        large = self.create_group(auth_data['user'], projects_count=2, tasks_count=6)
+
+        with CaptureQueriesContext(connection) as small_queries:
+            client.get(api_url + f'groups/{small.id}/', headers=headers)
+
+        with CaptureQueriesContext(connection) as large_queries:
+            client.get(api_url + f'groups/{large.id}/', headers=headers)
+
+        assert app_queries(small_queries) == app_queries(large_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestGroupLogs:
+    def create_logs(self, group, count, **fields):
+        logs = GroupLogs.objects.bulk_create([
+            GroupLogs(
+                group=group,
+                event=f'Event {i}',
+                event_type=fields.get('event_type', GroupLogs.ADD_MEMBER),
+                anchor=fields.get('anchor', None),
+            )
+            for i in range(count)
+        ])
+
+        # Shared created_at for a few rows to exercise the id tie-breaker
+        GroupLogs.objects.filter(id__in=[log.id for log in logs[:4]]).update(created_at=timezone.now())
+
+        return logs
+
+    def test_pages_cover_every_log_once(self, client, auth_data):
+        group = Group.objects.create(name='Logs group', owner=auth_data['user'])
+        self.create_logs(group, 23)
+
+        url = api_url + f'group/{group.id}/logs/?page_size=5'
+        events = []
+
+        while url:
+            response = client.get(url, headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"})
+
+            assert response.status_code == 200
+            events += [log['event'] for log in response.data['results']]
+            url = response.data['next']
+
+        assert len(events) == 23
+        assert len(set(events)) == 23
+
+    def test_filters_and_approximate_count(self, client, auth_data):
+        group = Group.objects.create(name='Logs group', owner=auth_data['user'])
+        self.create_logs(group, 3)
+        self.create_logs(group, 2, event_type=GroupLogs.INVITE_DEFLECTED, anchor=auth_data['user'])
+
+        response = client.get(
+            api_url + f'group/{group.id}/logs/?event-type=Invite deflected&username=owner_user&count=true',
+            headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"},
+        )
+
+        assert response.status_code == 200
+        assert len(response.data['results']) == 2
+        assert isinstance(response.data['count'], int)
+
+    def test_unknown_username(self, client, auth_data):
+        group = Group.objects.create(name='Logs group', owner=auth_data['user'])
+        self.create_logs(group, 2)
+
+        response = client.get(
+            api_url + f'group/{group.id}/logs/?username=nobody',
+            headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"},
+        )
+
+        assert response.data['results'] == []
+
+    def test_unknown_username_count(self, client, auth_data):
+        group = Group.objects.create(name='Logs group', owner=auth_data['user'])
+        self.create_logs(group, 2)
+
+        response = client.get(
+            api_url + f'group/{group.id}/logs/?username=ghost&count=true',
+            headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"},
+        )
+
+        assert response.status_code == 200
+        assert response.data['results'] == []
+        assert response.data['count'] == 0
+
+    def test_date_filter_prunes_partitions(self, auth_data):
+        group = Group.objects.create(name='Logs group', owner=auth_data['user'])
+        self.create_logs(group, 3)
+
+        now = timezone.localtime()
+        logs = GroupLogs.logmanager.filter_queries(GroupLogs.logmanager.group_select(group.id), {
+            'date-start': now.replace(day=1).strftime('%Y-%m-%dT%H:%M'),
+            'date-out': now.strftime('%Y-%m-%dT%H:%M'),
+        })
+
+        partitions = MonthlyPartitions('group_logs')
+        plan = logs.explain()
+        scanned = {name for name in partitions.existing().values() if name in plan}
+
+        assert partitions.name(partitions.month_start(timezone.now())) in scanned
+        assert len(scanned) <= 2
+        assert partitions.default not in plan
+
+
+@pytest.mark.django_db
+class TestMonthlyPartitions:
+    def test_create_moves_rows_out_of_default(self):
+        group = Group.objects.create(name='Partitions group', owner=User.objects.get(username='owner_user'))
+        partitions = MonthlyPartitions('group_logs')
+        month = partitions.add_months(partitions.month_start(timezone.now()), 24)
+
+        log = GroupLogs.objects.create(group=group, event='Future', event_type=GroupLogs.ADD_MEMBER)
+        GroupLogs.objects.filter(id=log.id).update(created_at=partitions.bound(month))
+
+        assert partitions.create(month, month) == [partitions.name(month)]
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {partitions.name(month)}")
+            assert cursor.fetchone()[0] == 1
+
+    def test_drop_before(self):
+        partitions = MonthlyPartitions('group_logs')
+        this_month = partitions.month_start(timezone.now())
+        old = partitions.add_months(this_month, -30)
+
+        partitions.create(old, old)
+
+        assert partitions.drop_before(partitions.add_months(this_month, -12)) == [partitions.name(old)]
+        assert this_month in partitions.existing()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestGroupDashboard:
+    @pytest.fixture
+    def dashboard_group(self, auth_data):
+        owner = auth_data['user']
+        member = User.objects.get(username='base_user')
+        group = Group.objects.create(name='Dashboard group', owner=owner)
+        group.members.add(owner, member)
+
+        project = Project.objects.create(owner=owner, group=group, title='Dashboard project')
+        Project.objects.create(owner=owner, group=group, title='Empty project')
+
+        now = timezone.now()
+        today = timezone.localdate()
+        week_end = timezone.make_aware(timezone.datetime.combine(today + timedelta(days=7 - today.weekday()), timezone.datetime.min.time()))
+
+        tasks = [
+            Task.objects.create(status=status, created_by=owner, project=project, name=f'Task {status}', description='', deadline=deadline)
+            for status, deadline in (
+                (Task.NO_STATUS, now - timedelta(days=1)),
+                (Task.BASE_STATUS, week_end - timedelta(seconds=1)),
+                (Task.URGENT_STATUS, week_end + timedelta(days=30)),
+            )
+        ]
+
+        tasks[0].performers.add(owner, member)
+        tasks[1].performers.add(owner)
+
+        for minutes in (10, 20):
+            TaskPerformSession.objects.create(performer=owner, task=tasks[0], duration=timedelta(minutes=minutes))
+
+        return group, project, tasks
+
+    def dashboard(self, client, auth_data, group):
+        return client.get(api_url + f'groups/{group.id}/dashboard/', headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"})
+
+    def test_summary(self, client, auth_data, dashboard_group):
+        group, project, _ = dashboard_group
+
+        response = self.dashboard(client, auth_data, group)
+
+        assert response.status_code == 200
+        assert response.data['results']['projects'][0] == {
+            'id': project.id,
+            'title': 'Dashboard project',
+            'tasks': 3,
+            'statuses': {Task.NO_STATUS: 1, Task.BASE_STATUS: 1, Task.URGENT_STATUS: 1},
+            'overdue': 1,
+            'due_this_week': 1,
+            'performers': 2,
+            # Not multiplied by the two performers of the task
+            'tracked_seconds': 30 * 60,
+        }
+        assert response.data['results']['projects'][1]['tasks'] == 0
+
+    def test_single_query(self, dashboard_group):
+        group, _, _ = dashboard_group
+
+        with CaptureQueriesContext(connection) as context:
+            list(Project.objects.filter(group=group).dashboard(timezone.now(), timezone.now()))
+
+        # Silk EXPLAINs queries when a request of an earlier test is still recorded
+        assert len([query for query in context.captured_queries if not query['sql'].startswith('EXPLAIN')]) == 1
+
+    def test_task_write_invalidates(self, client, auth_data, dashboard_group):
+        group, _, tasks = dashboard_group
+        self.dashboard(client, auth_data, group)
+
+        tasks[2].status = Task.NO_STATUS
+        tasks[2].save()
+
+        statuses = self.dashboard(client, auth_data, group).data['results']['projects'][0]['statuses']
+
+        assert statuses[Task.NO_STATUS] == 2
+
+    def test_performers_change_invalidates(self, client, auth_data, dashboard_group):
+        group, _, tasks = dashboard_group
+        self.dashboard(client, auth_data, group)
+
+        tasks[0].performers.clear()
+        tasks[1].performers.clear()
+
+        assert self.dashboard(client, auth_data, group).data['results']['projects'][0]['performers'] == 0
+
+        # Tasks of projects without a group have no group cache to drop
+        orphan = Project.objects.create(owner=auth_data['user'], title='Orphan project')
+        task = Task.objects.create(status=Task.NO_STATUS, created_by=auth_data['user'], project=orphan, name='Orphan', description='', deadline=timezone.now())
+        task.performers.add(auth_data['user'])
+        auth_data['user'].assigned_tasks.remove(task)
+
+    def test_hidden_from_non_members(self, client, dashboard_group):
+        group, _, _ = dashboard_group
+        stranger = User.objects.get(username='admin_user')
+        token = RefreshToken.for_user(stranger).access_token
+
+        response = client.get(api_url + f'groups/{group.id}/dashboard/', headers={'AUTHORIZATION': f"Bearer {token}"})
+
+        assert response.status_code == 404
 
@@ -0,0 +1,46 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from main import settings
+from main.middleware import LogMiddleware, QueryBudgetExceeded
+from users.models import User
+
+
+def n_plus_one_view(request):
+    for user_id in range(settings.QUERY_REPEAT_THRESHOLD):
+        User.objects.filter(id__in=range(user_id + 1)).first()
+
+    return HttpResponse()
+
+
+@pytest.mark.django_db
+class TestLogMiddleware:
+    def test_server_timing_header(self):
+        response = LogMiddleware(n_plus_one_view)(RequestFactory().get('/'))
+
+        assert f'desc="{settings.QUERY_REPEAT_THRESHOLD} queries"' in response['Server-Timing']
+
+    def test_repeated_shape_is_logged(self, caplog):
+        LogMiddleware(n_plus_one_view)(RequestFactory().get('/'))
+
+        assert 'Possible N+1 in /' in caplog.text
+
+    def test_over_budget_raises_in_strict_mode(self, monkeypatch):
+        monkeypatch.setattr(settings, 'QUERY_BUDGETS', {'/': 2})
+
+        with pytest.raises(QueryBudgetExceeded):
+            LogMiddleware(n_plus_one_view)(RequestFactory().get('/'))
+
+    def test_over_budget_is_logged_otherwise(self, monkeypatch, caplog):
+        monkeypatch.setattr(settings, 'QUERY_BUDGETS', {'/': 2})
+        monkeypatch.setattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+        LogMiddleware(n_plus_one_view)(RequestFactory().get('/'))
+
+        assert 'budget is 2' in caplog.text
+
+    def test_writes_are_not_budgeted(self, monkeypatch):
+        monkeypatch.setattr(settings, 'QUERY_BUDGETS', {'/': 2})
+
+        LogMiddleware(n_plus_one_view)(RequestFactory().post('/'))
@@ -0,0 +1,151 @@
+import pytest
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.timezone import timedelta
+
+from api.tasks import create_notify_user, maintain_history
+from common.cache_managers.notification_cache import NotificationCacheManager
+from pytest_config import api_url
+from users.models import Group, Notification, User
+
+
+@pytest.fixture
+def unread_key(auth_data):
+    key = NotificationCacheManager.unread_key(auth_data['user'].id)
+    cache.delete(key)
+
+    yield key
+
+    cache.delete(key)
+
+
+def create_notifications(user, count):
+    return [
+        Notification.objects.create(user=user, notify_type=Notification.TASK_UPDATE_MESSAGE, message=f'Message {i}')
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestNotifications:
+    def headers(self, auth_data):
+        return {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+
+    def test_pages_cover_every_notification_once(self, client, auth_data, unread_key):
+        create_notifications(auth_data['user'], 12)
+
+        url = api_url + 'notifications/'
+        ids = []
+
+        while url:
+            response = client.get(url, headers=self.headers(auth_data))
+
+            assert response.status_code == 200
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+
+        assert len(ids) == 12
+        assert len(set(ids)) == 12
+        assert 'count' not in response.data
+
+    def test_unread_counter_follows_writes(self, client, auth_data, unread_key, django_capture_on_commit_callbacks):
+        assert client.get(api_url + 'notifications/unread_count/', headers=self.headers(auth_data)).data['results']['unread_count'] == 0
+
+        with django_capture_on_commit_callbacks(execute=True):
+            notifications = create_notifications(auth_data['user'], 3)
+
+        assert cache.get(unread_key) == 3
+
+        response = client.post(
+            api_url + 'notifications/mark_read/',
+            {'ids': [notifications[0].id, notifications[0].id]},
+            headers=self.headers(auth_data),
+            content_type='application/json',
+        )
+
+        assert response.data['results'] == {'updated': 1, 'unread_count': 2}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            notifications[1].delete()
+
+        assert cache.get(unread_key) == 1
+
+        response = client.post(api_url + 'notifications/mark_all_read/', headers=self.headers(auth_data))
+
+        assert response.data['results'] == {'updated': 1, 'unread_count': 0}
+        assert client.get(api_url + 'notifications/unread_count/', headers=self.headers(auth_data)).data['results']['unread_count'] == 0
+
+    def test_mark_read_validates_ids(self, client, auth_data, unread_key):
+        response = client.post(
+            api_url + 'notifications/mark_read/',
+            {'ids': 'all'},
+            headers=self.headers(auth_data),
+            content_type='application/json',
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['base_user'], indirect=True)
+class TestInviteNotifications:
+    def test_invite_is_created_once(self, auth_data, unread_key, django_capture_on_commit_callbacks):
+        owner = User.objects.get(username='owner_user')
+        group = Group.objects.create(name='Invite group', owner=owner)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            for _ in range(3):
+                create_notify_user(
+                    user_id=auth_data['user'].id,
+                    type_message=Notification.INVITE_MESSAGE,
+                    notify_message='invite',
+                    push_message='invite',
+                    group_id=group.id,
+                )
+
+        invites = Notification.objects.filter(user=auth_data['user'], notify_type=Notification.INVITE_MESSAGE)
+
+        assert list(invites.values_list('group_id', flat=True)) == [group.id]
+        assert cache.get(unread_key) == 1
+
+    def test_constraint_rejects_duplicate_invite(self, auth_data):
+        owner = User.objects.get(username='owner_user')
+        group = Group.objects.create(name='Invite group', owner=owner)
+        invite = {'user': auth_data['user'], 'group': group, 'notify_type': Notification.INVITE_MESSAGE}
+
+        Notification.objects.create(**invite)
+
+        with pytest.raises(IntegrityError):
+            with transaction.atomic():
+                Notification.objects.create(**invite)
+
+        # Other notification types for the same group are not limited
+        Notification.objects.create(**{**invite, 'notify_type': Notification.TASK_UPDATE_MESSAGE})
+        Notification.objects.create(**{**invite, 'notify_type': Notification.TASK_UPDATE_MESSAGE})
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestNotificationRetention:
+    def test_old_notifications_are_purged(self, auth_data, unread_key):
+        user = auth_data['user']
+        group = Group.objects.create(name='Retention group', owner=user)
+        old_read, old_unread, recent = create_notifications(user, 3)
+        old_read.is_read = True
+        old_read.save()
+        invite = Notification.objects.create(user=user, notify_type=Notification.INVITE_MESSAGE, group=group)
+
+        Notification.objects.filter(id__in=[old_read.id, old_unread.id, invite.id]).update(
+            created_at=timezone.now() - timedelta(days=200)
+        )
+        assert NotificationCacheManager.get_unread(user.id) == 3
+
+        result = maintain_history(logs_retention_months=0, notifications_retention_days=180)
+
+        assert result['notifications_purged'] == 2
+        # Pending invites are still actionable
+        assert set(Notification.objects.filter(user=user).values_list('id', flat=True)) == {recent.id, invite.id}
+        assert NotificationCacheManager.get_unread(user.id) == 2
+
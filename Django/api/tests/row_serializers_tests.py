@@ -0,0 +1,110 @@
+import pytest
+from django.db.models import Prefetch
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers.group_logs_serializers import GroupLogsSerializer
+from api.serializers.notification_serializers import NotificationSerializer
+from api.serializers.row_serializers import (
+    GroupLogsRowSerializer,
+    NotificationRowSerializer,
+    TaskChatMessageRowSerializer,
+    TaskRowSerializer,
+)
+from api.serializers.task_chat_serializers import TaskChatMessageSerializer
+from api.serializers.task_serializers import TaskSerializer
+from task.models import Project, Task, TaskComment, TaskImage
+from users.models import Group, GroupLogs, Notification, User
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@pytest.fixture
+def rows_data(django_db_setup):
+    user = User.objects.create_user(
+        username='rows_user',
+        password='pass12345',
+        first_name='Row',
+        image_profile='media/avatar.png',
+        last_login=timezone.now(),
+    )
+    other = User.objects.create_user(username='rows_other', password='pass12345', last_login=timezone.now())
+
+    group = Group.objects.create(name='Rows group', owner=user)
+    project = Project.objects.create(owner=user, group=group, title='Rows project')
+
+    for i in range(3):
+        Task.objects.create(
+            status=Task.NO_STATUS,
+            created_by=user,
+            project=project,
+            name=f'Task {i}',
+            description='Описание',
+            deadline=timezone.now(),
+        )
+
+    Notification.objects.create(user=user, notify_type=Notification.INVITE_MESSAGE, group=group, message='invite')
+    Notification.objects.create(user=user, notify_type=Notification.TASK_UPDATE_MESSAGE, message='update', is_read=True)
+
+    task = Task.objects.first()
+    first = TaskComment.objects.create(task=task, user=user, text='first')
+    TaskComment.objects.create(task=task, user=other, text=None, answer_to=[first.id])
+    TaskComment.objects.create(task=task, user=user, text='third')
+    TaskImage.objects.create(message=first, title='a', image='task_images/a.png')
+    TaskImage.objects.create(
+        message=first, title='b', image='task_images/b.png', width=640, height=480, size=2048,
+        variants={'thumbnail': {'name': 'task_images/thumbnail/b.webp', 'width': 320, 'height': 240, 'size': 512}},
+    )
+
+    GroupLogs.objects.create(group=group, event='joined', event_type=GroupLogs.ADD_MEMBER, anchor=user, data={'id': 1})
+    GroupLogs.objects.create(group=group, event='left', event_type=GroupLogs.ADD_MEMBER)
+
+    return {'user': user, 'group': group, 'task': task}
+
+
+@pytest.mark.django_db
+class TestRowSerializers:
+    def test_tasks(self, rows_data):
+        queryset = Task.objects.select_related('created_by', 'project').order_by('-created_at', '-id')
+
+        expected = TaskSerializer(queryset, many=True, context={'method': 'get'}).data
+        actual = TaskRowSerializer(queryset.values(*TaskRowSerializer.values)).data
+
+        assert render(actual) == render(expected)
+
+    def test_notifications(self, rows_data):
+        queryset = Notification.objects.select_related('user').filter(user=rows_data['user']).order_by('-id')
+
+        expected = NotificationSerializer(queryset, many=True).data
+        actual = NotificationRowSerializer(
+            queryset.values(*NotificationRowSerializer.values), context={'user': rows_data['user']}
+        ).data
+
+        assert render(actual) == render(expected)
+
+    @pytest.mark.parametrize('with_request', [False, True])
+    def test_chat_messages(self, rows_data, with_request):
+        context = {'request': RequestFactory().get('/')} if with_request else {}
+        queryset = TaskComment.objects.filter(task=rows_data['task']).order_by('-id')
+
+        instances = queryset.select_related('user').prefetch_related(
+            Prefetch('message_image', queryset=TaskImage.objects.all().only('message', 'image', 'width', 'height', 'size', 'variants'), to_attr='task_images')
+        )
+
+        expected = TaskChatMessageSerializer(instances, many=True, context=context).data
+        actual = TaskChatMessageRowSerializer(
+            queryset.values(*TaskChatMessageRowSerializer.values), many=True, context=context
+        ).data
+
+        assert render(actual) == render(expected)
+
+    def test_group_logs(self, rows_data):
+        queryset = GroupLogs.logmanager.group_select(group_id=rows_data['group'].id).order_by('-created_at', '-id')
+
+        expected = GroupLogsSerializer(queryset, many=True).data
+        actual = GroupLogsRowSerializer(queryset.values(*GroupLogsRowSerializer.values)).data
+
+        assert render(actual) == render(expected)
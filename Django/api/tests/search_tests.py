@@ -0,0 +1,89 @@
+import pytest
+
+from pytest_config import api_url
+from task.models import Project, Task, TaskComment
+from users.models import Group, User
+
+
+@pytest.fixture
+def search_data(django_db_setup, auth_data):
+    owner = auth_data['user']
+    group = Group.objects.create(name='Search group', owner=owner)
+    group.members.add(owner)
+
+    project = Project.objects.create(owner=owner, group=group, title='Billing', description='Invoices and refunds')
+    task = Task.objects.create(
+        created_by=owner, project=project, status=Task.NO_STATUS, deadline=project.created_at,
+        name='Refund flow', description='Handle partial refunds for invoices',
+    )
+    comment = TaskComment.objects.create(task=task, user=owner, text='The refund webhook fails on retries')
+
+    # Same words in a group the user is not a member of
+    stranger = User.objects.get(username='base_user')
+    other_group = Group.objects.create(name='Other group', owner=stranger)
+    other_project = Project.objects.create(owner=stranger, group=other_group, title='Refund secrets')
+    Task.objects.create(
+        created_by=stranger, project=other_project, status=Task.NO_STATUS, deadline=project.created_at,
+        name='Refund secrets', description='',
+    )
+
+    return {'project': project, 'task': task, 'comment': comment}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestSearch:
+    def search(self, client, auth_data, **params):
+        return client.get(f'{api_url}search/', params, headers={
+            'AUTHORIZATION': f"Bearer {auth_data['token']}"
+        })
+
+    def test_results_restricted_to_user_groups(self, client, auth_data, search_data):
+        response = self.search(client, auth_data, q='refund')
+
+        assert response.status_code == 200
+
+        results = response.data['results']
+
+        assert [task['id'] for task in results['tasks']] == [search_data['task'].id]
+        assert [project['id'] for project in results['projects']] == [search_data['project'].id]
+        assert [comment['id'] for comment in results['comments']] == [search_data['comment'].id]
+        assert results['comments'][0]['project_id'] == search_data['project'].id
+
+    def test_headline_and_types(self, client, auth_data, search_data):
+        response = self.search(client, auth_data, q='webhook', types='comments')
+
+        results = response.data['results']
+
+        assert list(results) == ['comments']
+        assert '<b>webhook</b>' in results['comments'][0]['headline']
+
+    def test_vector_follows_updates(self, client, auth_data, search_data):
+        Task.objects.filter(id=search_data['task'].id).update(name='Chargeback flow')
+
+        response = self.search(client, auth_data, q='chargeback', types='tasks')
+
+        assert [task['id'] for task in response.data['results']['tasks']] == [search_data['task'].id]
+
+    def test_query_required(self, client, auth_data):
+        response = self.search(client, auth_data, q=' ')
+
+        assert response.status_code == 400
+
+    def test_create_responses_without_vector(self, client, auth_data, search_data):
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+        project = search_data['project']
+
+        response = client.post(f'{api_url}groups-projects/', {
+            'owner': auth_data['user'].id, 'group': project.group_id, 'title': 'Ledger',
+        }, headers=headers)
+
+        assert response.status_code == 201
+        assert 'search_vector' not in response.data['message']
+
+        response = client.post(f'{api_url}projects/{project.id}/tasks/', {
+            'name': 'Ledger export', 'description': 'CSV', 'status': Task.NO_STATUS, 'deadline': project.created_at.isoformat(),
+        }, headers=headers, content_type='application/json')
+
+        assert response.status_code == 201
+        assert 'search_vector' not in response.data['result']
@@ -0,0 +1,507 @@
+import asyncio
+import io
+import os
+import random
+import threading
+import time
+
+import channels.db
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from api.serializers.task_chat_serializers import TaskChatMessageSerializer
+from api.tasks import create_image_variants
+from main import settings
+from pytest_config import api_url
+from task.models import Project, Task, TaskComment, TaskImage
+from task.routing import websocket_urlpatterns
+from task import uploads as uploads_module
+from task.uploads import MAX_FILE_INDEX, PendingUploads, UploadError, pack_frame, save_attachments
+from users.models import Group, User
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    monkeypatch.setattr(settings, 'CHAT_UPLOAD_SPOOL_MEMORY', 16)
+    monkeypatch.setattr(settings, 'CHAT_UPLOAD_CHUNK_SIZE', 64)
+    monkeypatch.setattr(settings, 'CHAT_UPLOAD_MAX_FILE_SIZE', 256)
+    monkeypatch.setattr(settings, 'CHAT_UPLOAD_MAX_PENDING_SIZE', 512)
+
+    uploads = PendingUploads()
+    yield uploads
+    uploads.close()
+
+
+class TestPendingUploads:
+    def test_chunks_are_reassembled_in_any_order(self, uploads):
+        content = os.urandom(100)
+        uploads.start('m1', None, 2)
+        file = uploads.add_file('m1', 1, 'image.png', 100)
+
+        for offset in (75, 0, 50, 25):
+            assert not file.complete
+            message_id, index, _, _ = uploads.write(pack_frame('m1', 1, offset, content[offset:offset + 25]))
+
+        assert (message_id, index) == ('m1', 1)
+        assert file.complete and file.ranges == [(0, 100)]
+        assert file.open().read() == content
+
+        with pytest.raises(UploadError, match='overlapping_chunk'):
+            uploads.write(pack_frame('m1', 1, 10, b'x'))
+
+    def test_frame_errors(self, uploads):
+        uploads.start('m1', None, 1)
+        uploads.add_file('m1', 0, 'image.png', 100)
+
+        with pytest.raises(UploadError, match='bad_frame'):
+            uploads.write(b'\x05\x00')
+
+        with pytest.raises(UploadError, match='unknown_message'):
+            uploads.write(pack_frame('m2', 0, 0, b'x'))
+
+        with pytest.raises(UploadError, match='bad_file_index'):
+            uploads.write(pack_frame('m1', 1, 0, b'x'))
+
+        with pytest.raises(UploadError, match='file_size_mismatch'):
+            uploads.write(pack_frame('m1', 0, 90, b'x' * 11))
+
+        with pytest.raises(UploadError, match='incomplete_upload'):
+            uploads.pop('m1')
+
+    def test_limits(self, uploads):
+        uploads.start('m1', None, 3)
+
+        with pytest.raises(UploadError, match='file_too_large'):
+            uploads.add_file('m1', 0, 'big.png', 257)
+
+        uploads.add_file('m1', 0, 'image.png', 200)
+
+        with pytest.raises(UploadError, match='chunk_too_large'):
+            uploads.write(pack_frame('m1', 0, 0, b'x' * 65))
+
+        uploads.add_file('m1', 1, 'image.png', 256)
+        uploads.start('m2', None, 1)
+
+        with pytest.raises(UploadError, match='connection_limit'):
+            uploads.add_file('m2', 0, 'image.png', 100)
+
+        with pytest.raises(UploadError, match='too_many_files'):
+            uploads.start('m3', None, settings.CHAT_UPLOAD_MAX_PENDING_FILES)
+
+    def test_negative_files_count_rejected(self, uploads):
+        with pytest.raises(UploadError, match='bad_request'):
+            uploads.start('m1', None, -settings.CHAT_UPLOAD_MAX_PENDING_FILES)
+
+        assert uploads.files_count == 0
+
+        with pytest.raises(UploadError, match='too_many_files'):
+            uploads.start('m2', None, settings.CHAT_UPLOAD_MAX_PENDING_FILES + 1)
+
+    def test_negative_file_size_rejected(self, uploads):
+        uploads.start('m1', None, 2)
+
+        with pytest.raises(UploadError, match='bad_request'):
+            uploads.add_file('m1', 0, 'image.png', -settings.CHAT_UPLOAD_MAX_PENDING_SIZE)
+
+        assert uploads.size == 0
+
+        uploads.add_file('m1', 0, 'image.png', 256)
+        uploads.add_file('m1', 1, 'image.png', 256)
+        uploads.start('m2', None, 1)
+
+        with pytest.raises(UploadError, match='connection_limit'):
+            uploads.add_file('m2', 0, 'image.png', 1)
+
+    def test_file_index_within_frame_range(self, uploads, monkeypatch):
+        monkeypatch.setattr(settings, 'CHAT_UPLOAD_MAX_PENDING_FILES', MAX_FILE_INDEX + 2)
+        uploads.start('m1', None, MAX_FILE_INDEX + 2)
+
+        with pytest.raises(UploadError, match='bad_file_index'):
+            uploads.add_file('m1', MAX_FILE_INDEX + 1, 'image.png', 10)
+
+    def test_abandoned_messages_expire(self, uploads, monkeypatch):
+        monkeypatch.setattr(settings, 'CHAT_UPLOAD_PENDING_TTL', 60)
+
+        uploads.start('m1', None, 1)
+        file = uploads.add_file('m1', 0, 'image.png', 10)
+        uploads.write(pack_frame('m1', 0, 0, b'x' * 5))
+
+        touched_at = uploads.messages['m1'].touched_at
+
+        assert uploads.evict_expired(touched_at + 30) == []
+        assert uploads.evict_expired(touched_at + 61) == ['m1']
+        assert uploads.messages == {} and uploads.size == 0
+        assert file.spool.closed
+
+
+class TestSaveAttachments:
+    @pytest.fixture
+    def pending(self, uploads, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+
+        uploads.start('m1', None, 3)
+
+        for index in range(3):
+            uploads.add_file('m1', index, f'image_{index}.png', 50)
+            uploads.write(pack_frame('m1', index, 0, bytes([index]) * 50))
+
+        return uploads.pop('m1')
+
+    def test_files_are_stored_in_parallel_off_the_sync_thread(self, pending, monkeypatch):
+        threads = set()
+        store_file = uploads_module.store_file
+
+        def record_store_file(file):
+            threads.add(threading.current_thread().name)
+            return store_file(file)
+
+        def create_images(message, names):
+            threads.add(threading.current_thread().name)
+            return [TaskImage(message=message, image=name) for name in names]
+
+        monkeypatch.setattr(uploads_module, 'store_file', record_store_file)
+        monkeypatch.setattr(uploads_module, 'create_images', create_images)
+
+        images = async_to_sync(save_attachments)(pending)
+
+        assert [image.image.read() for image in images] == [bytes([index]) * 50 for index in range(3)]
+        assert threads and all(name.startswith('chat-attachments') for name in threads)
+
+    def test_stored_files_are_deleted_on_failure(self, pending, tmp_path, monkeypatch):
+        def create_images(message, names):
+            assert len(list((tmp_path / 'task_images').iterdir())) == 3
+            raise RuntimeError
+
+        monkeypatch.setattr(uploads_module, 'create_images', create_images)
+
+        with pytest.raises(RuntimeError):
+            async_to_sync(save_attachments)(pending)
+
+        assert list((tmp_path / 'task_images').iterdir()) == []
+
+    def test_variants_scheduled_in_the_background(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(uploads_module, 'schedule_image_variants', lambda ids: calls.append((ids, threading.current_thread().name)))
+
+        async def run():
+            uploads_module.schedule_variants([TaskImage(id=1), TaskImage(id=2)])
+            # Nothing waits for it, it runs once the consumer yields
+            assert calls == []
+            await asyncio.gather(*uploads_module._variant_tasks)
+
+        async_to_sync(run)()
+
+        assert calls[0][0] == [1, 2] and calls[0][1].startswith('chat-attachments')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestChatConsumerUploads:
+    @pytest.fixture
+    def task(self, auth_data, monkeypatch):
+        monkeypatch.setattr(channel_layers, 'backends', {'default': InMemoryChannelLayer()})
+        # database_sync_to_async runs on this thread, it must not close the test transaction.
+        # The attachments executor has its own connections, outside of it
+        monkeypatch.setattr(channels.db, 'close_old_connections', lambda: None)
+        monkeypatch.setattr(uploads_module, 'in_executor', database_sync_to_async)
+
+        owner = auth_data['user']
+        group = Group.objects.create(name='Chat group', owner=owner)
+        group.members.add(owner)
+        project = Project.objects.create(owner=owner, group=group, title='Chat project')
+
+        return Task.objects.create(
+            status=Task.NO_STATUS, created_by=owner, project=project, name='Chat task', description='', deadline=timezone.now(),
+        )
+
+    @pytest.fixture
+    def media_root(self, settings, tmp_path):
+        # pytest-django's settings fixture, resets the default storage
+        settings.MEDIA_ROOT = str(tmp_path)
+        return tmp_path
+
+    @staticmethod
+    def application(user):
+        router = URLRouter(websocket_urlpatterns)
+
+        async def application(scope, receive, send):
+            return await router({**scope, 'user': user}, receive, send)
+
+        return application
+
+    @classmethod
+    def communicator(cls, user, task):
+        return WebsocketCommunicator(cls.application(user), f'/ws/chat/{task.id}/')
+
+    @staticmethod
+    async def upload(communicator, task, messages):
+        """
+        Uploads ``{message id: [file content]}`` concurrently: the frames of every file of
+        every message are shuffled and sent within the advertised window. Returns the
+        broadcast chat messages and the upload time.
+        """
+        chunk_size = settings.CHAT_UPLOAD_CHUNK_SIZE
+        frames = []
+
+        for message_id, files in messages.items():
+            await communicator.send_json_to({
+                'type': 'message_metadata', 'messageId': message_id, 'taskId': task.id,
+                'message': f'Message {message_id}', 'filesCount': len(files),
+            })
+            ready = await communicator.receive_json_from(timeout=5)
+            assert ready['type'] == 'upload_ready'
+
+            for index, content in enumerate(files):
+                await communicator.send_json_to({
+                    'type': 'file_metadata', 'messageId': message_id, 'fileIndex': index,
+                    'fileName': f'{message_id}_{index}.png', 'fileSize': len(content),
+                })
+
+                for offset in range(0, len(content), chunk_size):
+                    frames.append((message_id, index, offset, content[offset:offset + chunk_size]))
+
+        random.Random(0).shuffle(frames)
+
+        in_flight = {}
+        start = time.perf_counter()
+
+        async def receive_ack():
+            ack = await communicator.receive_json_from(timeout=5)
+            assert ack['type'] == 'upload_ack', ack
+            in_flight.pop((ack['messageId'], ack['fileIndex'], ack['offset']))
+
+        for message_id, index, offset, chunk in frames:
+            await communicator.send_to(bytes_data=pack_frame(message_id, index, offset, chunk))
+            in_flight[(message_id, index, offset)] = len(chunk)
+
+            while sum(in_flight.values()) >= settings.CHAT_UPLOAD_WINDOW:
+                await receive_ack()
+
+        while in_flight:
+            await receive_ack()
+
+        elapsed = time.perf_counter() - start
+        broadcasts = []
+
+        for message_id in messages:
+            await communicator.send_json_to({'type': 'message_complete', 'messageId': message_id})
+            broadcasts.append(await communicator.receive_json_from(timeout=10))
+
+        return broadcasts, elapsed
+
+    def test_concurrent_uploads_are_reassembled(self, auth_data, task, media_root, monkeypatch, record_property):
+        monkeypatch.setattr(settings, 'CHAT_UPLOAD_CHUNK_SIZE', 32 * 1024)
+        monkeypatch.setattr(settings, 'CHAT_UPLOAD_WINDOW', 256 * 1024)
+
+        messages = {
+            'first': [os.urandom(512 * 1024), os.urandom(100 * 1024 + 7)],
+            'second': [os.urandom(300 * 1024)],
+        }
+        total = sum(len(content) for files in messages.values() for content in files)
+
+        async def run():
+            communicator = self.communicator(auth_data['user'], task)
+            connected, _ = await communicator.connect()
+            assert connected
+
+            try:
+                return await self.upload(communicator, task, messages)
+            finally:
+                await communicator.disconnect()
+
+        with CaptureQueriesContext(connection) as queries:
+            broadcasts, elapsed = async_to_sync(run)()
+
+        # Reported in the junit xml, e.g. pytest --junitxml
+        record_property('upload_mb_per_s', round(total / elapsed / 1024 / 1024, 1))
+
+        assert [len(item['message']['images_urls']) for item in broadcasts] == [2, 1]
+        # One bulk_create per message
+        assert sum(query['sql'].startswith('INSERT INTO "task_image"') for query in queries) == 2
+
+        images = TaskImage.objects.filter(message__task=task).order_by('id')
+
+        assert [image.image.read() for image in images] == [*messages['first'], *messages['second']]
+
+    def test_errors_are_reported(self, auth_data, task, media_root):
+        async def run():
+            communicator = self.communicator(auth_data['user'], task)
+            await communicator.connect()
+
+            await communicator.send_to(bytes_data=pack_frame('missing', 0, 0, b'x'))
+            unknown = await communicator.receive_json_from(timeout=5)
+
+            await communicator.send_json_to({'type': 'file_metadata', 'messageId': 'missing'})
+            bad_request = await communicator.receive_json_from(timeout=5)
+
+            await communicator.disconnect()
+            return unknown, bad_request
+
+        unknown, bad_request = async_to_sync(run)()
+
+        assert unknown == {'type': 'upload_error', 'messageId': 'missing', 'code': 'unknown_message'}
+        assert bad_request['code'] == 'bad_request'
+
+    def test_non_members_are_rejected(self, task):
+        async def connect(user, task_id):
+            communicator = WebsocketCommunicator(self.application(user), f'/ws/chat/{task_id}/')
+            connected, code = await communicator.connect()
+            await communicator.disconnect()
+            return connected, code
+
+        stranger = User.objects.get(username='base_user')
+
+        assert async_to_sync(connect)(stranger, task.id) == (False, 4403)
+        assert async_to_sync(connect)(AnonymousUser(), task.id) == (False, 4403)
+        assert async_to_sync(connect)(task.created_by, 'abc') == (False, 4403)
+
+    def test_messages_for_other_tasks_are_rejected(self, auth_data, task):
+        other = Task.objects.create(
+            status=Task.NO_STATUS, created_by=task.created_by, project=task.project, name='Other task', description='',
+            deadline=timezone.now(),
+        )
+
+        async def run():
+            communicator = self.communicator(auth_data['user'], task)
+            await communicator.connect()
+
+            await communicator.send_json_to({
+                'type': 'message_metadata', 'messageId': 'm1', 'taskId': other.id, 'message': 'wrong room', 'filesCount': 0,
+            })
+
+            error = await communicator.receive_json_from(timeout=5)
+
+            await communicator.disconnect()
+            return error
+
+        with CaptureQueriesContext(connection) as queries:
+            error = async_to_sync(run)()
+
+        assert error == {'type': 'upload_error', 'messageId': 'm1', 'code': 'forbidden_task'}
+        # Only the membership lookup at connect
+        assert len([query for query in queries if not query['sql'].startswith('EXPLAIN')]) == 1
+        assert not TaskComment.objects.filter(task__in=[task, other]).exists()
+
+    def test_kicked_member_is_disconnected(self, client, auth_data, task, django_capture_on_commit_callbacks):
+        member = User.objects.get(username='base_user')
+        task.project.group.members.add(member)
+
+        def kick():
+            with django_capture_on_commit_callbacks(execute=True):
+                return client.post(
+                    api_url + f'groups/{task.project.group_id}/delete_member/', {'userId': member.id},
+                    headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"}, content_type='application/json',
+                )
+
+        async def run():
+            owner_socket = self.communicator(auth_data['user'], task)
+            member_socket = self.communicator(member, task)
+            await owner_socket.connect()
+            await member_socket.connect()
+
+            response = await database_sync_to_async(kick)()
+
+            revoked = await member_socket.receive_json_from(timeout=5)
+            closed = await member_socket.receive_output(timeout=5)
+            owner_untouched = await owner_socket.receive_nothing()
+
+            await owner_socket.disconnect()
+            return response, revoked, closed, owner_untouched
+
+        response, revoked, closed, owner_untouched = async_to_sync(run)()
+
+        assert response.status_code == 200
+        assert revoked == {'type': 'access_revoked', 'taskId': task.id}
+        assert closed == {'type': 'websocket.close', 'code': 4403}
+        assert owner_untouched
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestImageVariants:
+    @pytest.fixture
+    def message(self, auth_data, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+
+        owner = auth_data['user']
+        group = Group.objects.create(name='Images group', owner=owner)
+        project = Project.objects.create(owner=owner, group=group, title='Images project')
+        task = Task.objects.create(
+            status=Task.NO_STATUS, created_by=owner, project=project, name='Images task', description='', deadline=timezone.now(),
+        )
+
+        return TaskComment.objects.create(task=task, user=owner, text='photos')
+
+    def test_variants_are_created(self, message):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees
+        Image.new('RGB', (2000, 1000), 'red').save(buffer, 'JPEG', exif=exif)
+
+        image = TaskImage.objects.create(message=message, image=f'task_images/photo_{message.id}.jpg')
+        image.image.storage.save(image.image.name, io.BytesIO(buffer.getvalue()))
+
+        assert create_image_variants([image.id]) == 1
+
+        image.refresh_from_db()
+
+        assert (image.width, image.height, image.size) == (1000, 2000, len(buffer.getvalue()))
+        assert {name: (variant['width'], variant['height']) for name, variant in image.variants.items()} == {
+            'thumbnail': (160, 320),
+            'preview': (640, 1280),
+        }
+
+        for variant in image.variants.values():
+            with image.image.storage.open(variant['name']) as file, Image.open(file) as picture:
+                assert picture.format == 'WEBP'
+                assert picture.size == (variant['width'], variant['height'])
+                assert image.image.storage.size(variant['name']) == variant['size']
+
+        message.task_images = [image]
+        data = TaskChatMessageSerializer(message).data['images_urls'][0]
+
+        assert data['thumbnail'] == {'url': f"/media/{image.variants['thumbnail']['name']}", 'width': 160, 'height': 320, 'size': image.variants['thumbnail']['size']}
+        assert (data['width'], data['height']) == (1000, 2000)
+
+    def test_storage_errors_are_not_unreadable_images(self, message, monkeypatch):
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100), 'red').save(buffer, 'PNG')
+
+        image = TaskImage.objects.create(message=message, image=f'task_images/square_{message.id}.png')
+        image.image.storage.save(image.image.name, buffer)
+
+        def full_disk(*args, **kwargs):
+            raise OSError('No space left on device')
+
+        monkeypatch.setattr(FileSystemStorage, 'save', full_disk)
+
+        with pytest.raises(OSError):
+            create_image_variants([image.id])
+
+        image.refresh_from_db()
+
+        assert image.width is None and image.variants == {}
+
+    def test_other_files_only_get_their_size(self, message):
+        image = TaskImage.objects.create(message=message, image=f'task_images/notes_{message.id}.png')
+        image.image.storage.save(image.image.name, io.BytesIO(b'not an image'))
+
+        create_image_variants([image.id])
+        image.refresh_from_db()
+
+        assert (image.width, image.height, image.size, image.variants) == (None, None, 12, {})
+
+        message.task_images = [image]
+        data = TaskChatMessageSerializer(message).data['images_urls'][0]
+
+        assert data['thumbnail'] is None and data['preview'] is None
@@ -0,0 +1,357 @@
+import io
+import time
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import views
+from api.tasks import flush_session_heartbeats, update_performers_sessions
+from common.redis_client import get_redis
+from main import settings
+from pytest_config import api_url
+from task.heartbeats import SessionHeartbeats
+from task.models import Project, Task, TaskPerformSession, TaskTimeRollup
+from users.models import Group, Notification, User
+
+
+@pytest.fixture
+def project(django_db_setup, auth_data):
+    owner = auth_data['user']
+    group = Group.objects.create(name='Tasks group', owner=owner)
+    group.members.add(owner)
+
+    return Project.objects.create(owner=owner, group=group, title='Tasks project')
+
+
+def create_tasks(project, user, count, **fields):
+    now = timezone.now()
+
+    tasks = [
+        Task(
+            status=fields.get('status', Task.NO_STATUS),
+            created_by=user,
+            project=project,
+            name=f'Task {i}',
+            description='',
+            deadline=fields.get('deadline', now),
+        )
+        for i in range(count)
+    ]
+
+    return Task.objects.bulk_create(tasks)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestTaskList:
+    def get_all_pages(self, client, auth_data, url):
+        ids = []
+
+        while url:
+            response = client.get(url, headers={
+                'AUTHORIZATION': f"Bearer {auth_data['token']}"
+            })
+
+            assert response.status_code == 200
+            ids += [task['id'] for task in response.data['result']]
+            url = response.data['next']
+
+        return ids
+
+    def test_pages_cover_every_task_once(self, client, auth_data, project):
+        tasks = create_tasks(project, auth_data['user'], 23)
+
+        # Same created_at for a few rows, the id tie-breaker has to keep them apart
+        Task.objects.filter(id__in=[task.id for task in tasks[:6]]).update(created_at=timezone.now())
+
+        ids = self.get_all_pages(client, auth_data, api_url + f'projects/{project.id}/tasks/?page_size=5')
+
+        assert len(ids) == 23
+        assert set(ids) == {task.id for task in tasks}
+
+    def test_previous_link(self, client, auth_data, project):
+        create_tasks(project, auth_data['user'], 10)
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+
+        first = client.get(api_url + f'projects/{project.id}/tasks/?page_size=4', headers=headers)
+        second = client.get(first.data['next'], headers=headers)
+        back = client.get(second.data['previous'], headers=headers)
+
+        assert first.data['previous'] is None
+        assert [task['id'] for task in back.data['result']] == [task['id'] for task in first.data['result']]
+
+    def test_filters(self, client, auth_data, project):
+        user = auth_data['user']
+        create_tasks(project, user, 3, status=Task.NO_STATUS)
+        urgent = create_tasks(project, user, 2, status=Task.URGENT_STATUS, deadline=timezone.now() + timedelta(days=10))
+        urgent[0].performers.add(user)
+
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+
+        response = client.get(api_url + f'projects/{project.id}/tasks/?status=US', headers=headers)
+        assert {task['id'] for task in response.data['result']} == {task.id for task in urgent}
+
+        deadline_from = (timezone.now() + timedelta(days=5)).date().isoformat()
+        response = client.get(api_url + f'projects/{project.id}/tasks/?deadline_from={deadline_from}', headers=headers)
+        assert {task['id'] for task in response.data['result']} == {task.id for task in urgent}
+
+        response = client.get(api_url + f'projects/{project.id}/tasks/?performer={user.id}', headers=headers)
+        assert [task['id'] for task in response.data['result']] == [urgent[0].id]
+
+        # Impossible dates are ignored like malformed ones
+        response = client.get(api_url + f'projects/{project.id}/tasks/?deadline_from=2024-02-30&deadline_to=2024-02-30T10:00', headers=headers)
+        assert response.status_code == 200
+        assert len(response.data['result']) == 5
+
+    def test_tasks_route_limited_to_user_groups(self, client, auth_data, project):
+        own = create_tasks(project, auth_data['user'], 2)
+        foreign_group = Group.objects.create(name='Foreign group', owner=auth_data['user'])
+        foreign_project = Project.objects.create(owner=auth_data['user'], group=foreign_group, title='Foreign')
+        create_tasks(foreign_project, auth_data['user'], 2)
+
+        ids = self.get_all_pages(client, auth_data, api_url + 'tasks/')
+
+        assert set(ids) == {task.id for task in own}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestTimeRollups:
+    def test_sessions_roll_up_per_day(self, client, auth_data, project):
+        headers = {'AUTHORIZATION': f"Bearer {auth_data['token']}"}
+        task = create_tasks(project, auth_data['user'], 1)[0]
+
+        for minutes in (10, 5):
+            response = client.post(api_url + 'task-sessions/start_session_performer/', {'taskId': task.id}, headers=headers)
+            session_id = response.data['results']['id']
+
+            # The client sends the running total, only the difference is added
+            for elapsed in (minutes - 1, minutes):
+                client.patch(
+                    api_url + f'task-sessions/{session_id}/update_session_performer/',
+                    {'time': elapsed * 60 * 1000},
+                    headers=headers,
+                    content_type='application/json',
+                )
+
+        response = client.get(api_url + f'task-statistics/{task.id}/summary/?period=day', headers=headers)
+
+        assert response.status_code == 200
+        assert response.data['results']['buckets'] == [{
+            'bucket': timezone.localdate(),
+            'performer': {'id': auth_data['user'].id, 'username': auth_data['user'].username},
+            'duration': 15 * 60,
+            'sessions': 2,
+        }]
+
+        response = client.get(api_url + f'task-statistics/{task.id}/summary/?performer={auth_data["user"].id}', headers=headers)
+        assert len(response.data['results']['buckets']) == 1
+
+        response = client.get(api_url + f'task-statistics/{task.id}/summary/?performer=abc', headers=headers)
+        assert response.status_code == 400
+
+    def test_rebuild_matches_incremental(self, client, auth_data, project):
+        task = create_tasks(project, auth_data['user'], 1)[0]
+
+        for minutes in (3, 4):
+            TaskPerformSession.objects.create(performer=auth_data['user'], task=task, duration=timedelta(minutes=minutes))
+
+        call_command('rebuild_time_rollups', task=[task.id], stdout=io.StringIO())
+
+        rollup = TaskTimeRollup.objects.get(task=task)
+
+        assert rollup.duration == timedelta(minutes=7)
+        assert rollup.sessions == 2
+
+    def test_summary_hidden_from_non_members(self, client, project):
+        stranger = User.objects.get(username='base_user')
+        token = RefreshToken.for_user(stranger).access_token
+        task = create_tasks(project, project.owner, 1)[0]
+
+        response = client.get(api_url + f'task-statistics/{task.id}/summary/', headers={'AUTHORIZATION': f"Bearer {token}"})
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestSessionHeartbeats:
+    @pytest.fixture
+    def session(self, auth_data, project, monkeypatch):
+        monkeypatch.setattr(views, 'IS_ENABLE_CELERY', True)
+
+        task = create_tasks(project, auth_data['user'], 1)[0]
+        session = TaskPerformSession.objects.create(performer=auth_data['user'], task=task, duration=timedelta(0), is_active=True)
+
+        yield session
+
+        SessionHeartbeats.forget([session.id])
+
+    def beat(self, client, auth_data, session, seconds):
+        return client.patch(
+            api_url + f'task-sessions/{session.id}/update_session_performer/',
+            {'time': seconds * 1000},
+            headers={'AUTHORIZATION': f"Bearer {auth_data['token']}"},
+            content_type='application/json',
+        )
+
+    def test_ticks_are_buffered_until_flush(self, client, auth_data, session):
+        for seconds in (10, 20, 30):
+            assert self.beat(client, auth_data, session, seconds).status_code == 200
+
+        session.refresh_from_db()
+        assert session.duration == timedelta(0)
+
+        flush_session_heartbeats()
+
+        session.refresh_from_db()
+        assert session.duration == timedelta(seconds=30)
+        assert TaskTimeRollup.objects.get(task=session.task).duration == timedelta(seconds=30)
+
+    def test_foreign_session_rejected(self, client, session):
+        stranger = User.objects.get(username='base_user')
+        token = RefreshToken.for_user(stranger).access_token
+
+        response = self.beat(client, {'token': token}, session, 10)
+
+        assert response.status_code == 404
+
+    def test_silent_sessions_expire(self, client, auth_data, session):
+        self.beat(client, auth_data, session, 10)
+        get_redis().zadd(SessionHeartbeats.SEEN_KEY, {session.id: time.time() - settings.SESSION_HEARTBEAT_TIMEOUT - 1})
+
+        update_performers_sessions()
+
+        session.refresh_from_db()
+        assert session.is_active is False
+        assert session.duration == timedelta(seconds=10)
+
+
+    def test_buffer_outlives_a_late_flush(self, client, auth_data, session):
+        self.beat(client, auth_data, session, 10)
+
+        assert get_redis().ttl(SessionHeartbeats._key(session.id)) == -1
+
+    def test_closed_session_not_written(self, client, auth_data, session):
+        self.beat(client, auth_data, session, 10)
+        # Closed while a tick was in flight
+        TaskPerformSession.objects.filter(id=session.id).update(is_active=False)
+
+        flush_session_heartbeats()
+
+        session.refresh_from_db()
+        assert session.duration == timedelta(0)
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestBulkTaskUpdate:
+    def bulk_update(self, client, auth_data, **data):
+        return client.post(api_url + 'tasks/bulk_update/', data, headers={
+            'AUTHORIZATION': f"Bearer {auth_data['token']}"
+        }, content_type='application/json')
+
+    @pytest.fixture
+    def second_project(self, auth_data, project):
+        group = Group.objects.create(name='Second tasks group', owner=auth_data['user'])
+        group.members.add(auth_data['user'], User.objects.get(username='base_user'))
+
+        return Project.objects.create(owner=auth_data['user'], group=group, title='Second project')
+
+    def test_status_and_deadline(self, client, auth_data, project, second_project):
+        tasks = create_tasks(project, auth_data['user'], 3) + create_tasks(second_project, auth_data['user'], 2)
+        deadline = timezone.now() + timedelta(days=7)
+
+        response = self.bulk_update(
+            client, auth_data,
+            ids=[task.id for task in tasks], status=Task.URGENT_STATUS, deadline=deadline.isoformat(),
+        )
+
+        assert response.status_code == 200
+        assert response.data['results']['updated'] == 5
+        assert set(Task.objects.filter(id__in=[task.id for task in tasks]).values_list('status', 'deadline')) == {
+            (Task.URGENT_STATUS, deadline)
+        }
+
+        # One notification per member, the owner is a member of both groups
+        notifications = Notification.objects.filter(notify_type=Notification.TASK_UPDATE_MESSAGE)
+        assert sorted(notifications.values_list('user__username', flat=True)) == ['base_user', 'owner_user']
+
+    def test_unchanged_tasks_are_not_notified(self, client, auth_data, project):
+        tasks = create_tasks(project, auth_data['user'], 2, status=Task.URGENT_STATUS)
+
+        response = self.bulk_update(client, auth_data, ids=[task.id for task in tasks], status=Task.URGENT_STATUS)
+
+        assert response.data['results']['updated'] == 0
+        assert not Notification.objects.exists()
+
+    def test_foreign_tasks_not_found(self, client, auth_data, project):
+        task = create_tasks(project, auth_data['user'], 1)[0]
+        stranger = User.objects.get(username='base_user')
+        token = RefreshToken.for_user(stranger).access_token
+
+        response = self.bulk_update(client, {'token': token}, ids=[task.id], status=Task.URGENT_STATUS)
+
+        assert response.status_code == 404
+        assert response.data['ids'] == [task.id]
+
+        task.refresh_from_db()
+        assert task.status == Task.NO_STATUS
+
+    def test_performers(self, client, auth_data, project):
+        tasks = create_tasks(project, auth_data['user'], 3)
+        owner = auth_data['user']
+        tasks[0].performers.add(owner)
+
+        response = self.bulk_update(client, auth_data, ids=[task.id for task in tasks], add_performers=[owner.id])
+
+        assert response.data['results']['performers_added'] == 2
+        assert Task.objects.filter(performers=owner).count() == 3
+
+        response = self.bulk_update(client, auth_data, ids=[tasks[0].id], remove_performers=[owner.id])
+
+        assert response.data['results']['performers_removed'] == 1
+        assert Task.objects.filter(performers=owner).count() == 2
+
+    def test_performers_must_be_members(self, client, auth_data, project):
+        task = create_tasks(project, auth_data['user'], 1)[0]
+        stranger = User.objects.get(username='base_user')
+
+        response = self.bulk_update(client, auth_data, ids=[task.id], add_performers=[stranger.id])
+
+        assert response.status_code == 400
+        assert not task.performers.exists()
+
+    def test_nothing_to_update(self, client, auth_data, project):
+        task = create_tasks(project, auth_data['user'], 1)[0]
+
+        assert self.bulk_update(client, auth_data, ids=[task.id]).status_code == 400
+
+    def test_change_performers_replaces_set(self, client, auth_data, project):
+        task = create_tasks(project, auth_data['user'], 1)[0]
+        stranger = User.objects.get(username='base_user')
+        task.performers.add(stranger)
+
+        response = client.post(api_url + f'performers/{task.id}/change_performers/', {'usersIds': [auth_data['user'].id]}, headers={
+            'AUTHORIZATION': f"Bearer {auth_data['token']}"
+        }, content_type='application/json')
+
+        assert response.status_code == 200
+        assert list(task.performers.values_list('id', flat=True)) == [auth_data['user'].id]
+
+    def test_change_performers_rejects_non_members(self, client, auth_data, project):
+        task = create_tasks(project, auth_data['user'], 1)[0]
+        task.performers.add(auth_data['user'])
+        stranger = User.objects.get(username='base_user')
+
+        for users_ids in ([auth_data['user'].id, stranger.id], [auth_data['user'].id, 999999]):
+            response = client.post(api_url + f'performers/{task.id}/change_performers/', {'usersIds': users_ids}, headers={
+                'AUTHORIZATION': f"Bearer {auth_data['token']}"
+            }, content_type='application/json')
+
+            assert response.status_code == 400
+            assert response.data['ids'] == users_ids[1:]
+
+        assert list(task.performers.values_list('id', flat=True)) == [auth_data['user'].id]
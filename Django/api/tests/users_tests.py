@@ -0,0 +1,69 @@
+import pytest
+
+from main import settings
+from pytest_config import api_url
+from users.models import Group, Notification, User
+
+
+@pytest.fixture
+def search_users(django_db_setup):
+    names = ['searcher', 'research_lead', 'sea_otter', 'seabird', 'teacher']
+
+    return {name: User.objects.create_user(username=name, password='pass12345') for name in names}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('auth_data', ['owner_user'], indirect=True)
+class TestSearchUsers:
+    def search(self, client, auth_data, **data):
+        return client.post(f'{api_url}users/search_users/', data, headers={
+            'AUTHORIZATION': f"Bearer {auth_data['token']}"
+        }, content_type='application/json')
+
+    def test_prefix_matches_ranked_first(self, client, auth_data, search_users):
+        response = self.search(client, auth_data, username='sear')
+
+        assert response.status_code == 200
+
+        usernames = [user['username'] for user in response.data['results']]
+
+        assert usernames[0] == 'searcher'
+        assert set(usernames) == {'searcher', 'research_lead'}
+
+    def test_short_query_uses_prefix(self, client, auth_data, search_users):
+        response = self.search(client, auth_data, username='SE')
+
+        usernames = [user['username'] for user in response.data['results']]
+
+        # Ordered by the upper-cased bytes, '_' sorts after capital letters
+        assert usernames == ['seabird', 'searcher', 'sea_otter']
+
+    def test_results_are_limited(self, client, auth_data, search_users, monkeypatch):
+        monkeypatch.setattr(settings, 'SEARCH_USERS_LIMIT', 2)
+
+        response = self.search(client, auth_data, username='se')
+
+        assert len(response.data['results']) == 2
+
+    def test_group_flags(self, client, auth_data, search_users):
+        group = Group.objects.create(name='Search group', owner=auth_data['user'])
+        group.members.add(search_users['searcher'])
+
+        Notification.objects.create(
+            user=search_users['research_lead'],
+            notify_type=Notification.INVITE_MESSAGE,
+            group=group,
+        )
+
+        response = self.search(client, auth_data, username='sear', group_id=str(group.id))
+        results = {user['username']: user for user in response.data['results']}
+
+        assert results['searcher']['in_group'] is True
+        assert results['searcher']['is_invite_send'] is False
+        assert results['research_lead']['in_group'] is False
+        assert results['research_lead']['is_invite_send'] is True
+
+    def test_empty_username(self, client, auth_data):
+        response = self.search(client, auth_data, username='  ')
+
+        assert response.status_code == 400
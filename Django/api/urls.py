@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 
 from .views import (
+    CacheStatsApiView,
     CustomTokenPairView,
     CustomTokenRefreshView,
     DownloadChatImagesView,
@@ -19,6 +20,7 @@ from .views import (
     UserProfileAPiView, 
     UserGroupApiView, 
     GroupProjectViewSet,
+    SearchApiView,
     UserViewSet,
     csrf
 )
@@ -49,6 +51,8 @@ urlpatterns = [
     path('token/logout/', LogoutTokenApiView.as_view(), name="token_logout"),
     path('chat-messages/<int:task_id>/', ChatMessagesListView.as_view(), name='chat-messages'),
     path('download/<int:message_id>/', DownloadChatImagesView.as_view(), name='download_image'),
+    path('cache-stats/', CacheStatsApiView.as_view(), name='cache_stats'),
+    path('search/', SearchApiView.as_view(), name='search'),
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
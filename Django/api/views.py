@@ -1,19 +1,24 @@
 import datetime
 import mimetypes
-from django.utils import duration
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.utils import duration, timezone
 from django.utils.timezone import timedelta
 from rest_framework.views import APIView
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.middleware.csrf import get_token
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework.generics import ListAPIView
 from django.http import FileResponse, JsonResponse
-from rest_framework.permissions import IsAuthenticated
+from django.core.cache import cache
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.throttling import UserRateThrottle
 from rest_framework_simplejwt.tokens import AccessToken
-from django.db.models import Q, BooleanField, Case, Count, Prefetch, Exists, OuterRef, Value, When
+from django.db.models import F, Q, BooleanField, Case, Count, Prefetch, Exists, OuterRef, Value, When
+from django.contrib.postgres.search import SearchHeadline, SearchRank
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.authentication import SessionAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
@@ -25,20 +30,21 @@ from common.cache_managers.project_cache import ProjectCacheManager
 from api.permissions import OwnerOrReadOnly
 from api.serializers.session_performer_serializer import SessionSerializerWithDate, TaskPerformSessionSerializer, TaskPerformSessionWithUsersSerializer
 from common.cache_managers.group_cache import GroupCacheManager
+from common.cache_managers.notification_cache import NotificationCacheManager
 from main import settings
 from api.utils import GroupLogger
 from common.mixins import CacheMixin
+from task.cunsumers import group_members_channel
+from task.heartbeats import SessionHeartbeats
 from  main.settings import IS_ENABLE_CELERY
 from users.models import Group, GroupLogs, Notification, User
-from api.tasks import create_notify_user, create_notify_users
-from task.models import ActiveTask, Project, Stratagem, Task, TaskComment, TaskImage, TaskPerformSession
-from .serializers.group_logs_serializers import GroupLogsSerializer
-from .serializers.notification_serializers import NotificationSerializer
-from .serializers.task_chat_serializers import TaskChatMessageSerializer
-from .serializers.task_serializers import ActiveTaskSerializer, TaskCreateSerializer, TaskSerializer
+from api.tasks import create_notify_groups, create_notify_user, create_notify_users
+from task.models import SEARCH_CONFIG, ActiveTask, Project, Stratagem, Task, TaskComment, TaskImage, TaskPerformSession, TaskTimeRollup, search_query
+from .serializers.row_serializers import GroupLogsRowSerializer, NotificationRowSerializer, TaskChatMessageRowSerializer, TaskRowSerializer
+from .serializers.task_serializers import ActiveTaskSerializer, TaskBulkUpdateSerializer, TaskCreateSerializer, TaskSerializer
 from .serializers.user_serializers import CreateUserSerializer, UserPerformerSerializer, UserSerializer
 from .serializers.group_serializers import GroupCreateSerializer, GroupDetailSerializer, GroupSerializer, GroupCountProjectsSerializer
-from api.paginators import ChatMessagePaginator, GroupLogsPaginator, NotificationPaginator
+from api.paginators import ChatMessagePaginator, GroupLogsPaginator, NotificationPaginator, TaskKeysetPaginator
 from .serializers.project_serializers import (
     ProjectCreateSerializer, 
     ProjectSerializer, 
@@ -180,6 +186,67 @@ class UserProfileAPiView(APIView):
             return Response({"message": "Error"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CacheStatsApiView(APIView):
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        if not hasattr(cache, 'stats'):
+            return Response({'results': 'Cache backend has no stats'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({'results': cache.stats()}, status=status.HTTP_200_OK)
+
+
+class SearchApiView(APIView):
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    SEARCH_TYPES = ('tasks', 'projects', 'comments')
+
+    def get(self, request, *args, **kwargs):
+        query = search_query(request.GET.get('q', ''))
+
+        if query is None:
+            return Response({'errors': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.GET.get('limit', settings.SEARCH_RESULTS_LIMIT))
+        except ValueError:
+            return Response({'errors': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        limit = max(1, min(limit, settings.SEARCH_RESULTS_MAX))
+        types = request.GET.get('types', None)
+        types = [item for item in types.split(',') if item in self.SEARCH_TYPES] if types else self.SEARCH_TYPES
+
+        groups_ids = request.user.user_groups.values('id')
+
+        querysets = {
+            'tasks': Task.objects.filter(project__group_id__in=groups_ids).values(
+                'id', 'name', 'status', 'project_id',
+            ),
+            'projects': Project.objects.filter(group_id__in=groups_ids).values(
+                'id', 'title', 'group_id',
+            ),
+            'comments': TaskComment.objects.filter(task__project__group_id__in=groups_ids).values(
+                'id', 'task_id', 'user_id', 'created_at', project_id=F('task__project_id'),
+            ),
+        }
+        headline_fields = {'tasks': 'description', 'projects': 'description', 'comments': 'text'}
+
+        results = {}
+
+        for search_type in types:
+            # Headlines are computed only for the rows that survive the LIMIT
+            results[search_type] = list(querysets[search_type].filter(
+                search_vector=query,
+            ).annotate(
+                rank=SearchRank(F('search_vector'), query),
+                headline=SearchHeadline(headline_fields[search_type], query, config=SEARCH_CONFIG, max_words=35, min_words=15),
+            ).order_by('-rank', '-id')[:limit])
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
 class UserGroupApiView(CacheMixin, viewsets.ViewSet):
     authentication_classes = [JWTAuthentication, SessionAuthentication]
     permission_classes = [OwnerOrReadOnly, IsAuthenticated]
@@ -203,35 +270,35 @@ class UserGroupApiView(CacheMixin, viewsets.ViewSet):
         #     count_projects = Count('projects')
         # ).order_by(order_by).all()
 
-        queryset = request.user.user_groups.prefetch_related(
-            Prefetch(
-                'projects',
-                queryset=Project.objects.all(),
-                to_attr='count_projects'
-            ),
+        def build_groups():
+            queryset = request.user.user_groups.only(
+                'id', 'name', 'members_count', 'projects_count'
+            ).order_by(order_by)
 
-            Prefetch(
-                'members',
-                queryset=User.objects.all(),
-                to_attr='count_members'
-            )
-        ).order_by(order_by).all()
+            serializer = GroupCountProjectsSerializer(queryset, many=True, context={"include_projects": True})
+            return serializer.data
 
-        groups = self.set_get_cache(queryset, f"groups_filter_{filter_projects}_user_{user.id}", 60)
-
-        serializer = GroupCountProjectsSerializer(groups, many=True, context={"include_projects": True})
+        groups = self.get_or_build_cache(
+            GroupCacheManager.list_key(filter_projects, user.id),
+            build_groups,
+            settings.CACHE_TTL,
+        )
 
-        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+        return Response({"results": groups}, status=status.HTTP_200_OK)
     
+    def get_tasks_limit(self, request):
+        try:
+            tasks_limit = int(request.GET.get('tasks', settings.GROUP_TASKS_PREVIEW))
+        except ValueError:
+            tasks_limit = settings.GROUP_TASKS_PREVIEW
+
+        return max(0, min(tasks_limit, settings.GROUP_TASKS_PREVIEW_MAX))
+
     def retrieve(self, request, pk=None, *args, **kwargs):
         user = request.user
+        tasks_limit = self.get_tasks_limit(request)
 
-        cache_data = self.get_cache(f"group_{pk}_user_{user.id}")
-            
-        if cache_data:
-            return Response({"results": cache_data}, status=status.HTTP_200_OK)
-          
-        try:
+        def build_group():
             query = Group.objects.prefetch_related(
                 Prefetch(
                     'members',
@@ -242,13 +309,7 @@ class UserGroupApiView(CacheMixin, viewsets.ViewSet):
                     'projects',
                     queryset=Project.objects.annotate(
                         count_tasks=Count('tasks')
-                    ).prefetch_related(
-                        Prefetch(
-                            'tasks',
-                            queryset=Task.objects.all()[:2],
-                            to_attr='project_tasks'
-                        )
-                    ).all().order_by('-count_tasks'),
+                    ).order_by('-count_tasks'),
                     to_attr='projects_in_group'
                 )
             ).annotate(
@@ -259,15 +320,60 @@ class UserGroupApiView(CacheMixin, viewsets.ViewSet):
                 )
             ).only('id', 'name').get(pk=pk)
 
-            if query.members.filter(id=user.id).exists():
-                serializer = GroupDetailSerializer(query, context={'request': request})
-                self.set_cache(serializer.data, f"group_{pk}_user_{user.id}", 50)
+            if not any(member.id == user.id for member in query.prefetch_members):
+                return None
 
-                return Response({"results": serializer.data}, status=status.HTTP_200_OK)
-            else:
-                return Response({"message": "forbidden"}, status=status.HTTP_403_FORBIDDEN)
+            Task.objects.attach_latest_to_projects(query.projects_in_group, tasks_limit)
+
+            return GroupDetailSerializer(query, context={'request': request}).data
+
+        try:
+            data = self.get_or_build_cache(
+                GroupCacheManager.detail_key(pk, user.id, tasks_limit),
+                build_group,
+                settings.CACHE_TTL,
+            )
         except Group.DoesNotExist:
             return Response({ 'results': 'Not found Group'}, status=status.HTTP_404_NOT_FOUND)
+
+        if data is None:
+            return Response({"message": "forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response({"results": data}, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=True)
+    def dashboard(self, request, pk=None, *args, **kwargs):
+        if not request.user.user_groups.filter(pk=pk).exists():
+            return Response({'results': 'Not found Group'}, status=status.HTTP_404_NOT_FOUND)
+
+        def build_dashboard():
+            now = timezone.now()
+            today = timezone.localdate()
+            week_end = timezone.make_aware(datetime.datetime.combine(
+                today + timedelta(days=7 - today.weekday()), datetime.time.min
+            ))
+
+            return [
+                {
+                    'id': row['id'],
+                    'title': row['title'],
+                    'tasks': row['tasks_count'],
+                    'statuses': {value: row[f'status_{value}'] for value, _ in Task.STATUS_TASK},
+                    'overdue': row['overdue'],
+                    'due_this_week': row['due_this_week'],
+                    'performers': row['performers_count'],
+                    'tracked_seconds': int(row['tracked'].total_seconds()),
+                }
+                for row in Project.objects.filter(group_id=pk).dashboard(now, week_end)
+            ]
+
+        projects = self.get_or_build_cache(
+            GroupCacheManager.dashboard_key(pk),
+            build_dashboard,
+            settings.GROUP_DASHBOARD_TTL,
+        )
+
+        return Response({'results': {'group': int(pk), 'projects': projects}}, status=status.HTTP_200_OK)
     
     def create(self, request, *args, **kwargs):
         data = request.data
@@ -280,12 +386,8 @@ class UserGroupApiView(CacheMixin, viewsets.ViewSet):
         serializer = GroupCreateSerializer(data=data)
 
         if serializer.is_valid():
-            serializer.save()
-
-            GroupCacheManager.clean_group_list_cache(
-                filters=['A-z', 'Z-a', 'created', ''],
-                user_id=request.user.id
-            )
+            group = serializer.save()
+            group.refresh_from_db(fields=['members_count', 'projects_count'])
 
             return Response({"result": serializer.data}, status=status.HTTP_201_CREATED)
         
@@ -371,17 +473,20 @@ class UserGroupApiView(CacheMixin, viewsets.ViewSet):
         match (data.get('type', None)):
             case 'accept':
                 user = get_object_or_404(User, id=notify_user.get('id', None))
-                group.members.add(user)
-                group.save()
 
-                GroupLogger.add_member(
-                    group=group,
-                    event_type=GroupLogs.ADD_MEMBER,
-                    invited_user=user,
-                )
+                with transaction.atomic():
+                    group.members.add(user)
+                    group.save(update_fields=['updated_at'])
+
+                    GroupLogger.add_member(
+                        group=group,
+                        event_type=GroupLogs.ADD_MEMBER,
+                        invited_user=user,
+                    )
+
+                    notify = get_object_or_404(Notification, id=notify_data.get('id', None))
+                    notify.delete()
 
-                notify = get_object_or_404(Notification, id=notify_data.get('id', None))
-                notify.delete()
                 return Response({'results', 'ok'}, status=status.HTTP_200_OK)
             
             case 'cancel':
@@ -412,15 +517,21 @@ class UserGroupApiView(CacheMixin, viewsets.ViewSet):
 
             self.check_object_permissions(request, group)
 
-            group.members.remove(user_id)
-            group.save()
+            with transaction.atomic():
+                group.members.remove(user_id)
+                group.save(update_fields=['updated_at'])
 
-            GroupLogger.kick_member(
-                group=group, 
-                event_type=GroupLogs.KICKED_MEMBER,
-                kicked_user=user,
-                triggered_user=request.user
-            )
+                GroupLogger.kick_member(
+                    group=group, 
+                    event_type=GroupLogs.KICKED_MEMBER,
+                    kicked_user=user,
+                    triggered_user=request.user
+                )
+
+                # Open chat sockets of the kicked user re-check their access
+                transaction.on_commit(lambda: async_to_sync(get_channel_layer().group_send)(
+                    group_members_channel(group.id), {'type': 'membership.changed', 'user_id': user.id}
+                ))
 
             return Response({'results': 'Member Delete!'}, status=status.HTTP_200_OK)
         else:
@@ -438,42 +549,32 @@ class GroupProjectViewSet(CacheMixin,viewsets.ViewSet):
 
     def list(self, request, *args, **kwargs):
         user = self.request.user
-        
-        cache_data = self.get_cache(f"projects_list_{user.id}")
-
-        if cache_data:
-            return Response({"result": cache_data}, status=status.HTTP_200_OK)
-
-        queryset = request.user.user_groups.prefetch_related(
-            Prefetch(
-                "projects",
-                queryset=Project.objects.all().select_related("group"),
-                to_attr="group_projects"
-            )
-        ).all()
 
+        def build_projects():
+            queryset = request.user.user_groups.prefetch_related(
+                "members",
+                Prefetch(
+                    "projects",
+                    queryset=Project.objects.all().select_related("group"),
+                    to_attr="group_projects"
+                )
+            ).all()
 
-        serializer = GroupSerializer(queryset, many=True, context={"include_projects": True})
+            serializer = GroupSerializer(queryset, many=True, context={"include_projects": True})
+            return serializer.data
 
-        self.set_cache(serializer.data, f'projects_list_{user.id}')
+        data = self.get_or_build_cache(ProjectCacheManager.list_key(user.id), build_projects, settings.CACHE_TTL)
 
-        return Response({"result": serializer.data}, status=status.HTTP_200_OK)
+        return Response({"result": data}, status=status.HTTP_200_OK)
 
 
     def create(self, request, *args, **kwargs):
         data = request.data
         serializer = ProjectCreateSerializer(data=data)
 
-        GroupCacheManager.clean_group_list_cache(
-            filters=['A-z', 'Z-a', 'created', ''],
-            user_id=request.user.id
-        )
-
-        ProjectCacheManager.clear_all_cache(user_id=request.user.id
-)
-
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
 
             return Response({'message': serializer.data}, status=status.HTTP_201_CREATED)
         else:
@@ -556,7 +657,9 @@ class GroupProjectViewSet(CacheMixin,viewsets.ViewSet):
                 project = Project.objects.get(id=pk)
             except Project.DoesNotExist as e:
                 return Response({'message': 'error delete project'}, status=status.HTTP_400_BAD_REQUEST)
-            project.delete()
+
+            with transaction.atomic():
+                project.delete()
 
             return Response({"message": "success delete project"}, status=status.HTTP_204_NO_CONTENT)
 
@@ -570,9 +673,9 @@ class TaskViewSet(viewsets.ViewSet):
         project_id = self.kwargs.get('project_id', None)
 
         if project_id:
-            tasks = Task.objects.select_related("owner", 'project').filter(project__id=project_id)
+            tasks = Task.objects.select_related("created_by", 'project').filter(project__id=project_id)
         else:
-            tasks  = Task.objects.select_related("owner", 'project').all()
+            tasks  = Task.objects.select_related("created_by", 'project').all()
         return tasks
     
     def get_project(self):
@@ -607,7 +710,7 @@ class TaskViewSet(viewsets.ViewSet):
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        if instance.owner.id != request.user.id:
+        if instance.created_by_id != request.user.id:
             return Response({'message': 'forbidden'}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = TaskSerializer(
@@ -628,11 +731,23 @@ class TaskViewSet(viewsets.ViewSet):
 
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        project_id = kwargs.get('project_id', None)
+        queryset = self.get_queryset().filter_params(request.GET)
+
+        if not project_id:
+            queryset = queryset.filter(project__group_id__in=request.user.user_groups.values('id'))
 
-        serializer = TaskSerializer(queryset, many=True, context={"method": "get"})
+        paginator = TaskKeysetPaginator()
+        tasks = paginator.paginate_queryset(queryset.values(*TaskRowSerializer.values), request, view=self)
 
-        return Response({'result': serializer.data, 'project': kwargs.get('project_id', None)}, status=status.HTTP_200_OK)
+        serializer = TaskRowSerializer(tasks, many=True)
+
+        return Response({
+            'result': serializer.data,
+            'project': project_id,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        }, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None, *args, **kwargs):
@@ -657,6 +772,104 @@ class TaskViewSet(viewsets.ViewSet):
 
         return Response({'result': task.status}, status=status.HTTP_200_OK)
 
+    @action(methods=['post'], detail=False)
+    def bulk_update(self, request, *args, **kwargs):
+        serializer = TaskBulkUpdateSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        ids = set(data['ids'])
+        fields = [field for field in ('status', 'deadline') if field in data]
+        project_id = kwargs.get('project_id', None)
+
+        queryset = Task.objects.filter(id__in=ids, project__group_id__in=request.user.user_groups.values('id'))
+
+        if project_id:
+            queryset = queryset.filter(project_id=project_id)
+
+        with transaction.atomic():
+            tasks = list(
+                queryset.select_related('project').select_for_update(of=('self',)).only(
+                    'id', 'status', 'deadline', 'updated_at', 'project__group_id'
+                ).order_by('id')
+            )
+
+            missing = ids - {task.id for task in tasks}
+
+            if missing:
+                return Response({'errors': 'Tasks not found', 'ids': sorted(missing)}, status=status.HTTP_404_NOT_FOUND)
+
+            groups_ids = {task.project.group_id for task in tasks}
+
+            if data['add_performers']:
+                members = set(Group.members.through.objects.filter(
+                    group_id__in=groups_ids, user_id__in=data['add_performers']
+                ).values_list('group_id', 'user_id'))
+
+                if len(members) != len(groups_ids) * len(set(data['add_performers'])):
+                    return Response(
+                        {'errors': 'Performers must be members of the task group'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            changed = [task for task in tasks if any(getattr(task, field) != data[field] for field in fields)]
+            now = timezone.now()
+
+            for task in changed:
+                for field in fields:
+                    setattr(task, field, data[field])
+
+                task.updated_at = now
+
+            Task.objects.bulk_update(changed, [*fields, 'updated_at'], batch_size=settings.TASK_BULK_MAX)
+
+            tasks_ids = [task.id for task in tasks]
+            removed = Task.objects.remove_performers(tasks_ids, data['remove_performers']) if data['remove_performers'] else 0
+            added = Task.objects.add_performers(tasks_ids, data['add_performers'])
+
+        # bulk_update and the raw through-table writes send no signals
+        changed_groups_ids = {task.project.group_id for task in changed}
+        notify_groups_ids = sorted(groups_ids if added or removed else changed_groups_ids)
+
+        for group_id in notify_groups_ids:
+            GroupCacheManager.invalidate_group(group_id)
+
+        if notify_groups_ids:
+            self.notify_bulk_update(request, data, fields, len(changed) if changed else len(tasks), notify_groups_ids)
+
+        return Response({'results': {
+            'tasks': len(tasks),
+            'updated': len(changed),
+            'performers_added': added,
+            'performers_removed': removed,
+        }}, status=status.HTTP_200_OK)
+
+    def notify_bulk_update(self, request, data, fields, count, groups_ids):
+        changes = []
+
+        if 'status' in fields:
+            changes.append(f"status changed in {data['status']}")
+
+        if 'deadline' in fields:
+            changes.append(f"deadline moved to {timezone.localtime(data['deadline']).strftime('%d/%m/%Y | %H:%M')}")
+
+        if data['add_performers'] or data['remove_performers']:
+            changes.append('performers changed')
+
+        kwargs = {
+            'notify_type': Notification.TASK_UPDATE_MESSAGE,
+            'group_ids': groups_ids,
+            'notify_message': f"{request.user.username} updated {count} tasks: {', '.join(changes)}",
+            'push_message': f"{count} tasks updated",
+        }
+
+        if IS_ENABLE_CELERY:
+            create_notify_groups.delay(**kwargs)
+        else:
+            create_notify_groups(**kwargs)
+
     def retrieve(self, request, pk=None, *args, **kwargs):
         if pk:
             try:
@@ -709,31 +922,54 @@ class TaskViewSet(viewsets.ViewSet):
         return Response({'results': result}, status=status.HTTP_200_OK)
 
 
-class NotificationViewSet(CacheMixin, viewsets.ViewSet):
+class NotificationViewSet(viewsets.ViewSet):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
-        user = self.request.user
+        query = Notification.objects.filter(user=request.user).values(*NotificationRowSerializer.values)
 
-        query = Notification.objects.select_related('user').filter(user=request.user).order_by('-created_at')
+        paginator = NotificationPaginator()
+        result = paginator.paginate_queryset(query, request)
+        serializer = NotificationRowSerializer(result, many=True, context={'user': request.user})
 
-        notifications = self.set_get_cache(query, f'notifications_user_{user}', 60)
+        return paginator.get_paginated_response(serializer.data)
 
-        paginator = NotificationPaginator()
+    @action(methods=['get'], detail=False)
+    def unread_count(self, request, *args, **kwargs):
+        count = NotificationCacheManager.get_unread(request.user.id)
 
-        result = paginator.paginate_queryset(notifications, request)
+        return Response({'results': {'unread_count': count}}, status=status.HTTP_200_OK)
 
-        if result:
-            serializer = NotificationSerializer(result, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        
-        return Response({'result': []}, status=status.HTTP_200_OK)
+    @action(methods=['post'], detail=False)
+    def mark_read(self, request, *args, **kwargs):
+        ids = request.data.get('ids', None)
+
+        if not isinstance(ids, list) or not all(isinstance(item, int) for item in ids):
+            return Response({'errors': 'ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = Notification.objects.filter(user=request.user, id__in=ids, is_read=False).update(is_read=True)
+
+        return self.unread_response(request.user.id, updated)
+
+    @action(methods=['post'], detail=False)
+    def mark_all_read(self, request, *args, **kwargs):
+        updated = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+
+        return self.unread_response(request.user.id, updated)
+
+    def unread_response(self, user_id, updated):
+        if updated:
+            count = NotificationCacheManager.change_unread(user_id, -updated)
+        else:
+            count = NotificationCacheManager.get_unread(user_id)
+
+        return Response({'results': {'updated': updated, 'unread_count': count}}, status=status.HTTP_200_OK)
     
     
 class ChatMessagesListView(ListAPIView):
     pagination_class = ChatMessagePaginator
-    serializer_class = TaskChatMessageSerializer
+    serializer_class = TaskChatMessageRowSerializer
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -743,13 +979,8 @@ class ChatMessagesListView(ListAPIView):
     def get_queryset(self):
         # task = get_object_or_404(Task, id=self.kwargs.get('task_id', None))
         # print(task)
-        print('LOADING CHAT')
-        return TaskComment.objects.filter(task__id=self.kwargs.get('task_id', None)).select_related('user').prefetch_related(
-            Prefetch(
-                'message_image',
-                queryset=TaskImage.objects.all().only('message', 'image'),
-                to_attr='task_images'
-            )
+        return TaskComment.objects.filter(task__id=self.kwargs.get('task_id', None)).values(
+            *TaskChatMessageRowSerializer.values
         )
 
         # try:
@@ -781,40 +1012,48 @@ class UserViewSet(viewsets.ViewSet):
         group_id = data.get('group_id', None)
         username = data.get('username', None)
 
-        match (username, group_id):
-            case (str() as username, str()) if username:
-                users = User.objects.filter(username__icontains=username).annotate(
-                in_group=Exists(Group.objects.filter(
-                        id=group_id,
-                        members=OuterRef('pk')
-                    )),
-
-                    is_invite_send=Exists(Notification.objects.filter(
-                        user=OuterRef('pk'),
-                        data__group_id=int(group_id),
-                        notify_type=Notification.INVITE_MESSAGE
-                    ))
-                )
+        if not isinstance(username, str) or not username.strip():
+            return Response({ 'results': 'Error: not valid data in post'}, status=status.HTTP_400_BAD_REQUEST)
 
-                serializer = UserSerializer(users, context={
-                    'request': request, 
-                    'check_in_group': True,
-                }, many=True)
+        users = list(User.objects.search(username, settings.SEARCH_USERS_LIMIT))
+        context = {'request': request}
 
-                return Response({'results': serializer.data}, status=status.HTTP_200_OK)
+        match group_id:
+            case None:
+                pass
 
-            case (str() as username, None) if username:
-                print(username)
-                users = User.objects.filter(username__icontains=username)
+            case str() | int():
+                try:
+                    group_id = int(group_id)
+                except ValueError:
+                    return Response({ 'results': 'Error: not valid data in post'}, status=status.HTTP_400_BAD_REQUEST)
 
-                serializer = UserSerializer(users, context ={
-                    'request': request,
-                }, many=True)
+                # Two lookups bounded by the page instead of EXISTS per matched user
+                users_ids = [user.id for user in users]
+
+                members_ids = set(Group.members.through.objects.filter(
+                    group_id=group_id,
+                    user_id__in=users_ids,
+                ).values_list('user_id', flat=True))
+
+                invited_ids = set(Notification.objects.filter(
+                    user_id__in=users_ids,
+                    group_id=group_id,
+                    notify_type=Notification.INVITE_MESSAGE,
+                ).values_list('user_id', flat=True))
+
+                for user in users:
+                    user.in_group = user.id in members_ids
+                    user.is_invite_send = user.id in invited_ids
+
+                context['check_in_group'] = True
 
-                return Response({'results': serializer.data}, status=status.HTTP_200_OK)
-            
             case _:
                 return Response({ 'results': 'Error: not valid data in post'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = UserSerializer(users, context=context, many=True)
+
+        return Response({'results': serializer.data}, status=status.HTTP_200_OK)
         
 
 class GroupLogsViewSet(viewsets.ReadOnlyModelViewSet):
@@ -839,18 +1078,17 @@ class GroupLogsViewSet(viewsets.ReadOnlyModelViewSet):
         logs = GroupLogs.logmanager.group_select(group_id=group_id)
 
         if queries:
-            logs = GroupLogs.logmanager.filter_queries(logs, queries)
+            try:
+                logs = GroupLogs.logmanager.filter_queries(logs, queries)
+            except ValueError:
+                return Response({'errors': 'Dates must be in YYYY-MM-DDTHH:MM format'}, status=status.HTTP_400_BAD_REQUEST)
 
         paginator = GroupLogsPaginator()
 
-        result = paginator.paginate_queryset(logs, request)
+        result = paginator.paginate_queryset(logs.values(*GroupLogsRowSerializer.values), request)
+        serializer = GroupLogsRowSerializer(result, many=True)
 
-        if result:
-            serializer = GroupLogsSerializer(result, many=True)
-            return paginator.get_paginated_response(serializer.data)
-
-        else:
-            return Response({'results': []}, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
 class DownloadChatImagesView(APIView):
     def get(self, request, message_id, *args, **kwargs):
@@ -919,20 +1157,36 @@ class TaskPerformersViewSets(viewsets.ViewSet):
     
     @action(methods=['post'], detail=True)
     def change_performers(self, request, pk=None, *args, **kwargs):
-        task = Task.objects.prefetch_related('performers').get(id=pk)
-        form_users_ids = set(request.data.get('usersIds', None))
-        performers_ids = set([user.id for user in task.performers.all()])
+        users_ids = request.data.get('usersIds', None)
 
-        remove_data = performers_ids.difference(form_users_ids)
-        add_data = form_users_ids.difference(performers_ids)
+        if not isinstance(users_ids, list) or not all(isinstance(item, int) for item in users_ids):
+            return Response({'results': 'usersIds must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        task = Task.objects.filter(id=pk).values('project__group_id').first()
+
+        if task is None:
+            return Response({'results': 'Task not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        group_id = task['project__group_id']
+        members = set(Group.members.through.objects.filter(
+            group_id=group_id, user_id__in=users_ids
+        ).values_list('user_id', flat=True))
+
+        # Unknown ids too, the raw insert below would only fail at commit
+        if not_members := set(users_ids) - members:
+            return Response(
+                {'errors': 'Performers must be members of the task group', 'ids': sorted(not_members)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # The diff is done by the database: drop who is not in the form, insert the missing pairs
+        with transaction.atomic():
+            Task.performers.through.objects.filter(task_id=pk).exclude(user_id__in=users_ids).delete()
+            Task.objects.add_performers([int(pk)], users_ids)
+
+        if group_id is not None:
+            GroupCacheManager.invalidate_group(group_id)
 
-        if remove_data:
-            task.performers.remove(*remove_data)
-        
-        if add_data:
-            task.performers.add(*add_data)
-            
-        task.save()
         return Response({'results': []}, status=status.HTTP_200_OK)
     
     @action(methods=['post'], detail=False)
@@ -1009,12 +1263,15 @@ class TaskSessionViewSets(viewsets.ViewSet):
         print(task_id)
 
         try:
-            created = TaskPerformSession.objects.create(
-                performer_id=user_id,
-                task_id=task_id,
-                duration=timedelta(0, 0, 0, 0, 0, 0),
-                is_active=True,
-            )
+            with transaction.atomic():
+                created = TaskPerformSession.objects.create(
+                    performer_id=user_id,
+                    task_id=task_id,
+                    duration=timedelta(0, 0, 0, 0, 0, 0),
+                    is_active=True,
+                )
+
+                TaskTimeRollup.objects.add(created.task_id, created.performer_id, created.rollup_day, timedelta(0), sessions=1)
         except Exception as e:
             print(e)
             return Response({ 'results': 'Error create session'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1023,36 +1280,21 @@ class TaskSessionViewSets(viewsets.ViewSet):
     
     @action(methods=['patch'], detail=True)
     def update_session_performer(self, request, pk=None, *args, **kwargs):
-        task_session = get_object_or_404(TaskPerformSession, id=pk)
-
         session_time = request.data.get('time', None)
 
-        print(session_time)
-
         if not session_time:
             return Response({'results': 'Updated session error'}, status=status.HTTP_200_OK)
 
-        if not task_session:
-            return Response({'results': 'Not found task session'}, status=status.HTTP_404_NOT_FOUND)
+        if not isinstance(session_time, int):
+            return Response({'results': 'time must be milliseconds'}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_seconds = session_time // 1000
-    
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-
-        # task_session.duration = datetime.time(
-        #     hour=hours,
-        #     minute=minutes,
-        #     second=seconds
-        # )
-        task_session.duration = timedelta(
-            hours=hours,
-            minutes=minutes,
-            seconds=seconds
-        )
+        # Buffered in Redis, flush_session_heartbeats writes it to the DB
+        if not SessionHeartbeats.beat(int(pk), request.user.id, session_time):
+            return Response({'results': 'Not found task session'}, status=status.HTTP_404_NOT_FOUND)
 
-        task_session.save(update_fields=['duration', 'updated_at'])
+        if not IS_ENABLE_CELERY:
+            # Nobody runs the periodic flush, write through
+            SessionHeartbeats.flush([int(pk)])
 
         return Response({ 'results': 'Session updated!'}, status=status.HTTP_200_OK)
     
@@ -1063,9 +1305,7 @@ class TaskSessionViewSets(viewsets.ViewSet):
         if not task_session:
             return Response({'results': ''}, status=status.HTTP_400_BAD_REQUEST)
         
-
-        task_session.is_active = False
-        task_session.save()
+        SessionHeartbeats.close(task_session.id)
         
         return Response({'results': ''}, status=status.HTTP_200_OK)
     
@@ -1074,6 +1314,8 @@ class TaskStatisticsViewSets(viewsets.ViewSet):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    SUMMARY_PERIODS = ('month', 'week', 'day')
+
     def retrieve(self, request, pk=None, *args, **kwargs):
         task = Task.objects.filter(id=pk).exists()
 
@@ -1092,6 +1334,38 @@ class TaskStatisticsViewSets(viewsets.ViewSet):
 
         return Response({'results': serializer.data}, status=status.HTTP_200_OK)
 
+    @action(methods=['get'], detail=True)
+    def summary(self, request, pk=None, *args, **kwargs):
+        period = request.GET.get('period', 'month')
+
+        if period not in self.SUMMARY_PERIODS:
+            return Response({'errors': f'period must be one of {", ".join(self.SUMMARY_PERIODS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        performer = request.GET.get('performer', None)
+
+        if performer and not performer.isdigit():
+            return Response({'errors': 'performer must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not Task.objects.filter(id=pk, project__group__members=request.user).exists():
+            return Response({'results': 'Not found task'}, status=status.HTTP_404_NOT_FOUND)
+
+        rollups = TaskTimeRollup.objects.filter(task_id=pk)
+
+        if performer:
+            rollups = rollups.filter(performer_id=int(performer))
+
+        buckets = [
+            {
+                'bucket': row['bucket'],
+                'performer': {'id': row['performer_id'], 'username': row['performer__username']},
+                'duration': row['total'].total_seconds(),
+                'sessions': row['count'],
+            }
+            for row in rollups.buckets(period)
+        ]
+
+        return Response({'results': {'period': period, 'buckets': buckets}}, status=status.HTTP_200_OK)
+
 
 class StratagemViewSets(viewsets.ViewSet):
     authentication_classes = [JWTAuthentication]
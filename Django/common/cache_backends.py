@@ -0,0 +1,439 @@
+import json
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Invalidation counters of LocalLRUCache, keys share them by hash
+INVALIDATION_STRIPES = 1024
+
+
+class LocalLRUCache:
+    """
+    Bounded in-process LRU. Values are kept pickled so callers can't mutate
+    the cached copy and so the byte budget is measured exactly.
+
+    Every write, delete and clear bumps an invalidation counter of the key (striped,
+    see ``INVALIDATION_STRIPES``). A value read from elsewhere is stored with the
+    ``token`` taken before the read, and dropped if the key was invalidated meanwhile.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, timeout: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._size = 0
+        self._epoch = 0
+        self._stripes = [0] * INVALIDATION_STRIPES
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                return _MISSING
+
+            payload, expires = item
+
+            if expires < time.monotonic():
+                self._pop(key)
+                return _MISSING
+
+            self._data.move_to_end(key)
+
+        return pickle.loads(payload)
+
+    def token(self, key):
+        with self._lock:
+            return self._epoch, self._stripes[self._stripe(key)]
+
+    def set(self, key, value, timeout=None, token=None):
+        """
+        Stores ``value`` for at most ``timeout`` seconds (capped by the L1 timeout). With a
+        ``token``, the value was read from elsewhere and isn't stored if ``key`` changed since.
+        """
+        timeout = self.timeout if timeout is None else min(self.timeout, timeout)
+
+        try:
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            payload = None
+
+        if payload is None or timeout <= 0 or len(payload) > self.max_bytes:
+            if token is None:
+                self.delete(key)
+            return
+
+        with self._lock:
+            stripe = self._stripe(key)
+
+            if token is None:
+                self._stripes[stripe] += 1
+            elif token != (self._epoch, self._stripes[stripe]):
+                return
+
+            self._pop(key)
+            self._data[key] = (payload, time.monotonic() + timeout)
+            self._size += len(payload)
+
+            while self._data and (len(self._data) > self.max_entries or self._size > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            self._stripes[self._stripe(key)] += 1
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._size}
+
+    @staticmethod
+    def _stripe(key) -> int:
+        return hash(key) % INVALIDATION_STRIPES
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+
+        if item is not None:
+            self._size -= len(item[0])
+
+
+class ProcessL1:
+    """
+    The L1 of a process: the LRU, the invalidation listener and the hit counters.
+
+    Django's cache handler builds a backend instance per thread and async context,
+    they all share this state so the L1 outlives a request and one listener thread
+    (and one Redis connection) serves the whole process.
+    """
+
+    def __init__(self, options: dict):
+        self.local = LocalLRUCache(
+            max_entries=options.get('MAX_ENTRIES', 5000),
+            max_bytes=options.get('MAX_BYTES', 32 * 1024 * 1024),
+            timeout=options.get('TIMEOUT', 30),
+        )
+        self.channel = options.get('CHANNEL', 'cache_l1_invalidate')
+        self.pid = os.getpid()
+        self.origin = f"{socket.gethostname()}:{self.pid}:{uuid.uuid4().hex}"
+        self.listener = None
+        self.lock = threading.Lock()
+        self.counters = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0}
+        self._counters_lock = threading.Lock()
+
+    def count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def ensure_listener(self, get_client) -> bool:
+        if self.listener is not None:
+            return True
+
+        with self.lock:
+            if self.listener is not None:
+                return True
+
+            self.local.clear()
+
+            try:
+                pubsub = get_client(write=True).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.channel: self.on_message})
+                self.listener = pubsub.run_in_thread(
+                    sleep_time=1,
+                    daemon=True,
+                    exception_handler=self.on_listener_error,
+                )
+            except Exception:
+                logger.exception('Failed to subscribe to L1 cache invalidation channel')
+                return False
+
+            return True
+
+    def on_message(self, message):
+        try:
+            data = json.loads(message['data'])
+        except (TypeError, ValueError):
+            return
+
+        if data.get('origin') == self.origin:
+            return
+
+        if data.get('keys') is None:
+            self.local.clear()
+            return
+
+        for made_key in data['keys']:
+            self.local.delete(made_key)
+
+    def on_listener_error(self, exception, pubsub, thread):
+        # Without the channel L1 can't be trusted, fall back to Redis until resubscribed
+        logger.warning('L1 cache invalidation listener stopped: %s', exception)
+        thread.stop()
+        pubsub.close()
+        self.listener = None
+        self.local.clear()
+
+    def stop(self):
+        with self.lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+
+_processes = {}
+_processes_lock = threading.Lock()
+
+
+def process_l1(key, options: dict) -> ProcessL1:
+    """The ``ProcessL1`` of ``key`` (location and channel) in the current process."""
+    pid = os.getpid()
+
+    with _processes_lock:
+        state = _processes.get((pid, key))
+
+        if state is None:
+            # Listener threads don't survive fork (celery prefork), drop what the parent had
+            for stale in [item for item in _processes if item[0] != pid]:
+                del _processes[stale]
+
+            state = _processes[(pid, key)] = ProcessL1(options)
+
+        return state
+
+
+class TieredRedisCache(RedisCache):
+    """
+    RedisCache with a per-process LRU (L1) in front of it, see ``ProcessL1``.
+
+    Every write or delete is broadcast on a Redis pub/sub channel and each
+    process drops its L1 copy of the keys it receives. L1 entries also expire
+    after ``L1['TIMEOUT']`` seconds in case an invalidation message is lost, or
+    earlier if the key expires sooner in Redis. A value read from Redis isn't kept
+    if the key was invalidated while it was being read.
+
+    Settings example::
+
+        CACHES['default'] = {
+            'BACKEND': 'common.cache_backends.TieredRedisCache',
+            'LOCATION': 'redis://localhost:6379',
+            'L1': {'MAX_ENTRIES': 5000, 'MAX_BYTES': 32 * 1024 * 1024, 'TIMEOUT': 30},
+        }
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+
+        self._l1_options = params.get('L1', {})
+        self._l1_key = (str(server), self._l1_options.get('CHANNEL', 'cache_l1_invalidate'))
+        self._l1_state = None
+
+    @property
+    def _l1(self) -> ProcessL1:
+        state = self._l1_state
+
+        if state is None or state.pid != os.getpid():
+            state = self._l1_state = process_l1(self._l1_key, self._l1_options)
+
+        return state
+
+    @property
+    def _local(self) -> LocalLRUCache:
+        return self._l1.local
+
+    # Reads
+
+    def get(self, key, default=None, version=None):
+        if not self._ensure_listener():
+            return super().get(key, default, version)
+
+        key = self.make_and_validate_key(key, version=version)
+        value = self._local.get(key)
+
+        if value is not _MISSING:
+            self._count('l1_hits')
+            return value
+
+        self._count('l1_misses')
+        token = self._local.token(key)
+        found = self._fetch([key])
+
+        if key not in found:
+            self._count('l2_misses')
+            return default
+
+        self._count('l2_hits')
+        value, ttl = found[key]
+        self._local.set(key, value, ttl, token)
+        return value
+
+    def get_many(self, keys, version=None):
+        if not self._ensure_listener():
+            return super().get_many(keys, version)
+
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        result = {}
+        remote = []
+
+        for made_key, key in key_map.items():
+            value = self._local.get(made_key)
+
+            if value is _MISSING:
+                self._count('l1_misses')
+                remote.append(made_key)
+            else:
+                self._count('l1_hits')
+                result[key] = value
+
+        if remote:
+            tokens = {made_key: self._local.token(made_key) for made_key in remote}
+            found = self._fetch(remote)
+
+            for made_key in remote:
+                if made_key in found:
+                    self._count('l2_hits')
+                    value, ttl = found[made_key]
+                    self._local.set(made_key, value, ttl, tokens[made_key])
+                    result[key_map[made_key]] = value
+                else:
+                    self._count('l2_misses')
+
+        return result
+
+    def has_key(self, key, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+
+        if self._l1.listener is not None and self._local.get(made_key) is not _MISSING:
+            return True
+
+        return self._cache.has_key(made_key)
+
+    def _fetch(self, made_keys) -> dict:
+        """``{made key: (value, seconds left or None)}`` of the keys found in Redis, in one round trip."""
+        pipeline = self._cache.get_client().pipeline(transaction=False)
+
+        for made_key in made_keys:
+            pipeline.get(made_key)
+            pipeline.pttl(made_key)
+
+        replies = pipeline.execute()
+        found = {}
+
+        for made_key, value, pttl in zip(made_keys, replies[::2], replies[1::2]):
+            if value is not None:
+                # -1: no expiry, -2: expired right after the GET
+                found[made_key] = (self._cache._serializer.loads(value), None if pttl == -1 else max(pttl, 0) / 1000)
+
+        return found
+
+    # Writes
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+
+        made_key = self.make_and_validate_key(key, version=version)
+        self._local.set(made_key, value, self.get_backend_timeout(timeout))
+        self._publish([made_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        result = super().set_many(data, timeout, version)
+
+        made_keys = []
+        timeout = self.get_backend_timeout(timeout)
+
+        for key, value in data.items():
+            made_key = self.make_and_validate_key(key, version=version)
+            self._local.set(made_key, value, timeout)
+            made_keys.append(made_key)
+
+        self._publish(made_keys)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version)
+
+        if added:
+            self._invalidate([self.make_and_validate_key(key, version=version)])
+
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = super().touch(key, timeout, version)
+        self._invalidate([self.make_and_validate_key(key, version=version)])
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        self._invalidate([self.make_and_validate_key(key, version=version)])
+        return value
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version)
+        self._invalidate([self.make_and_validate_key(key, version=version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        super().delete_many(keys, version)
+        self._invalidate([self.make_and_validate_key(key, version=version) for key in keys])
+
+    def clear(self):
+        result = super().clear()
+        self._local.clear()
+        self._publish(None)
+        return result
+
+    # Stats
+
+    def stats(self):
+        l1 = self._l1
+
+        return {
+            **l1.counters,
+            **{f"l1_{name}": value for name, value in l1.local.stats().items()},
+        }
+
+    # Invalidation channel
+
+    def _count(self, name):
+        self._l1.count(name)
+
+    def _invalidate(self, made_keys):
+        for made_key in made_keys:
+            self._local.delete(made_key)
+
+        self._publish(made_keys)
+
+    def _publish(self, made_keys):
+        if made_keys == []:
+            return
+
+        l1 = self._l1
+        message = json.dumps({'origin': l1.origin, 'keys': made_keys})
+
+        try:
+            self._cache.get_client(write=True).publish(l1.channel, message)
+        except Exception:
+            logger.exception('Failed to publish L1 cache invalidation')
+
+    def _ensure_listener(self) -> bool:
+        return self._l1.ensure_listener(self._cache.get_client)
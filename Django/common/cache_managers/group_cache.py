@@ -1,17 +1,28 @@
+from common.cache_managers.versions import CacheVersionManager
 
 
-from django.core.cache import cache
+class GroupCacheManager:
 
+    @staticmethod
+    def list_key(_filter: str, user_id: int) -> str:
+        version = CacheVersionManager.get(CacheVersionManager.USER, user_id)
+        return f"groups_filter_{_filter}_user_{user_id}_v{version}"
 
-class GroupCacheManager:
+    @staticmethod
+    def detail_key(group_id, user_id: int, tasks_limit: int = 2) -> str:
+        version = CacheVersionManager.get(CacheVersionManager.GROUP, group_id)
+        return f"group_{group_id}_v{version}_user_{user_id}_tasks_{tasks_limit}"
+
+    @staticmethod
+    def dashboard_key(group_id) -> str:
+        version = CacheVersionManager.get(CacheVersionManager.GROUP, group_id)
+        return f"group_{group_id}_v{version}_dashboard"
 
-    def clean_group_list_cache(filters, user_id: int):
-        pipe = cache
-        
-        patterns = [
-            f"groups_filter_{_filter}_user_{user_id}"
-            for _filter in filters
-        ]
+    @staticmethod
+    def invalidate_group(group_id, members_ids=()):
+        CacheVersionManager.bump(CacheVersionManager.GROUP, group_id)
+        CacheVersionManager.bump(CacheVersionManager.USER, *members_ids)
 
-        for pattern in patterns:
-            pipe.delete(pattern)
\ No newline at end of file
+    @staticmethod
+    def invalidate_users(*users_ids):
+        CacheVersionManager.bump(CacheVersionManager.USER, *users_ids)
@@ -0,0 +1,66 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+from main import db_router, settings
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationCacheManager:
+    """
+    Unread notifications counter per user.
+
+    The counter is created lazily from the partial unread index on the first
+    read and then moved with INCR/DECR. It has a TTL so any drift from a lost
+    update heals on the next recount.
+    """
+
+    @staticmethod
+    def unread_key(user_id: int) -> str:
+        return f"notifications_unread_{user_id}"
+
+    @classmethod
+    def get_unread(cls, user_id: int) -> int:
+        key = cls.unread_key(user_id)
+        count = cache.get(key)
+
+        if count is None:
+            from users.models import Notification
+
+            with db_router.primary():
+                count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+            cache.add(key, count, settings.NOTIFICATIONS_UNREAD_TTL)
+
+        return count
+
+    @classmethod
+    def change_unread(cls, user_id: int, delta: int, push: bool = True):
+        if not delta:
+            return
+
+        key = cls.unread_key(user_id)
+
+        try:
+            count = cache.incr(key, delta)
+        except ValueError:
+            # Not initialised yet, the recount already sees the committed change
+            count = None
+
+        if count is None or count < 0:
+            cache.delete(key)
+            count = cls.get_unread(user_id)
+
+        if push:
+            cls.push_unread(user_id, count)
+
+        return count
+
+    @staticmethod
+    def push_unread(user_id: int, count: int):
+        try:
+            async_to_sync(get_channel_layer().group_send)(f'chat_{user_id}', {'type': 'unread_count', 'count': count})
+        except Exception:
+            logger.exception('Failed to push unread notifications count')
@@ -1,12 +1,13 @@
-from django.core.cache import cache
+from common.cache_managers.versions import CacheVersionManager
 
 
 class ProjectCacheManager:
 
-    def clear_list_cache(filters, user_id):
-        pass
+    @staticmethod
+    def list_key(user_id: int) -> str:
+        version = CacheVersionManager.get(CacheVersionManager.USER, user_id)
+        return f"projects_list_{user_id}_v{version}"
 
-    def clear_all_cache(user_id):
-        pattern = f'projects_list_{user_id}'
-
-        cache.delete(pattern)
\ No newline at end of file
+    @staticmethod
+    def clear_list_cache(*users_ids):
+        CacheVersionManager.bump(CacheVersionManager.USER, *users_ids)
@@ -0,0 +1,60 @@
+import time
+
+from django.core.cache import cache
+
+
+class CacheVersionManager:
+    """
+    Generation counters embedded in cache keys.
+
+    Bumping a counter makes every key built from the old value unreachable, so
+    invalidation is a single INCR no matter how many keys depend on it. Counters
+    never expire; a lost counter is re-seeded from the clock so it can't fall back
+    to a value that was already used.
+    """
+
+    GROUP = 'group'
+    USER = 'user'
+
+    @staticmethod
+    def _key(kind: str, obj_id) -> str:
+        return f"cache_version_{kind}_{obj_id}"
+    
+    @staticmethod
+    def _seed() -> int:
+        return time.time_ns() // 1_000_000
+
+    @classmethod
+    def get(cls, kind: str, obj_id) -> int:
+        return cls.get_many(kind, [obj_id])[obj_id]
+
+    @classmethod
+    def get_many(cls, kind: str, ids) -> dict:
+        keys = {cls._key(kind, obj_id): obj_id for obj_id in ids}
+        found = cache.get_many(list(keys))
+
+        versions = {}
+
+        for key, obj_id in keys.items():
+            version = found.get(key)
+
+            if version is None:
+                cache.add(key, cls._seed(), None)
+                version = cache.get(key)
+
+            versions[obj_id] = version
+
+        return versions
+
+    @classmethod
+    def bump(cls, kind: str, *ids):
+        for obj_id in set(ids):
+            if obj_id is None:
+                continue
+
+            key = cls._key(kind, obj_id)
+
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, cls._seed(), None)
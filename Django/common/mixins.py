@@ -1,30 +1,93 @@
+import math
+import random
+import time
+import uuid
+from typing import Any, Callable
+
 from django.core.cache import cache
-from django.db.models import QuerySet
+
+from common.redis_client import get_redis
+from main import db_router
+
+# Deletes the lock only while it still holds our token, it may have expired and been taken by another worker
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 
 class CacheMixin:
-    def set_get_cache(self, query: QuerySet, key_cache: str, cache_time: int = 60):
-        data = cache.get(key_cache)
-        # print(data, 'GET CACHE')
-
-        if not data:
-            data = query
-            cache.set(key_cache, data, cache_time)
-            return data
-        # print(data, 'DATAS GETS')
-        return data
-    
-    def set_cache(self, query: QuerySet, key_cache: str, cache_time: int = 60):
-        data = query
-        cache.set(key_cache, data, cache_time)
-        return data
-    
-    def get_cache(self, key_cache: str):
-        data = cache.get(key_cache)
+    # Stampede protection settings
+    cache_lock_timeout = 10
+    cache_wait_timeout = 2
+    cache_wait_interval = 0.05
+    cache_beta = 1.0
+
+    def get_or_build_cache(self, key_cache: str, builder: Callable[[], Any], cache_time: int = 60):
+        """
+        Returns the serialized payload stored under ``key_cache``.
+
+        Entries are kept as ``{'data', 'delta', 'expiry'}`` envelopes so that hot keys
+        can be refreshed early (probabilistic early recompute) and only one worker
+        rebuilds an expired key while holding ``<key>:lock``, whose value is a token of
+        the holder so a lock that expired mid-build and was re-taken isn't released by it. ``builder`` must return
+        plain serialized data; returning ``None`` means "do not cache".
+        """
+        entry = cache.get(key_cache)
+
+        if entry is not None and not self._should_recompute(entry):
+            return entry['data']
+
+        lock_key = cache.make_and_validate_key(f"{key_cache}:lock")
+        token = uuid.uuid4().hex
+
+        if get_redis().set(lock_key, token, nx=True, ex=self.cache_lock_timeout):
+            try:
+                return self._build_cache(key_cache, builder, cache_time)
+            finally:
+                get_redis().eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+        # Another worker is rebuilding the key: serve the old value while it can
+        if entry is not None:
+            return entry['data']
+
+        deadline = time.monotonic() + self.cache_wait_timeout
+
+        while time.monotonic() < deadline:
+            time.sleep(self.cache_wait_interval)
+            entry = cache.get(key_cache)
+
+            if entry is not None:
+                return entry['data']
+
+        # The lock holder is too slow or died, build the value ourselves
+        return self._build_cache(key_cache, builder, cache_time)
 
-        if not data:
-            return None
-        else:
-            return data
-        
     def del_cache(self, key_cache: str):
-        cache.delete(key_cache)
\ No newline at end of file
+        cache.delete(key_cache)
+
+    def _build_cache(self, key_cache: str, builder: Callable[[], Any], cache_time: int):
+        start = time.monotonic()
+
+        with db_router.primary():
+            data = builder()
+
+        if data is None:
+            return None
+
+        delta = time.monotonic() - start
+
+        cache.set(key_cache, {
+            'data': data,
+            'delta': delta,
+            'expiry': time.time() + cache_time,
+        }, cache_time)
+
+        return data
+
+    def _should_recompute(self, entry: dict) -> bool:
+        # XFetch: the closer to expiry and the slower the build, the likelier a refresh
+        rand = 1.0 - random.random()
+        return time.time() - entry['delta'] * self.cache_beta * math.log(rand) >= entry['expiry']
@@ -0,0 +1,118 @@
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+
+class MonthlyPartitions:
+    """
+    Monthly ``RANGE (created_at)`` partitions of a declaratively partitioned table.
+
+    Partitions are named ``{table}_pYYYY_MM`` and bounded by UTC month starts.
+    ``{table}_default`` catches rows outside every partition so an insert never
+    fails when the maintenance job is late; ``create`` moves such rows out of it.
+    """
+
+    def __init__(self, table: str):
+        self.table = table
+        self.default = f'{table}_default'
+        self._name_re = re.compile(rf'^{re.escape(table)}_p(\d{{4}})_(\d{{2}})$')
+
+    @staticmethod
+    def month_start(value) -> date:
+        return date(value.year, value.month, 1)
+
+    @staticmethod
+    def add_months(month: date, count: int) -> date:
+        index = month.year * 12 + month.month - 1 + count
+        return date(index // 12, index % 12 + 1, 1)
+
+    @staticmethod
+    def bound(month: date) -> datetime:
+        return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+    def name(self, month: date) -> str:
+        return f'{self.table}_p{month.year:04d}_{month.month:02d}'
+
+    def existing(self) -> dict:
+        """``{month: partition name}`` of the attached monthly partitions."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = %s::regclass
+                """,
+                [self.table],
+            )
+            names = [row[0] for row in cursor.fetchall()]
+
+        months = {}
+
+        for name in names:
+            match = self._name_re.match(name)
+
+            if match:
+                months[date(int(match[1]), int(match[2]), 1)] = name
+
+        return months
+
+    def create(self, first: date, last: date) -> list:
+        """Creates the missing partitions for every month from ``first`` to ``last``."""
+        existing = self.existing()
+        created = []
+        month = self.month_start(first)
+
+        while month <= last:
+            if month not in existing:
+                self.create_month(month)
+                created.append(self.name(month))
+
+            month = self.add_months(month, 1)
+
+        return created
+
+    def create_month(self, month: date):
+        quote = connection.ops.quote_name
+        table, default, name = quote(self.table), quote(self.default), quote(self.name(month))
+        lower, upper = self.bound(month), self.bound(self.add_months(month, 1))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= %s AND created_at < %s)",
+                [lower, upper],
+            )
+
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                    [lower, upper],
+                )
+                return
+
+            # Postgres refuses a partition whose rows sit in the default one, move them over
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+            cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", [lower, upper])
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                f"INSERT INTO {table} SELECT * FROM moved",
+                [lower, upper],
+            )
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+
+    def drop_before(self, month: date) -> list:
+        """Detaches and drops the partitions of the months before ``month``."""
+        quote = connection.ops.quote_name
+        dropped = []
+
+        for partition_month, name in sorted(self.existing().items()):
+            if partition_month >= month:
+                break
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {quote(self.table)} DETACH PARTITION {quote(name)}")
+                cursor.execute(f"DROP TABLE {quote(name)}")
+
+            dropped.append(name)
+
+        return dropped
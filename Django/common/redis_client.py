@@ -0,0 +1,23 @@
+import os
+
+import redis
+
+from main import settings
+
+_clients = {}
+
+
+def get_redis() -> redis.Redis:
+    """
+    Raw client for the cache Redis, for structures the cache API doesn't offer
+    (hashes, sets, sorted sets). One client per process, connections aren't
+    shared across fork.
+    """
+    pid = os.getpid()
+    client = _clients.get(pid)
+
+    if client is None:
+        _clients.clear()
+        client = _clients[pid] = redis.Redis.from_url(settings.CACHES['default']['LOCATION'], decode_responses=True)
+
+    return client
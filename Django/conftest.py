@@ -43,4 +43,10 @@ def create_users(django_db_setup, django_db_blocker):
     yield
     
     with django_db_blocker.unblock():
-        User.objects.all().delete()
\ No newline at end of file
+        User.objects.all().delete()
+
+@pytest.fixture(autouse=True)
+def strict_query_budgets(monkeypatch):
+    from main import settings
+
+    monkeypatch.setattr(settings, 'QUERY_BUDGET_STRICT', True)
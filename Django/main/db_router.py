@@ -0,0 +1,100 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from main import settings
+
+
+class RoutingState:
+    def __init__(self, use_replica: bool):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state: ContextVar = ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def routing(use_replica: bool):
+    """
+    Routes the reads of the enclosed code to a replica when ``use_replica``.
+    Outside of it (celery, commands, websockets) everything goes to the primary.
+    """
+    state = RoutingState(use_replica)
+    token = _state.set(state)
+
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """
+    Reads of the enclosed code go to the primary, for values stored in the shared cache:
+    a rebuild that read a lagging replica would keep stale data under a fresh version.
+    """
+    state = _state.get()
+
+    if state is None or not state.use_replica:
+        yield
+        return
+
+    state.use_replica = False
+
+    try:
+        yield
+    finally:
+        # A write inside still pins the rest of the request
+        state.use_replica = not state.wrote
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random alias from ``DATABASE_REPLICAS`` while the current
+    request allows it, and everything else to the primary.
+
+    The first write of a request pins the rest of it to the primary, so a view
+    never reads older data than it just wrote.
+    """
+
+    def __init__(self, replicas=None):
+        self.replicas = list(settings.DATABASE_REPLICAS if replicas is None else replicas)
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+
+        if not self.replicas or state is None or not state.use_replica:
+            return DEFAULT_DB_ALIAS
+
+        if model._meta.app_label in settings.REPLICA_EXCLUDED_APPS:
+            return DEFAULT_DB_ALIAS
+
+        # Reads inside a transaction must see its own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+
+        if state is not None and model._meta.app_label not in settings.REPLICA_EXCLUDED_APPS:
+            state.wrote = True
+            state.use_replica = False
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *self.replicas}
+
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
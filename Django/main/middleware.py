@@ -1,17 +1,177 @@
 
 
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
 from django.http import HttpResponse
 
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from common.redis_client import get_redis
+from main import db_router, settings
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger('main.queries')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCollector:
+    """``execute_wrapper`` that counts queries, DB time and query shapes."""
+
+    # Placeholder lists differ only by their length, keep them one shape
+    _in_list = re.compile(r'IN \((?:%s, )*%s\)')
+    # Transaction bookkeeping of atomic blocks, not data the view asked for
+    _savepoint = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self._last_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # Silk saves its own rows and EXPLAINs each query it has just seen, that's
+        # not the view's cost
+        if 'silk_' in sql or sql.startswith(self._savepoint) or (
+            sql.startswith('EXPLAIN') and self._last_sql and sql.endswith(self._last_sql)
+        ):
+            return execute(sql, params, many, context)
+
+        self._last_sql = sql
+
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[self._in_list.sub('IN (...)', sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
 
 class LogMiddleware:
+    """
+    Per-request query count and DB time, reported in ``Server-Timing``.
+
+    Query shapes repeated ``QUERY_REPEAT_THRESHOLD`` times (N+1) are logged with
+    the view name. Safe requests over their view's ``QUERY_BUDGETS`` entry are
+    logged, or raise ``QueryBudgetExceeded`` when ``QUERY_BUDGET_STRICT`` (tests).
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     
     def __call__(self, request):
-        response = self.get_response(request)
+        if not settings.QUERY_INSTRUMENTATION:
+            return self.get_response(request)
+
+        collector = QueryCollector()
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(collector))
+
+            response = self.get_response(request)
+
+        response['Server-Timing'] = f'db;dur={collector.duration * 1000:.1f};desc="{collector.count} queries"'
+
+        self.check_queries(request, collector)
+
         return response
     
     def process_exception(self, request, exception):
-        return None
\ No newline at end of file
+        return None
+
+    def check_queries(self, request, collector):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+
+        for sql, count in collector.repeated(settings.QUERY_REPEAT_THRESHOLD):
+            logger.warning('Possible N+1 in %s: %s queries of shape %s', view_name, count, sql[:300])
+
+        # Router list and create share the url name, budgets bound the reads
+        if request.method not in SAFE_METHODS:
+            return
+
+        budget = settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+        if budget is None or collector.count <= budget:
+            return
+
+        message = f'{view_name} ran {collector.count} queries ({collector.duration * 1000:.1f}ms), budget is {budget}'
+
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+
+        logger.warning(message)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from replicas. A request that wrote pins its user
+    to the primary in Redis for ``REPLICA_PIN_SECONDS``, so the user reads its own
+    writes until the replicas have caught up. Keyed by user, not by a cookie: the
+    frontend is cross-site and authenticates with JWT.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def pin_key(user_id) -> str:
+        return f"replica_pin:{user_id}"
+
+    @staticmethod
+    def token_user_id(request):
+        # The view authenticates later (DRF), only the signed claim is needed here
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+
+        if header is None:
+            return None
+
+        try:
+            raw_token = authentication.get_raw_token(header)
+            return None if raw_token is None else authentication.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return None
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            with db_router.routing(False):
+                return self.get_response(request)
+
+        user_id = self.token_user_id(request)
+        use_replica = request.method in SAFE_METHODS
+
+        if use_replica and user_id is not None:
+            use_replica = not get_redis().exists(self.pin_key(user_id))
+
+        with db_router.routing(use_replica) as state:
+            response = self.get_response(request)
+
+        if state.wrote:
+            # DRF sets the authenticated user on the request, covers login and register too
+            user = getattr(request, 'user', None)
+
+            if user is not None and user.is_authenticated:
+                user_id = user.id
+
+            if user_id is not None:
+                get_redis().set(self.pin_key(user_id), 1, ex=settings.REPLICA_PIN_SECONDS)
+
+        return response
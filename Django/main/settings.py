@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import dj_database_url
 from django.conf.global_settings import DATABASES
 from django.utils.timezone import timedelta
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     "django.contrib.sites",
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     "corsheaders",
@@ -75,6 +76,7 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -83,9 +85,11 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'main.middleware.LogMiddleware',
-    'silk.middleware.SilkyMiddleware',
 ]
 
+if DEBUG:
+    MIDDLEWARE.append('silk.middleware.SilkyMiddleware')
+
 ROOT_URLCONF = 'main.urls'
 
 
@@ -134,6 +138,45 @@ DATABASES = {
     )
 }
 
+# Read replicas, comma separated database urls. A second url to the same server works for local testing
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+DATABASE_REPLICAS = []
+
+for index, replica_url in enumerate(DATABASE_REPLICA_URLS):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(replica_url, conn_max_age=600)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+# One psycopg connection pool per process and alias, shared by every thread (sync_to_async
+# workers, celery). Connections go back to the pool at the end of each request
+DATABASE_POOL = config('DATABASE_POOL', default=True, cast=bool)
+DATABASE_POOL_OPTIONS = {
+    'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+    'max_size': config('DATABASE_POOL_MAX_SIZE', default=10, cast=int),
+    # Seconds to wait for a free connection before failing the request
+    'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=float),
+    'max_idle': config('DATABASE_POOL_MAX_IDLE', default=300, cast=float),
+    'max_lifetime': config('DATABASE_POOL_MAX_LIFETIME', default=1800, cast=float),
+}
+
+# Health check (a cheap round trip) on every checkout, drops connections the server closed
+DATABASE_POOL_CHECK = config('DATABASE_POOL_CHECK', default=True, cast=bool)
+
+if DATABASE_POOL:
+    for database in DATABASES.values():
+        # Persistent connections and the pool are mutually exclusive
+        database['CONN_MAX_AGE'] = 0
+        database['CONN_HEALTH_CHECKS'] = DATABASE_POOL_CHECK
+        database.setdefault('OPTIONS', {})['pool'] = dict(DATABASE_POOL_OPTIONS)
+
+DATABASE_ROUTERS = ['main.db_router.ReplicaRouter']
+
+# After a write the user reads from the primary for this long (pinned in Redis by user id)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+# Always read from and write to the primary, their writes don't pin the client
+REPLICA_EXCLUDED_APPS = ('silk', 'sessions')
+
 
 CACHES = {
     "default": {
@@ -142,6 +185,97 @@ CACHES = {
     }
 }
 
+# Optional per-process L1 in front of Redis, see common.cache_backends.TieredRedisCache
+CACHE_L1_ENABLED = config('CACHE_L1_ENABLED', default=False, cast=bool)
+
+if CACHE_L1_ENABLED:
+    CACHES['default']['BACKEND'] = 'common.cache_backends.TieredRedisCache'
+    CACHES['default']['L1'] = {
+        'MAX_ENTRIES': config('CACHE_L1_MAX_ENTRIES', default=5000, cast=int),
+        'MAX_BYTES': config('CACHE_L1_MAX_BYTES', default=32 * 1024 * 1024, cast=int),
+        'TIMEOUT': config('CACHE_L1_TIMEOUT', default=30, cast=int),
+    }
+
+# Group/project caches are invalidated through generation counters (common.cache_managers),
+# so they can live much longer than a minute
+CACHE_TTL = config('CACHE_TTL', default=60 * 60 * 6, cast=int)
+
+# Latest tasks shown per project in the group detail (?tasks=N)
+GROUP_TASKS_PREVIEW = 2
+GROUP_TASKS_PREVIEW_MAX = 10
+
+# Group dashboards are invalidated by task writes, the TTL bounds how stale the
+# overdue counts and the tracked time (flushed every few seconds) can get
+GROUP_DASHBOARD_TTL = 60
+
+# Tasks per TaskViewSet.bulk_update request
+TASK_BULK_MAX = 500
+
+# Chat attachments (task.uploads.PendingUploads) are spooled to temporary files, in memory
+# up to CHAT_UPLOAD_SPOOL_MEMORY bytes per file. Binary frames are at most CHAT_UPLOAD_CHUNK_SIZE,
+# the client keeps CHAT_UPLOAD_WINDOW bytes in flight past the last upload_ack.
+# Messages left without a frame for CHAT_UPLOAD_PENDING_TTL seconds are dropped
+CHAT_UPLOAD_MAX_FILE_SIZE = config('CHAT_UPLOAD_MAX_FILE_SIZE', default=10 * 1024 * 1024, cast=int)
+CHAT_UPLOAD_MAX_PENDING_SIZE = config('CHAT_UPLOAD_MAX_PENDING_SIZE', default=50 * 1024 * 1024, cast=int)
+CHAT_UPLOAD_MAX_PENDING_FILES = 20
+CHAT_UPLOAD_SPOOL_MEMORY = 64 * 1024
+CHAT_UPLOAD_CHUNK_SIZE = 256 * 1024
+CHAT_UPLOAD_WINDOW = 1024 * 1024
+CHAT_UPLOAD_PENDING_TTL = 120
+
+# Threads storing received attachments (task.uploads.attachments_executor), per ASGI process
+CHAT_ATTACHMENT_WORKERS = config('CHAT_ATTACHMENT_WORKERS', default=4, cast=int)
+
+# WebP variants of chat images (api.tasks.create_image_variants), fitted into a square of the given side.
+# Chat messages link them with their sizes, clients lay the page out without the originals
+# Without Celery (ENABLE_CELERY) they are made inline on commit, after the broadcast for uploads over the chat socket
+TASK_IMAGE_VARIANTS = {'thumbnail': 320, 'preview': 1280}
+TASK_IMAGE_WEBP_QUALITY = 80
+
+# Max users returned by search_users
+SEARCH_USERS_LIMIT = config('SEARCH_USERS_LIMIT', default=20, cast=int)
+
+# Lifetime of the cached unread notifications counter, it is recounted after expiry
+NOTIFICATIONS_UNREAD_TTL = 60 * 60 * 24
+
+# Task timer heartbeats are buffered in Redis and flushed to the DB in batches,
+# a session is closed after SESSION_HEARTBEAT_TIMEOUT seconds without a tick
+SESSION_HEARTBEAT_TIMEOUT = 60 * 10
+SESSION_HEARTBEAT_FLUSH_INTERVAL = 30
+SESSION_HEARTBEAT_FLUSH_BATCH = 500
+SESSION_HEARTBEAT_FLUSH_ROUNDS = 20
+
+# LogMiddleware query instrumentation. Budgets of safe requests are keyed by url name,
+# over budget is logged, or raised when QUERY_BUDGET_STRICT (enabled in tests)
+QUERY_INSTRUMENTATION = config('QUERY_INSTRUMENTATION', default=True, cast=bool)
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGETS = {
+    'api:groups-list': 4,
+    'api:groups-detail': 6,
+    'api:groups-dashboard': 4,
+    'api:groups-projects-list': 6,
+    'api:task-list': 5,
+    'api:tasks-list': 5,
+    'api:task-statistics-summary': 4,
+    'api:notification-list': 4,
+    'api:notification-unread-count': 3,
+    'api:group-logs-list': 6,
+    'api:search': 5,
+}
+
+# History retention, applied daily by api.tasks.maintain_history. 0 keeps everything.
+# group_logs is partitioned by month, whole partitions past retention are dropped
+GROUP_LOGS_RETENTION_MONTHS = config('GROUP_LOGS_RETENTION_MONTHS', default=12, cast=int)
+GROUP_LOGS_PARTITIONS_AHEAD = 3
+NOTIFICATIONS_RETENTION_DAYS = config('NOTIFICATIONS_RETENTION_DAYS', default=180, cast=int)
+NOTIFICATIONS_PURGE_BATCH = 5000
+
+# Full-text search results per type (?limit=N)
+SEARCH_RESULTS_LIMIT = 10
+SEARCH_RESULTS_MAX = 50
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,77 +1,143 @@
 import json
 from channels.db import database_sync_to_async
-from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.core.files.base import ContentFile
-from django.db.models import Prefetch
 
 from api.serializers.task_chat_serializers import TaskChatMessageSerializer
 from api.serializers.user_serializers import UserSerializer
-from task.models import Task, TaskComment, TaskImage
+from common.cache_managers.notification_cache import NotificationCacheManager
+from main import settings
+from task.models import Task, TaskComment
+from task.uploads import PendingUploads, UploadError, save_attachments, schedule_variants
 from users.models import Group
 
 
+def group_members_channel(group_id) -> str:
+    """Channel layer group of the chat sockets of a group, told when a member is removed."""
+    return f"group_members_{group_id}"
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.pending_files = {}
+        self.uploads = PendingUploads()
 
     async def connect(self):
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
         self.room_group_name = f"task_chat_{self.room_name}"
+        self.user = self.scope.get('user')
+
+        # Resolved once, messages are checked against it without a query
+        self.task_id = int(self.room_name) if self.room_name.isdigit() else None
+        self.group_id = await self.get_member_group_id()
+
+        if self.group_id is None:
+            await self.close(code=4403)
+            return
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.channel_layer.group_add(group_members_channel(self.group_id), self.channel_name)
 
         await self.accept()
 
 
     async def disconnect(self, close_code):
+        self.uploads.close()
+
+        if getattr(self, 'group_id', None) is None:
+            return
+
         # Leave room group
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        await self.channel_layer.group_discard(group_members_channel(self.group_id), self.channel_name)
+
+    async def membership_changed(self, event):
+        # Sent to every socket of the group, only the affected user re-validates
+        if event['user_id'] != self.user.id:
+            return
+
+        if await self.get_member_group_id() is None:
+            self.uploads.close()
+            await self.send(text_data=json.dumps({'type': 'access_revoked', 'taskId': self.task_id}))
+            await self.close(code=4403)
 
     
     async def receive(self, text_data = None, bytes_data = None):
-        
-        if text_data:
-            data = json.loads(text_data)
-            print(data)
-            message_type = data.get('type')
-
-            if message_type == 'message_metadata':
-                message= await self.create_notification(data)
-                print(message)
-                self.pending_files[data['messageId']] = {
-                    'message': message['data'],
-                    'files': [],
-                    'expected_count': data['filesCount']
-                }
-
-            elif message_type == 'file_metadata':
-                message_id = data['messageId']
-                if message_id in self.pending_files:
-                    self.pending_files[message_id]['files'].append({
-                        'metadata': data,
-                        'data': None
-                    })
-
-            elif message_type == 'message_complete':
-                message_id = data['messageId']
-                await self.save_message_files(message_id)
-                user = UserSerializer(self.scope['user']).data
-                actual_message = await self.get_updated_message(self.pending_files[message_id]['message'].id)
-                print(actual_message)
-                print(actual_message.task_images)
-                await self.channel_layer.group_send(
-                    self.room_group_name, {"type": "chat.message", "message": TaskChatMessageSerializer(actual_message).data, 'user': user}
-                )
-
-        elif bytes_data:
-            for message_id, pending in self.pending_files.items():
-                for file_info in pending['files']:
-                    if file_info['data'] is None:
-                        file_info['data'] = bytes_data
-                        break
+        for message_id in self.uploads.evict_expired():
+            await self.send_upload_error(UploadError('expired', message_id))
+
+        try:
+            if text_data:
+                await self.receive_command(json.loads(text_data))
+
+            elif bytes_data:
+                message_id, index, offset, file = self.uploads.write(bytes_data)
+
+                # The client keeps at most CHAT_UPLOAD_WINDOW bytes in flight past the last ack
+                await self.send(text_data=json.dumps({
+                    'type': 'upload_ack',
+                    'messageId': message_id,
+                    'fileIndex': index,
+                    'offset': offset,
+                    'received': file.received,
+                    'window': settings.CHAT_UPLOAD_WINDOW,
+                }))
+
+        except UploadError as error:
+            if error.message_id is not None:
+                self.uploads.discard(error.message_id)
+
+            await self.send_upload_error(error)
+
+        except (KeyError, TypeError, ValueError):
+            await self.send_upload_error(UploadError('bad_request'))
+
+    async def receive_command(self, data):
+        message_type = data.get('type')
+
+        if message_type == 'message_metadata':
+            if str(data.get('taskId')) != str(self.task_id):
+                raise UploadError('forbidden_task', data.get('messageId'))
+
+            # Limits are checked before the comment is created
+            pending = self.uploads.start(data['messageId'], None, int(data.get('filesCount', 0)))
+            message = await self.create_notification(data)
+
+            if message['type'] == 'error':
+                raise UploadError('unknown_task', data['messageId'])
+
+            pending.message = message['data']
+
+            await self.send(text_data=json.dumps({
+                'type': 'upload_ready',
+                'messageId': str(data['messageId']),
+                'maxFileSize': settings.CHAT_UPLOAD_MAX_FILE_SIZE,
+                'chunkSize': settings.CHAT_UPLOAD_CHUNK_SIZE,
+                'window': settings.CHAT_UPLOAD_WINDOW,
+            }))
+
+        elif message_type == 'file_metadata':
+            self.uploads.add_file(data['messageId'], int(data['fileIndex']), data['fileName'], int(data['fileSize']))
+
+        elif message_type == 'message_complete':
+            pending = self.uploads.pop(data['messageId'])
+
+            try:
+                # The comment was created with this user, serialized as is instead of read back
+                pending.message.task_images = await save_attachments(pending)
+            finally:
+                pending.close()
+
+            user = UserSerializer(self.user).data
+
+            await self.channel_layer.group_send(
+                self.room_group_name, {"type": "chat.message", "message": TaskChatMessageSerializer(pending.message).data, 'user': user}
+            )
+
+            schedule_variants(pending.message.task_images)
+
+    async def send_upload_error(self, error: UploadError):
+        await self.send(text_data=json.dumps({'type': 'upload_error', 'messageId': error.message_id, 'code': error.code}))
 
     # Receive message from room group
     async def chat_message(self, event):
@@ -85,14 +151,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     @database_sync_to_async
-    def get_updated_message(self, message_id):
-        return TaskComment.objects.select_related('user').prefetch_related(
-            Prefetch(
-                'message_image',
-                queryset=TaskImage.objects.all(),
-                to_attr='task_images'
-            )
-        ).get(id=message_id)
+    def get_member_group_id(self):
+        if self.task_id is None or not self.user or not self.user.is_authenticated:
+            return None
+
+        return Task.objects.filter(id=self.task_id, project__group__members=self.user).values_list(
+            'project__group_id', flat=True
+        ).first()
 
     @database_sync_to_async
     def get_groups(self, user):
@@ -113,8 +178,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
         print(answer_message_data)
         try:
             created = TaskComment.objects.create(
-                task_id=data['taskId'],
-                user=self.scope['user'],
+                task_id=self.task_id,
+                user=self.user,
                 text=data['message'],
                 answer_to=answer_message_data
             )
@@ -124,28 +189,6 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Task.DoesNotExist:
                 return {"type":'error', "message": 'Not Task Chat model exists'}
 
-    @sync_to_async
-    def save_message_files(self, message_id):
-        if message_id not in self.pending_files:
-            return
-        
-        pending = self.pending_files[message_id]
-        message = pending['message']
-
-        print(self.pending_files)
-
-        for file_info in pending['files']:
-            metadata = file_info['metadata']
-            file_data = file_info['data']
-
-            if file_data:
-                file_obj = ContentFile(file_data, name=metadata['fileName'])
-                TaskImage.objects.create(
-                    message=message,
-                    image=file_obj
-                )
-        
-        
 
 class NotifiConsumer(AsyncWebsocketConsumer):
 
@@ -158,6 +201,9 @@ class NotifiConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(f'chat_{user.id}', self.channel_name)
             await self.accept()
 
+            count = await database_sync_to_async(NotificationCacheManager.get_unread)(user.id)
+            await self.send(text_data=json.dumps({"unread_count": count}))
+
         
     async def chat_message(self, event):
         message = event.get('message', None)
@@ -171,6 +217,9 @@ class NotifiConsumer(AsyncWebsocketConsumer):
 
         await self.send(text_data=json.dumps({"message": message}))
 
+    async def unread_count(self, event):
+        await self.send(text_data=json.dumps({"unread_count": event['count']}))
+
     @database_sync_to_async
     def get_groups(self, task_id):
         task = Task.objects.select_related('group').get(id=task_id)
@@ -0,0 +1,153 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+
+from common.redis_client import get_redis
+from main import settings
+from task.models import TaskPerformSession, TaskTimeRollup
+
+
+class SessionHeartbeats:
+    """
+    Write-behind buffer for the task timer.
+
+    A tick only touches Redis: the running duration goes into a hash per
+    session, and the session id into a ``dirty`` set and a sorted set scored
+    by the time of the last tick. ``flush`` writes dirty sessions to Postgres
+    with one ``bulk_update``. ``expire`` closes sessions that stopped ticking by
+    reading the sorted set instead of scanning the table.
+
+    The hash has no TTL: it holds the last duration until a flush writes it, however
+    late that runs, and ``forget`` drops it once the session is closed.
+    """
+
+    DIRTY_KEY = 'session_heartbeats:dirty'
+    SEEN_KEY = 'session_heartbeats:seen'
+
+    @staticmethod
+    def _key(session_id) -> str:
+        return f"session_heartbeat:{session_id}"
+
+    @classmethod
+    def beat(cls, session_id: int, user_id: int, duration_ms: int) -> bool:
+        """Records a tick, returns False if the session is closed or not the user's."""
+        redis = get_redis()
+        key = cls._key(session_id)
+        performer_id = redis.hget(key, 'performer_id')
+
+        if performer_id is None:
+            # First tick in this buffer, the only one that reads the session row
+            session = TaskPerformSession.objects.filter(id=session_id, is_active=True).only('performer_id').first()
+
+            if session is None:
+                return False
+
+            performer_id = str(session.performer_id or '')
+
+        if performer_id != str(user_id):
+            return False
+
+        now = time.time()
+
+        pipe = redis.pipeline(transaction=False)
+        pipe.hset(key, mapping={'performer_id': performer_id, 'duration_ms': int(duration_ms), 'beat_at': now})
+        pipe.zadd(cls.SEEN_KEY, {session_id: now})
+        pipe.sadd(cls.DIRTY_KEY, session_id)
+        pipe.execute()
+
+        return True
+
+    @classmethod
+    def flush(cls, ids=None) -> int:
+        """
+        Writes buffered durations of ``ids`` (or a batch of dirty sessions) to
+        the DB, returns how many sessions were taken from the buffer.
+        """
+        redis = get_redis()
+
+        if ids is None:
+            ids = redis.spop(cls.DIRTY_KEY, settings.SESSION_HEARTBEAT_FLUSH_BATCH) or []
+        elif ids:
+            redis.srem(cls.DIRTY_KEY, *ids)
+
+        if not ids:
+            return 0
+
+        pipe = redis.pipeline(transaction=False)
+
+        for session_id in ids:
+            pipe.hmget(cls._key(session_id), 'duration_ms', 'beat_at')
+
+        beats = {
+            int(session_id): (int(duration_ms), float(beat_at))
+            for session_id, (duration_ms, beat_at) in zip(ids, pipe.execute())
+            if duration_ms is not None
+        }
+
+        try:
+            with transaction.atomic():
+                # A tick racing with close/expire may have refilled the buffer of a closed session
+                sessions = TaskPerformSession.objects.select_for_update().filter(id__in=beats, is_active=True).only(
+                    'id', 'task_id', 'performer_id', 'duration', 'created_at',
+                )
+
+                changed = []
+                deltas = []
+
+                for session in sessions:
+                    duration_ms, beat_at = beats[session.id]
+                    duration = timedelta(seconds=duration_ms // 1000)
+
+                    if duration <= session.duration:
+                        continue
+
+                    deltas.append((session.task_id, session.performer_id, session.rollup_day, duration - session.duration, 0))
+                    session.duration = duration
+                    session.updated_at = datetime.fromtimestamp(beat_at, tz=dt_timezone.utc)
+                    changed.append(session)
+
+                TaskPerformSession.objects.bulk_update(changed, ['duration', 'updated_at'])
+                TaskTimeRollup.objects.add_many(deltas)
+        except Exception:
+            # Keep them for the next flush
+            redis.sadd(cls.DIRTY_KEY, *beats)
+            raise
+
+        return len(ids)
+
+    @classmethod
+    def expire(cls) -> list:
+        """Closes sessions whose last tick is older than SESSION_HEARTBEAT_TIMEOUT."""
+        redis = get_redis()
+        cutoff = time.time() - settings.SESSION_HEARTBEAT_TIMEOUT
+        ids = [int(session_id) for session_id in redis.zrangebyscore(cls.SEEN_KEY, '-inf', cutoff)]
+
+        if ids:
+            cls.flush(ids)
+            TaskPerformSession.objects.filter(id__in=ids, is_active=True).update(is_active=False)
+            cls.forget(ids)
+
+        return ids
+
+    @classmethod
+    def live_ids(cls) -> list:
+        cutoff = time.time() - settings.SESSION_HEARTBEAT_TIMEOUT
+        return [int(session_id) for session_id in get_redis().zrangebyscore(cls.SEEN_KEY, cutoff, '+inf')]
+
+    @classmethod
+    def close(cls, session_id: int):
+        cls.flush([session_id])
+        TaskPerformSession.objects.filter(id=session_id).update(is_active=False)
+        cls.forget([session_id])
+
+    @classmethod
+    def forget(cls, ids):
+        if not ids:
+            return
+
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zrem(cls.SEEN_KEY, *ids)
+        pipe.srem(cls.DIRTY_KEY, *ids)
+        pipe.delete(*[cls._key(session_id) for session_id in ids])
+        pipe.execute()
@@ -0,0 +1,91 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+
+from main import settings
+from task.models import TaskImage
+
+
+# EXIF orientations turning the picture by 90 degrees
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def variant_name(name: str, variant: str) -> str:
+    """``task_images/photo.jpg`` -> ``task_images/thumbnail/photo.webp``"""
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, variant, os.path.splitext(filename)[0] + '.webp')
+
+
+def decode(source, side: int):
+    """
+    Returns ``(picture, width, height)``: the picture upright, decoded at a reduced scale
+    when it's a JPEG bigger than ``side``, and the size of the original. None if Pillow can't read it.
+    """
+    try:
+        with Image.open(source) as picture:
+            width, height = picture.size
+
+            if picture.getexif().get(ExifTags.Base.Orientation) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+
+            # JPEGs are decoded straight at a reduced scale, no bigger than the largest variant needs
+            picture.draft('RGB', (side, side))
+            picture.load()
+            picture = ImageOps.exif_transpose(picture)
+
+        if picture.mode not in ('RGB', 'RGBA'):
+            picture = picture.convert('RGBA' if 'transparency' in picture.info or picture.mode in ('LA', 'PA') else 'RGB')
+
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return None
+
+    return picture, width, height
+
+
+def create_variants(image: TaskImage) -> bool:
+    """
+    Stores the WebP variants of ``image`` (settings.TASK_IMAGE_VARIANTS, largest first,
+    each one resized from the previous) and records the sizes of the original and the
+    variants. Files Pillow can't read only get their byte size. Returns False if the file is gone.
+    """
+    storage = image.image.storage
+    name = image.image.name
+    sides = sorted(settings.TASK_IMAGE_VARIANTS.items(), key=lambda item: item[1], reverse=True)
+    variants = {}
+
+    try:
+        image.size = storage.size(name)
+        source = storage.open(name, 'rb')
+    except FileNotFoundError:
+        return False
+
+    with source:
+        decoded = decode(source, sides[0][1])
+
+    if decoded is None:
+        image.width = image.height = None
+    else:
+        picture, image.width, image.height = decoded
+
+        # Storage errors are not an unreadable image, they propagate
+        for variant, side in sides:
+            picture.thumbnail((side, side), Image.Resampling.LANCZOS)
+
+            buffer = io.BytesIO()
+            picture.save(buffer, 'WEBP', quality=settings.TASK_IMAGE_WEBP_QUALITY, method=4)
+
+            variants[variant] = {
+                'name': storage.save(variant_name(name, variant), ContentFile(buffer.getvalue())),
+                'width': picture.width,
+                'height': picture.height,
+                'size': buffer.tell(),
+            }
+
+    image.variants = variants
+    TaskImage.objects.filter(id=image.id).update(
+        width=image.width, height=image.height, size=image.size, variants=variants,
+    )
+
+    return True
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from task.models import Task, TaskTimeRollup
+
+
+class Command(BaseCommand):
+    help = "Recomputes TaskTimeRollup rows from TaskPerformSession"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, nargs='*', help='Only rebuild these task ids')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.order_by('pk')
+
+        if options['task']:
+            tasks = tasks.filter(pk__in=options['task'])
+
+        ids = list(tasks.values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        created = 0
+
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                created += TaskTimeRollup.objects.rebuild(ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} rollup rows for {len(ids)} tasks"))
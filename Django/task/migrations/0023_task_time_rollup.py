@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:32
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    TaskPerformSession = apps.get_model('task', 'TaskPerformSession')
+    TaskTimeRollup = apps.get_model('task', 'TaskTimeRollup')
+
+    schema_editor.execute(
+        f"""
+        INSERT INTO {TaskTimeRollup._meta.db_table} (task_id, performer_id, day, duration, sessions)
+        SELECT task_id, performer_id, (created_at AT TIME ZONE %s)::date, SUM(duration), COUNT(*)
+        FROM {TaskPerformSession._meta.db_table}
+        GROUP BY 1, 2, 3
+        """,
+        [settings.TIME_ZONE],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0022_search_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('duration', models.DurationField(default=datetime.timedelta)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('performer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='time_rollups', to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_rollups', to='task.task')),
+            ],
+            options={
+                'verbose_name': 'Task time rollup',
+                'verbose_name_plural': 'Task time rollups',
+                'db_table': 'task_time_rollup',
+                'constraints': [models.UniqueConstraint(fields=('task', 'performer', 'day'), name='task_time_rollup_unique_day')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
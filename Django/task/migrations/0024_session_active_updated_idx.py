@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0023_task_time_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskperformsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['updated_at'], name='session_active_updated_idx'),
+        ),
+    ]
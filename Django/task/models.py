@@ -1,4 +1,74 @@
-from django.db import models
+import re
+from datetime import datetime, time, timedelta
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchVector, SearchVectorField
+from django.db import connection, models
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, RowNumber, Trunc, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+# Language neutral, the texts are a mix of languages
+SEARCH_CONFIG = 'simple'
+
+
+def search_vector_field(*weighted_fields):
+    """
+    Stored ``tsvector`` generated column, Postgres keeps it in sync with the
+    source columns on every insert/update.
+    """
+    vector = None
+
+    for field, weight in weighted_fields:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+
+    return models.GeneratedField(expression=vector, output_field=SearchVectorField(), db_persist=True)
+
+
+def search_query(text: str):
+    """
+    Every word of ``text`` as a prefix term, 'simple' doesn't stem so this is
+    what lets 'refund' find 'refunds'. Returns None when there are no words.
+    """
+    words = re.findall(r'\w+', text)
+
+    if not words:
+        return None
+
+    return SearchQuery(' & '.join(f"{word}:*" for word in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+class ProjectQuerySet(models.QuerySet):
+
+    def dashboard(self, now, week_end):
+        """
+        Per project task counts by status, overdue and due before ``week_end``,
+        distinct performers and tracked time, as one GROUP BY over the tasks.
+
+        The counts are DISTINCT because the performers join repeats task rows, for
+        the same reason tracked time is summed in a correlated subquery on the
+        sessions instead of in the join.
+        """
+        tracked = TaskPerformSession.objects.filter(task__project=OuterRef('pk')).order_by().values(
+            'task__project'
+        ).annotate(total=Sum('duration')).values('total')
+
+        statuses = {
+            f'status_{value}': Count('tasks', filter=Q(tasks__status=value), distinct=True)
+            for value, _ in Task.STATUS_TASK
+        }
+
+        return self.order_by('id').values('id', 'title').annotate(
+            tasks_count=Count('tasks', distinct=True),
+            overdue=Count('tasks', filter=Q(tasks__deadline__lt=now), distinct=True),
+            due_this_week=Count('tasks', filter=Q(tasks__deadline__gte=now, tasks__deadline__lt=week_end), distinct=True),
+            performers_count=Count('tasks__performers', distinct=True),
+            tracked=Coalesce(Subquery(tracked), Value(timedelta(0))),
+            **statuses,
+        )
 
 
 class Project(models.Model):
@@ -8,14 +78,151 @@ class Project(models.Model):
     description = models.CharField(max_length=500, verbose_name="project_description", null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = search_vector_field(('title', 'A'), ('description', 'B'))
+
+    objects = ProjectQuerySet.as_manager()
 
     def __str__(self):
         return f"Project {self.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        # Signal receivers need the group the project belonged to before a save
+        if 'group_id' in field_names:
+            instance._loaded_group_id = instance.group_id
+
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_group_id = self.group_id
     
     class Meta:
         db_table = 'projects'
         verbose_name = 'Project'
         verbose_name_plural = 'Projects'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='projects_search_idx'),
+        ]
+
+
+class TaskQuerySet(models.QuerySet):
+
+    def latest_per_project(self, project_ids, limit: int):
+        """
+        Top ``limit`` newest tasks of every project in one query:
+        ROW_NUMBER() OVER (PARTITION BY project_id ORDER BY created_at DESC),
+        served by the (project, created_at, id) index.
+        """
+        return self.filter(project_id__in=project_ids).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('project_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        ).filter(row_number__lte=limit).order_by('project_id', 'row_number')
+
+    def filter_params(self, params):
+        """Applies the ``TaskViewSet.list`` query filters, ignoring malformed values."""
+        queryset = self
+        statuses = [value for value in params.get('status', '').split(',') if value]
+        valid_statuses = {value for value, _ in Task.STATUS_TASK}
+        statuses = [value for value in statuses if value in valid_statuses]
+
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        deadline_from = self._parse_date(params.get('deadline_from'))
+        deadline_to = self._parse_date(params.get('deadline_to'), end=True)
+
+        if deadline_from:
+            queryset = queryset.filter(deadline__gte=deadline_from)
+
+        if deadline_to:
+            queryset = queryset.filter(deadline__lte=deadline_to)
+
+        for param, lookup in (('performer', 'performers__id'), ('created_by', 'created_by_id')):
+            value = params.get(param)
+
+            if value and value.isdigit():
+                queryset = queryset.filter(**{lookup: int(value)})
+
+        return queryset
+
+    @staticmethod
+    def _parse_date(value, end=False):
+        if not value:
+            return None
+
+        # Well formed but impossible dates (2024-02-30) raise instead of returning None
+        try:
+            parsed = parse_datetime(value)
+
+            if parsed is None:
+                day = parse_date(value)
+
+                if day is None:
+                    return None
+
+                parsed = datetime.combine(day, time.max if end else time.min)
+        except ValueError:
+            return None
+
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+
+        return parsed
+
+    def attach_latest_to_projects(self, projects, limit: int, to_attr: str = 'project_tasks'):
+        projects_map = {project.id: project for project in projects}
+
+        for project in projects:
+            setattr(project, to_attr, [])
+
+        if limit <= 0 or not projects_map:
+            return projects
+
+        for task in self.latest_per_project(projects_map.keys(), limit):
+            project = projects_map[task.project_id]
+            task.project = project
+            getattr(project, to_attr).append(task)
+
+        return projects
+
+    def add_performers(self, task_ids, user_ids) -> int:
+        """
+        Assigns every user of ``user_ids`` to every task of ``task_ids`` with one
+        set-based insert, existing pairs are skipped. Returns the inserted rows,
+        ``m2m_changed`` is not sent.
+        """
+        task_ids, user_ids = list(task_ids), list(user_ids)
+
+        if not task_ids or not user_ids:
+            return 0
+
+        through = self.model.performers.through
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {connection.ops.quote_name(through._meta.db_table)} (task_id, user_id)
+                SELECT task_id, user_id FROM unnest(%s::bigint[]) AS task_id CROSS JOIN unnest(%s::bigint[]) AS user_id
+                ON CONFLICT (task_id, user_id) DO NOTHING
+                """,
+                [task_ids, user_ids],
+            )
+            return cursor.rowcount
+
+    def remove_performers(self, task_ids, user_ids=None) -> int:
+        """Unassigns ``user_ids`` (everybody when None) from ``task_ids``, ``m2m_changed`` is not sent."""
+        rows = self.model.performers.through.objects.filter(task_id__in=task_ids)
+
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+
+        return rows.delete()[0]
 
 
 class Task(models.Model):
@@ -38,6 +245,9 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     performers = models.ManyToManyField('users.User', related_name='assigned_tasks', verbose_name='performers', blank=True)
+    search_vector = search_vector_field(('name', 'A'), ('description', 'B'))
+
+    objects = TaskQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name}"
@@ -51,7 +261,11 @@ class Task(models.Model):
         verbose_name = 'Project task'
         verbose_name_plural = 'Project tasks'
         indexes = [
-            models.Index(fields=['project', 'created_at']),
+            models.Index(fields=['project', 'created_at', 'id']),
+            models.Index(fields=['project', 'status', 'created_at']),
+            models.Index(fields=['project', 'deadline']),
+            models.Index(fields=['created_by', 'created_at']),
+            GinIndex(fields=['search_vector'], name='task_search_idx'),
         ]
 
 class SubTask(models.Model):
@@ -93,6 +307,111 @@ class TaskPerformSession(models.Model):
 
     def __str__(self):
         return f"performer:{self.performer.username} , task:{self.task.name}"
+
+    class Meta:
+        indexes = [
+            # Fallback sweep for active sessions that never reached the heartbeat buffer
+            models.Index(fields=['updated_at'], condition=models.Q(is_active=True), name='session_active_updated_idx'),
+        ]
+
+    @property
+    def rollup_day(self):
+        # Sessions are attributed whole to the local day they started on
+        return timezone.localdate(self.created_at)
+
+
+class TaskTimeRollupQuerySet(models.QuerySet):
+
+    def add(self, task_id: int, performer_id, day, duration, sessions: int = 0):
+        self.add_many([(task_id, performer_id, day, duration, sessions)])
+
+    def add_many(self, rows):
+        """
+        Adds ``(task_id, performer_id, day, duration, sessions)`` deltas to the
+        rollups, creating missing rows, as one atomic upsert.
+        """
+        merged = {}
+
+        # ON CONFLICT can't touch the same row twice in one statement
+        for task_id, performer_id, day, duration, sessions in rows:
+            total_duration, total_sessions = merged.get((task_id, performer_id, day), (timedelta(0), 0))
+            merged[(task_id, performer_id, day)] = (total_duration + duration, total_sessions + sessions)
+
+        if not merged:
+            return
+
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(merged))
+        params = [value for key, totals in merged.items() for value in (*key, *totals)]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.model._meta.db_table} AS rollup (task_id, performer_id, day, duration, sessions)
+                VALUES {values}
+                ON CONFLICT (task_id, performer_id, day) DO UPDATE SET
+                    duration = rollup.duration + EXCLUDED.duration,
+                    sessions = rollup.sessions + EXCLUDED.sessions
+                """,
+                params,
+            )
+
+    def rebuild(self, task_ids) -> int:
+        """Recomputes the rollups of ``task_ids`` from their sessions."""
+        self.filter(task_id__in=task_ids).delete()
+
+        rows = TaskPerformSession.objects.filter(task_id__in=task_ids).values(
+            'task_id', 'performer_id', day=TruncDate('created_at'),
+        ).annotate(
+            total=Sum('duration'),
+            count=Count('id'),
+        ).order_by()
+
+        created = self.bulk_create([
+            self.model(
+                task_id=row['task_id'],
+                performer_id=row['performer_id'],
+                day=row['day'],
+                duration=row['total'],
+                sessions=row['count'],
+            )
+            for row in rows
+        ])
+
+        return len(created)
+
+    def buckets(self, period: str):
+        return self.annotate(
+            bucket=Trunc('day', period, output_field=models.DateField()),
+        ).values(
+            'bucket', 'performer_id', 'performer__username',
+        ).annotate(
+            total=Sum('duration'),
+            count=Sum('sessions'),
+        ).order_by('bucket', 'performer_id')
+
+
+class TaskTimeRollup(models.Model):
+    """Tracked time per task, performer and day, kept in step with TaskPerformSession."""
+
+    task = models.ForeignKey('task.Task', related_name='time_rollups', on_delete=models.CASCADE)
+    performer = models.ForeignKey('users.User', related_name='time_rollups', on_delete=models.SET_NULL, null=True, blank=True)
+    day = models.DateField()
+    duration = models.DurationField(default=timedelta)
+    sessions = models.PositiveIntegerField(default=0)
+
+    objects = TaskTimeRollupQuerySet.as_manager()
+
+    def __str__(self):
+        return f"task:{self.task_id} performer:{self.performer_id} {self.day}"
+
+    class Meta:
+        db_table = 'task_time_rollup'
+        verbose_name = 'Task time rollup'
+        verbose_name_plural = 'Task time rollups'
+        constraints = [
+            # NULLs stay distinct so SET_NULL on a deleted performer can't collide, buckets() sums them anyway
+            models.UniqueConstraint(fields=['task', 'performer', 'day'], name='task_time_rollup_unique_day'),
+        ]
     
 
 class TaskComment(models.Model):
@@ -102,6 +421,7 @@ class TaskComment(models.Model):
     text = models.TextField(max_length=1000, verbose_name='text_message', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = search_vector_field(('text', 'A'))
 
     def __str__(self):
         return f"{self.user}:{self.text}"
@@ -110,6 +430,9 @@ class TaskComment(models.Model):
         db_table = 'task_chat_message'
         verbose_name = 'Chat Message'
         verbose_name_plural = 'Chat Messages'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='task_chat_message_search_idx'),
+        ]
     
 
 
@@ -118,6 +441,12 @@ class TaskImage(models.Model):
     title = models.CharField(max_length=155)
     image = models.ImageField(upload_to='task_images/')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Filled in by api.tasks.create_image_variants, null until it ran
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    # WebP derivatives of settings.TASK_IMAGE_VARIANTS: {variant: {'name', 'width', 'height', 'size'}}
+    variants = models.JSONField(default=dict, blank=True)
     
 
     class Meta:
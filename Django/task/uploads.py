@@ -0,0 +1,336 @@
+import asyncio
+import bisect
+import logging
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import database_sync_to_async
+from django.core.files import File
+
+from api.tasks import schedule_image_variants
+from main import settings
+from task.models import TaskImage
+
+logger = logging.getLogger(__name__)
+
+# Binary frame: message id length, file index, chunk offset, then the utf-8 message id and the chunk
+FRAME_HEADER = struct.Struct('!BHQ')
+MAX_FILE_INDEX = 0xFFFF
+
+
+class UploadError(Exception):
+    """Rejected upload, ``code`` is sent back to the client in ``upload_error``."""
+
+    def __init__(self, code: str, message_id=None):
+        super().__init__(code)
+        self.code = code
+        self.message_id = message_id
+
+
+def pack_frame(message_id, index: int, offset: int, chunk: bytes) -> bytes:
+    message_id = str(message_id).encode()
+    return FRAME_HEADER.pack(len(message_id), index, offset) + message_id + chunk
+
+
+def unpack_frame(frame: bytes):
+    """Returns ``(message id, file index, offset, chunk)``, the chunk is a memoryview of the frame."""
+    if len(frame) < FRAME_HEADER.size:
+        raise UploadError('bad_frame')
+
+    id_length, index, offset = FRAME_HEADER.unpack_from(frame)
+    chunk_start = FRAME_HEADER.size + id_length
+
+    if len(frame) < chunk_start:
+        raise UploadError('bad_frame')
+
+    try:
+        message_id = frame[FRAME_HEADER.size:chunk_start].decode()
+    except UnicodeDecodeError:
+        raise UploadError('bad_frame')
+
+    return message_id, index, offset, memoryview(frame)[chunk_start:]
+
+
+class PendingFile:
+    """
+    One attachment being received. Chunks may come in any order, each one is written
+    at its offset of a ``SpooledTemporaryFile`` that keeps up to ``CHAT_UPLOAD_SPOOL_MEMORY``
+    bytes in memory. ``ranges`` holds the received ``(start, end)`` spans, merged.
+    """
+
+    __slots__ = ('name', 'size', 'received', 'ranges', 'spool')
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.received = 0
+        self.ranges = []
+        self.spool = tempfile.SpooledTemporaryFile(max_size=settings.CHAT_UPLOAD_SPOOL_MEMORY)
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.size
+
+    def write(self, offset: int, chunk) -> bool:
+        """Writes ``chunk`` at ``offset``, returns False if it overlaps a received span."""
+        start, end = offset, offset + len(chunk)
+        index = bisect.bisect(self.ranges, (start, end))
+
+        if (index and self.ranges[index - 1][1] > start) or (index < len(self.ranges) and self.ranges[index][0] < end):
+            return False
+
+        # Seeking past the end of the in-memory buffer would zero-fill it, go to disk first
+        if end > settings.CHAT_UPLOAD_SPOOL_MEMORY:
+            self.spool.rollover()
+
+        self.spool.seek(start)
+        self.spool.write(chunk)
+        self.received += end - start
+
+        if index and self.ranges[index - 1][1] == start:
+            index -= 1
+            start = self.ranges.pop(index)[0]
+
+        if index < len(self.ranges) and self.ranges[index][0] == end:
+            end = self.ranges.pop(index)[1]
+
+        self.ranges.insert(index, (start, end))
+
+        return True
+
+    def open(self):
+        self.spool.seek(0)
+        return self.spool
+
+    def close(self):
+        self.spool.close()
+
+
+class PendingMessage:
+    __slots__ = ('message', 'expected_count', 'files', 'touched_at')
+
+    def __init__(self, message, expected_count: int):
+        self.message = message
+        self.expected_count = expected_count
+        self.files = {}
+        self.touched_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return sum(file.size for file in self.files.values())
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+
+class PendingUploads:
+    """
+    Attachments of the messages a chat connection is still uploading.
+
+    Every binary frame names its message, file index and offset (see ``FRAME_HEADER``),
+    so files and messages upload concurrently and chunks are reassembled in any order.
+    Declared sizes count against the per-file and the per-connection limits, so the
+    connection never holds more than the spool memory of its pending files. Messages
+    without a frame for ``CHAT_UPLOAD_PENDING_TTL`` seconds are evicted.
+    """
+
+    def __init__(self):
+        self.messages = {}
+
+    @property
+    def size(self) -> int:
+        return sum(pending.size for pending in self.messages.values())
+
+    @property
+    def files_count(self) -> int:
+        return sum(pending.expected_count for pending in self.messages.values())
+
+    def start(self, message_id, message, expected_count: int) -> PendingMessage:
+        message_id = str(message_id)
+
+        if len(message_id.encode()) > 255:
+            raise UploadError('bad_message_id')
+
+        if message_id in self.messages:
+            raise UploadError('duplicate_message', message_id)
+
+        # A negative count would lower files_count and lift the cap for the other messages
+        if expected_count < 0:
+            raise UploadError('bad_request', message_id)
+
+        if self.files_count + expected_count > settings.CHAT_UPLOAD_MAX_PENDING_FILES:
+            raise UploadError('too_many_files', message_id)
+
+        pending = self.messages[message_id] = PendingMessage(message, expected_count)
+        return pending
+
+    def add_file(self, message_id, index: int, name: str, size: int) -> PendingFile:
+        message_id = str(message_id)
+        pending = self.messages.get(message_id)
+
+        if pending is None:
+            raise UploadError('unknown_message', message_id)
+
+        if not 0 <= index <= MAX_FILE_INDEX or index >= pending.expected_count or index in pending.files:
+            raise UploadError('bad_file_index', message_id)
+
+        # A negative size would lower the pending total and let other files past the connection limit
+        if size < 0:
+            raise UploadError('bad_request', message_id)
+
+        if size > settings.CHAT_UPLOAD_MAX_FILE_SIZE:
+            raise UploadError('file_too_large', message_id)
+
+        if self.size + size > settings.CHAT_UPLOAD_MAX_PENDING_SIZE:
+            raise UploadError('connection_limit', message_id)
+
+        file = pending.files[index] = PendingFile(name, size)
+        pending.touched_at = time.monotonic()
+
+        return file
+
+    def write(self, frame: bytes):
+        """Writes the chunk of a binary frame, returns ``(message id, file index, offset, file)``."""
+        message_id, index, offset, chunk = unpack_frame(frame)
+        pending = self.messages.get(message_id)
+
+        if pending is None:
+            raise UploadError('unknown_message', message_id)
+
+        file = pending.files.get(index)
+
+        if file is None:
+            raise UploadError('bad_file_index', message_id)
+
+        if len(chunk) > settings.CHAT_UPLOAD_CHUNK_SIZE:
+            raise UploadError('chunk_too_large', message_id)
+
+        if offset + len(chunk) > file.size:
+            raise UploadError('file_size_mismatch', message_id)
+
+        if not file.write(offset, chunk):
+            raise UploadError('overlapping_chunk', message_id)
+
+        pending.touched_at = time.monotonic()
+
+        return message_id, index, offset, file
+
+    def pop(self, message_id) -> PendingMessage:
+        """Detaches a fully received message, the caller owns (and closes) its files."""
+        message_id = str(message_id)
+        pending = self.messages.get(message_id)
+
+        if pending is None:
+            raise UploadError('unknown_message', message_id)
+
+        if not all(file.complete for file in pending.files.values()):
+            raise UploadError('incomplete_upload', message_id)
+
+        return self.messages.pop(message_id)
+
+    def discard(self, message_id):
+        pending = self.messages.pop(str(message_id), None)
+
+        if pending is not None:
+            pending.close()
+
+    def evict_expired(self, now=None) -> list:
+        """Discards the messages idle for longer than the TTL, returns their ids."""
+        deadline = (time.monotonic() if now is None else now) - settings.CHAT_UPLOAD_PENDING_TTL
+        expired = [message_id for message_id, pending in self.messages.items() if pending.touched_at < deadline]
+
+        for message_id in expired:
+            self.discard(message_id)
+
+        return expired
+
+    def close(self):
+        for message_id in list(self.messages):
+            self.discard(message_id)
+
+
+_executor = None
+
+
+def attachments_executor() -> ThreadPoolExecutor:
+    """
+    Threads writing chat attachments, off the shared sync thread of ``sync_to_async``
+    so an upload never queues the DB work of other sockets. At most
+    ``CHAT_ATTACHMENT_WORKERS`` writes run at once in the process.
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.CHAT_ATTACHMENT_WORKERS, thread_name_prefix='chat-attachments')
+
+    return _executor
+
+
+def in_executor(func):
+    return database_sync_to_async(func, thread_sensitive=False, executor=attachments_executor())
+
+
+def store_file(file: PendingFile) -> str:
+    """Copies the spooled file to the image storage in chunks, returns the stored name."""
+    field = TaskImage._meta.get_field('image')
+    name = field.generate_filename(None, file.name)
+
+    return field.storage.save(name, File(file.open(), name=file.name), max_length=field.max_length)
+
+
+def delete_files(names):
+    storage = TaskImage._meta.get_field('image').storage
+
+    for name in names:
+        storage.delete(name)
+
+
+def create_images(message, names) -> list:
+    return TaskImage.objects.bulk_create([TaskImage(message=message, image=name) for name in names])
+
+
+async def save_attachments(pending: PendingMessage) -> list:
+    """
+    Stores the files of a received message in parallel, then creates their
+    ``TaskImage`` rows with one ``bulk_create``. Stored files are deleted if any step fails.
+    """
+    files = [pending.files[index] for index in sorted(pending.files) if pending.files[index].size]
+    results = await asyncio.gather(*(in_executor(store_file)(file) for file in files), return_exceptions=True)
+    names = [name for name in results if isinstance(name, str)]
+
+    try:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        return await in_executor(create_images)(pending.message, names)
+    except BaseException:
+        await in_executor(delete_files)(names)
+        raise
+
+
+_variant_tasks = set()
+
+
+def _variants_done(task):
+    _variant_tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('Failed to create chat image variants', exc_info=task.exception())
+
+
+def schedule_variants(images):
+    """
+    Queues the variants of stored attachments, in the background on an attachments
+    thread. Called once the message is broadcast: without Celery the variants are made
+    inline, neither the broadcast nor the next frames of the socket wait for Pillow.
+    """
+    image_ids = [image.id for image in images]
+
+    if image_ids:
+        task = asyncio.ensure_future(in_executor(schedule_image_variants)(image_ids))
+        _variant_tasks.add(task)
+        task.add_done_callback(_variants_done)
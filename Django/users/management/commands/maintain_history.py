@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.tasks import maintain_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the group_logs partitions of the coming months, drops the ones past "
+        "retention and purges old notifications. Defaults come from the settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, help='Months of partitions to create ahead')
+        parser.add_argument('--logs-retention-months', type=int, help='Group log months to keep, 0 keeps everything')
+        parser.add_argument('--notifications-retention-days', type=int, help='Notification days to keep, 0 keeps everything')
+
+    def handle(self, *args, **options):
+        result = maintain_history(
+            ahead=options['ahead'],
+            logs_retention_months=options['logs_retention_months'],
+            notifications_retention_days=options['notifications_retention_days'],
+        )
+
+        self.stdout.write(f"Created partitions: {', '.join(result['created']) or '-'}")
+        self.stdout.write(f"Dropped partitions: {', '.join(result['dropped']) or '-'}")
+        self.stdout.write(self.style.SUCCESS(f"Purged {result['notifications_purged']} notifications"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Group
+
+
+class Command(BaseCommand):
+    help = "Recomputes Group.members_count and Group.projects_count from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, nargs='*', help='Only repair these group ids')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        groups = Group.objects.order_by('pk')
+
+        if options['group']:
+            groups = groups.filter(pk__in=options['group'])
+
+        ids = list(groups.values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        updated = 0
+
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                updated += Group.objects.filter(pk__in=ids[start:start + batch_size]).refresh_counters()
+
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters of {updated} groups"))
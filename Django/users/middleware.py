@@ -1,5 +1,4 @@
 from urllib.parse import parse_qs
-from django.db import close_old_connections
 from jwt import DecodeError, ExpiredSignatureError, InvalidSignatureError
 from django.contrib.auth.models import AnonymousUser
 from channels.db import database_sync_to_async
@@ -19,15 +18,14 @@ class JWTAuthMiddleware :
 
     
     async def __call__(self, scope, receive, send):
-        close_old_connections()
-
+        # database_sync_to_async already returns the connection around get_user
         try:
             token = parse_qs(scope['query_string'].decode('utf8')).get('token', None)[ 0 ]
             data = jwt_decode(token, settings.SECRET_KEY, algorithms=["HS256"])
 
             scope['user'] = await self.get_user(data['user_id'])
         except (TypeError, KeyError, InvalidSignatureError, ExpiredSignatureError, DecodeError):
-            scope['user'] = AnonymousUser
+            scope['user'] = AnonymousUser()
             
         return await self.app(scope, receive, send)
     
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Group = apps.get_model('users', 'Group')
+    Project = apps.get_model('task', 'Project')
+
+    members = Group.members.through.objects.filter(
+        group_id=OuterRef('pk')
+    ).order_by().values('group_id').annotate(total=Count('*')).values('total')
+
+    projects = Project.objects.filter(
+        group_id=OuterRef('pk')
+    ).order_by().values('group_id').annotate(total=Count('*')).values('total')
+
+    Group.objects.update(
+        members_count=Coalesce(Subquery(members), 0),
+        projects_count=Coalesce(Subquery(projects), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_alter_notification_notify_type'),
+        ('task', '0020_subtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='members count'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='projects_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='projects count'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_user_username_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grouplogs',
+            index=models.Index(fields=['group', 'created_at', 'id'], name='group_logs_group_i_6b998c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grouplogs',
+            index=models.Index(fields=['group', 'event_type', 'created_at', 'id'], name='group_logs_group_i_402ec8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grouplogs',
+            index=models.Index(fields=['group', 'anchor', 'created_at', 'id'], name='group_logs_group_i_2e0462_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Invites kept the group id only in the JSON payload
+BACKFILL_GROUP_SQL = """
+UPDATE notify AS n
+SET group_id = g.id
+FROM "group" AS g
+WHERE n.notify_type = 'invite'
+  AND n.data ->> 'group_id' ~ '^[0-9]+$'
+  AND g.id = (n.data ->> 'group_id')::bigint
+"""
+
+# Invites whose group is gone can't be accepted, and racing duplicates would break the constraint
+CLEANUP_INVITES_SQL = """
+DELETE FROM notify WHERE notify_type = 'invite' AND group_id IS NULL;
+
+DELETE FROM notify AS a
+USING notify AS b
+WHERE a.notify_type = 'invite'
+  AND b.notify_type = 'invite'
+  AND a.user_id = b.user_id
+  AND a.group_id = b.group_id
+  AND a.id > b.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_notify_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='users.group', verbose_name='group'),
+        ),
+        migrations.RunSQL(BACKFILL_GROUP_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CLEANUP_INVITES_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('notify_type', 'invite')), fields=('user', 'group'), name='notify_unique_pending_invite'),
+        ),
+    ]
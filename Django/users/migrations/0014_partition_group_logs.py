@@ -0,0 +1,83 @@
+from django.db import migrations
+
+
+# Monthly RANGE (created_at) partitions, see common.partitions.MonthlyPartitions.
+# The primary key has to hold the partition key, Django keeps treating "id" as the pk
+# (ids still come from one identity sequence). Index and constraint names are kept.
+PARTITION_SQL = """
+ALTER TABLE group_logs RENAME TO group_logs_unpartitioned;
+
+CREATE TABLE group_logs (LIKE group_logs_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);
+CREATE TABLE group_logs_default PARTITION OF group_logs DEFAULT;
+
+DO $$
+DECLARE
+    month timestamp;
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    SELECT date_trunc('month', least(min(created_at), now()) AT TIME ZONE 'UTC')
+    INTO month FROM group_logs_unpartitioned;
+
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF group_logs FOR VALUES FROM (%L) TO (%L)',
+            'group_logs_p' || to_char(month, 'YYYY_MM'),
+            month AT TIME ZONE 'UTC',
+            (month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO group_logs SELECT * FROM group_logs_unpartitioned;
+DROP TABLE group_logs_unpartitioned;
+
+ALTER TABLE group_logs ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('group_logs', 'id'), coalesce(max(id), 0) + 1, false) FROM group_logs;
+
+ALTER TABLE group_logs ADD CONSTRAINT group_logs_pkey PRIMARY KEY (id, created_at);
+ALTER TABLE group_logs ADD CONSTRAINT group_logs_group_id_a0d9c66a_fk_group_id
+    FOREIGN KEY (group_id) REFERENCES "group" (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE group_logs ADD CONSTRAINT group_logs_anchor_id_a3baa117_fk_user_id
+    FOREIGN KEY (anchor_id) REFERENCES "user" (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX group_logs_group_id_a0d9c66a ON group_logs (group_id);
+CREATE INDEX group_logs_anchor_id_a3baa117 ON group_logs (anchor_id);
+CREATE INDEX group_logs_group_i_6b998c_idx ON group_logs (group_id, created_at, id);
+CREATE INDEX group_logs_group_i_402ec8_idx ON group_logs (group_id, event_type, created_at, id);
+CREATE INDEX group_logs_group_i_2e0462_idx ON group_logs (group_id, anchor_id, created_at, id);
+"""
+
+UNPARTITION_SQL = """
+ALTER TABLE group_logs RENAME TO group_logs_partitioned;
+
+CREATE TABLE group_logs (LIKE group_logs_partitioned INCLUDING DEFAULTS);
+INSERT INTO group_logs SELECT * FROM group_logs_partitioned;
+DROP TABLE group_logs_partitioned;
+
+ALTER TABLE group_logs ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('group_logs', 'id'), coalesce(max(id), 0) + 1, false) FROM group_logs;
+
+ALTER TABLE group_logs ADD CONSTRAINT group_logs_pkey PRIMARY KEY (id);
+ALTER TABLE group_logs ADD CONSTRAINT group_logs_group_id_a0d9c66a_fk_group_id
+    FOREIGN KEY (group_id) REFERENCES "group" (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE group_logs ADD CONSTRAINT group_logs_anchor_id_a3baa117_fk_user_id
+    FOREIGN KEY (anchor_id) REFERENCES "user" (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX group_logs_group_id_a0d9c66a ON group_logs (group_id);
+CREATE INDEX group_logs_anchor_id_a3baa117 ON group_logs (anchor_id);
+CREATE INDEX group_logs_group_i_6b998c_idx ON group_logs (group_id, created_at, id);
+CREATE INDEX group_logs_group_i_402ec8_idx ON group_logs (group_id, event_type, created_at, id);
+CREATE INDEX group_logs_group_i_2e0462_idx ON group_logs (group_id, anchor_id, created_at, id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_notify_group_invite_constraint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, UNPARTITION_SQL),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:56
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_partition_group_logs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='notify_created_brin_idx'),
+        ),
+    ]
@@ -1,13 +1,55 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.apps import apps
+from django.db import connection, models
+from django.db.models.functions import Coalesce, Collate, Upper
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, OpClass
+from django.contrib.postgres.search import TrigramSimilarity
 from django.utils import timezone
 from django.utils.timezone import datetime
 
 
+class UserQuerySet(models.QuerySet):
+
+    def search(self, username: str, limit: int):
+        """
+        Username search for the invite dialog.
+
+        Short inputs walk the ``UPPER(username) COLLATE "C"`` btree in order, so
+        the LIMIT stops the scan early. Longer ones go through the trigram GIN
+        index and are ranked: prefix matches first, then by similarity.
+        """
+        username = username.strip()
+
+        if len(username) < 3:
+            prefix = username.upper()
+            upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+            return self.alias(
+                username_upper=Collate(Upper('username'), 'C')
+            ).filter(
+                username_upper__gte=prefix,
+                username_upper__lt=upper_bound,
+            ).order_by('username_upper')[:limit]
+
+        return self.filter(username__icontains=username).annotate(
+            is_prefix=models.Case(
+                models.When(username__istartswith=username, then=models.Value(1)),
+                default=models.Value(0),
+            ),
+            similarity=TrigramSimilarity('username', username),
+        ).order_by('-is_prefix', '-similarity', 'username')[:limit]
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     image_profile = models.ImageField(verbose_name='image_profile', upload_to='media/', null=True, blank=True)
     username = models.CharField(verbose_name="user", max_length=130, unique=True)
 
+    objects = CustomUserManager()
+
     def __str__(self):
         return self.username
     
@@ -15,6 +57,75 @@ class User(AbstractUser):
         db_table = "user"
         verbose_name = "User"
         verbose_name_plural = "Users"
+        indexes = [
+            # icontains is compiled to UPPER(username::text) LIKE UPPER(...)
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'), name='user_username_trgm_idx'),
+            models.Index(Collate(Upper('username'), 'C'), name='user_username_prefix_idx'),
+        ]
+
+
+class NotificationQuerySet(models.QuerySet):
+
+    def create_invite(self, user_id: int, group_id: int, message: str):
+        """
+        Inserts a pending invite unless one already exists for ``(user, group)``.
+
+        The check and the insert are a single statement against the partial
+        unique index, so concurrent invites can't both get through. Returns the
+        new id or None when the invite was already there. Signals are not sent.
+        """
+        now = timezone.now()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.model._meta.db_table}
+                    (notify_type, user_id, group_id, message, created_at, updated_at, is_read)
+                VALUES (%s, %s, %s, %s, %s, %s, false)
+                ON CONFLICT (user_id, group_id) WHERE notify_type = %s DO NOTHING
+                RETURNING id
+                """,
+                [Notification.INVITE_MESSAGE, user_id, group_id, message, now, now, Notification.INVITE_MESSAGE],
+            )
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+    def purge_older_than(self, cutoff, batch_size: int):
+        """
+        Deletes notifications created before ``cutoff`` in batches of
+        ``batch_size`` short transactions, pending invites are kept. Returns the
+        deleted count and ``{user_id: unread rows deleted}``. Signals are not sent.
+        """
+        deleted = 0
+        unread = {}
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    WITH doomed AS (
+                        SELECT id FROM {self.model._meta.db_table}
+                        WHERE created_at < %s AND NOT (notify_type = %s AND NOT is_read)
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    DELETE FROM {self.model._meta.db_table} AS n USING doomed
+                    WHERE n.id = doomed.id
+                    RETURNING n.user_id, n.is_read
+                    """,
+                    [cutoff, Notification.INVITE_MESSAGE, batch_size],
+                )
+                rows = cursor.fetchall()
+
+            for user_id, is_read in rows:
+                if not is_read:
+                    unread[user_id] = unread.get(user_id, 0) + 1
+
+            deleted += len(rows)
+
+            if len(rows) < batch_size:
+                return deleted, unread
 
 
 class Notification(models.Model):
@@ -30,10 +141,13 @@ class Notification(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE, verbose_name='user')
     message = models.TextField(max_length=500, verbose_name='text')
     data = models.JSONField(verbose_name='group_id', blank=True, null=True)                     
+    group = models.ForeignKey('Group', on_delete=models.CASCADE, null=True, blank=True, related_name='notifications', verbose_name='group')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='created date')
     updated_at = models.DateTimeField(auto_now=True)
     is_read = models.BooleanField(default=False)
 
+    objects = NotificationQuerySet.as_manager()
+
     def __str__(self):
         return f"user: {self.user}, message: {self.message}"
     
@@ -41,6 +155,20 @@ class Notification(models.Model):
         db_table = 'notify'
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='notify_user_unread_idx'),
+            # Append-only by time, a few pages of BRIN find the retention range
+            BrinIndex(fields=['created_at'], name='notify_created_brin_idx'),
+        ]
+        constraints = [
+            # Also the lookup index for "is this user already invited"
+            models.UniqueConstraint(
+                fields=['user', 'group'],
+                condition=models.Q(notify_type='invite'),
+                name='notify_unique_pending_invite',
+            ),
+        ]
 
 
 class Profile(models.Model):
@@ -50,13 +178,43 @@ class Profile(models.Model):
         return f"{self.user.username} Profile"
     
 
+class GroupQuerySet(models.QuerySet):
+
+    def refresh_counters(self):
+        """Recomputes the denormalized counters from the source tables."""
+        Project = apps.get_model('task', 'Project')
+
+        members = Group.members.through.objects.filter(
+            group_id=models.OuterRef('pk')
+        ).order_by().values('group_id').annotate(total=models.Count('*')).values('total')
+
+        projects = Project.objects.filter(
+            group_id=models.OuterRef('pk')
+        ).order_by().values('group_id').annotate(total=models.Count('*')).values('total')
+
+        return self.update(
+            members_count=Coalesce(models.Subquery(members), 0),
+            projects_count=Coalesce(models.Subquery(projects), 0),
+        )
+
+    def change_counter(self, field: str, delta: int):
+        if not delta:
+            return 0
+
+        return self.update(**{field: models.F(field) + delta})
+
+
 class Group(models.Model):
     owner = models.ForeignKey(User,on_delete=models.CASCADE, verbose_name='owner', related_name='groups_owner')
     name = models.CharField(max_length=130, verbose_name="group_name")
     members = models.ManyToManyField("users.User", verbose_name="group_members", related_name="user_groups")
+    members_count = models.PositiveIntegerField(default=0, verbose_name='members count')
+    projects_count = models.PositiveIntegerField(default=0, verbose_name='projects count')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = GroupQuerySet.as_manager()
+
     def __str__(self):
         return self.name
     
@@ -78,6 +236,7 @@ class GroupLogsQueryset(models.QuerySet):
             'group__name',
             'group__owner',
             'created_at',
+            'data',
             'anchor__username'
         )
 
@@ -87,7 +246,7 @@ class GroupLogsManager(models.Manager):
         return GroupLogsQueryset(self.model, using=self._db)
 
     def group_select(self, group_id):
-        return self.get_queryset().filter(group__id=group_id)
+        return self.get_queryset().optimized().filter(group__id=group_id)
     
     def filter_queries(self, dataset, queries):
         date_start = queries.get('date-start', None)
@@ -127,22 +286,21 @@ class GroupLogsManager(models.Manager):
             case _:
                 pass
             
-        # Username filtering
+        # Username filtering, resolved to an id first so the (group, anchor, created_at) index is used
         if username:
-            dataset = dataset.filter(anchor__username=username)
+            anchor_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+
+            if anchor_id is None:
+                return dataset.none()
+
+            dataset = dataset.filter(anchor_id=anchor_id)
 
         # Group name filtering
         if group_name:
             dataset = dataset.filter(group__name=group_name)
 
         # filter Event type:
-        available_events = [
-            'Add member', 
-            'Kicked member', 
-            'Change settings', 
-            'Invite member', 
-            'invite deflected'
-        ]
+        available_events = [event for event, _ in GroupLogs.TYPE_EVENTS]
 
         if event_type and event_type in available_events:
             dataset = dataset.filter(event_type=event_type)
@@ -184,6 +342,11 @@ class GroupLogs(models.Model):
         db_table = 'group_logs'
         verbose_name = 'GroupLog'
         verbose_name_plural = 'GroupLogs'
+        indexes = [
+            models.Index(fields=['group', 'created_at', 'id']),
+            models.Index(fields=['group', 'event_type', 'created_at', 'id']),
+            models.Index(fields=['group', 'anchor', 'created_at', 'id']),
+        ]
 
 
 
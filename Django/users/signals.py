@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from common.cache_managers.notification_cache import NotificationCacheManager
+from task.models import Project
+from users.models import Group, Notification, User
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def update_members_count(sender, instance, action, reverse, pk_set, **kwargs):
+    through = Group.members.through
+
+    if action in ('pre_remove', 'pre_clear'):
+        # Only rows that really exist will be removed, count them before they go
+        if reverse:
+            rows = through.objects.filter(user_id=instance.pk)
+        else:
+            rows = through.objects.filter(group_id=instance.pk)
+
+        if action == 'pre_remove':
+            rows = rows.filter(**{'group_id__in' if reverse else 'user_id__in': pk_set})
+
+        instance._removed_groups_ids = list(rows.values_list('group_id', flat=True))
+        return
+
+    if action == 'post_add':
+        # pk_set only holds the ids that were actually inserted
+        if reverse:
+            Group.objects.filter(pk__in=pk_set).change_counter('members_count', 1)
+        else:
+            Group.objects.filter(pk=instance.pk).change_counter('members_count', len(pk_set))
+
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_removed_groups_ids', [])
+
+        if reverse:
+            Group.objects.filter(pk__in=removed).change_counter('members_count', -1)
+        else:
+            Group.objects.filter(pk=instance.pk).change_counter('members_count', -len(removed))
+
+        instance._removed_groups_ids = []
+
+
+@receiver(post_save, sender=Project)
+def update_projects_count_on_save(sender, instance, created, **kwargs):
+    if not created and not hasattr(instance, '_loaded_group_id'):
+        # Loaded without its group, nothing to compare against
+        return
+
+    previous_group_id = None if created else instance._loaded_group_id
+
+    if previous_group_id == instance.group_id:
+        return
+
+    if previous_group_id is not None:
+        Group.objects.filter(pk=previous_group_id).change_counter('projects_count', -1)
+
+    if instance.group_id is not None:
+        Group.objects.filter(pk=instance.group_id).change_counter('projects_count', 1)
+
+
+@receiver(post_delete, sender=Project)
+def update_projects_count_on_delete(sender, instance, **kwargs):
+    if instance.group_id is not None and not isinstance(kwargs.get('origin'), Group):
+        Group.objects.filter(pk=instance.group_id).change_counter('projects_count', -1)
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        transaction.on_commit(lambda: NotificationCacheManager.change_unread(instance.user_id, 1))
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read and not isinstance(kwargs.get('origin'), User):
+        transaction.on_commit(lambda: NotificationCacheManager.change_unread(instance.user_id, -1))